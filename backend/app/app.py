@@ -1,29 +1,34 @@
 import os, uuid, json
 from pathlib import Path
 from typing import Optional, List, Dict, Any
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from PIL import Image
-
-from db import init_db, migrate_schema, engine, SessionLocal, User, Job, Upload, Face, DialogueLog
-from auth import get_db, get_current_user, get_password_hash, verify_password, create_access_token
-from schemas import UploadResponse, GeneratePayload
-from services.face_detect import detect_faces, choose_aspect_from_image
-from services.wan22 import run_ti2v
-from services.tts_piper import synthesize_dialogues
-from services.mux import mux_audio_to_video
-from config import OUTPUT_DIR, ENABLE_MUSETALK
-try:
-    from services.musetalk import lipsync
-except Exception:
-    lipsync = None
+
+from db import ensure_schema, SessionLocal, User, Job, Upload, Face, DialogueLog
+from auth import get_db, get_current_user, CurrentUser, token_cache, invalidate_user, get_password_hash, hash_password_async, verify_password_async, create_access_token
+from db_async import get_user_by_email, create_user, touch_login, get_job, create_upload, dispose as dispose_async_db
+from passwords import shutdown as shutdown_password_pool
+from schemas import UploadResponse, GeneratePayload, TTSWarmupPayload, FaceDetectPayload
+from services.mux import derivative_paths
+from services.face_detect import detect_faces, detect_faces_batch, choose_aspect_from_image
+from services.image_prep import ASPECTS, probe_size, load_rgb, center_crop_to_aspect
+from services.tts_piper import warmup_phrases
+from services.voices import get_registry as get_voice_registry
+from services.gpu_pool import current_gpu_pool, shutdown_gpu_pool
+from jobqueue import WorkerPool, queue_stats
+from scheduler import AdmissionError, admit, queue_info
+from cache import stats as cache_stats
+from metrics import histograms as timing_histograms
+from events import get_bus, emit, sse_format, TERMINAL
+from static_files import serve_file
+from config import OUTPUT_DIR, WAN_MODE, JOB_WORKERS, PIPER_VOICES_DIR, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_BYTES, JOB_EVENTS_KEEPALIVE
 
 
 # ---------- CONST / ENV ----------
-PIPER_VOICES_DIR = Path(os.getenv("PIPER_VOICES_DIR", "/workspace/models/piper-voices"))
 DEFAULT_TTS_FEMALE = os.getenv("DEFAULT_TTS_FEMALE", "")
 DEFAULT_TTS_MALE = os.getenv("DEFAULT_TTS_MALE", "")
 
@@ -49,8 +54,6 @@ def seed_admin_if_missing():
 
 
 # ---------- APP ----------
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 app = FastAPI(title="VizoAI Backend", version="0.8.0")
 app.add_middleware(
     CORSMiddleware,
@@ -60,12 +63,32 @@ app.add_middleware(
     allow_credentials=True,
 )
 
-# idempotent init
-init_db(); migrate_schema(engine); seed_admin_if_missing()
+_worker_pool: Optional[WorkerPool] = None
 
 @app.on_event("startup")
 def _startup():
-    init_db(); migrate_schema(engine); seed_admin_if_missing()
+    global _worker_pool
+    # şema yalnızca user_version eskiyse migrate edilir (bkz. db.ensure_schema)
+    ensure_schema(); seed_admin_if_missing()
+    get_voice_registry().refresh(force=True)
+    if JOB_WORKERS > 0:
+        # işler API sürecinde değil, kuyruğu tüketen worker süreçlerinde koşar;
+        # resident WAN worker'larını da (GpuPool) yalnız WorkerPool başlatır.
+        # JOB_WORKERS=0 iken kuyruğu ayrı `python -m app.jobqueue` tüketir ve
+        # modelleri o yükler: API süreci GPU'ya dokunmaz.
+        _worker_pool = WorkerPool()
+        _worker_pool.start()
+
+@app.on_event("shutdown")
+def _shutdown():
+    if _worker_pool is not None:
+        _worker_pool.stop()
+    shutdown_gpu_pool()
+    shutdown_password_pool()
+
+@app.on_event("shutdown")
+async def _shutdown_async():
+    await dispose_async_db()
 
 
 # ---------- BASIC ----------
@@ -74,19 +97,26 @@ def ping():
     return {"ok": True, "message": "VizoAI backend online"}
 
 @app.get("/health")
-def health():
+def health(db: Session = Depends(get_db)):
     # basit mount kontrolü, opsiyonel
     voices_ok = PIPER_VOICES_DIR.exists()
-    return {"ok": True, "voices_mounted": voices_ok, "voices_dir": str(PIPER_VOICES_DIR)}
+    return {
+        "ok": True, "voices_mounted": voices_ok, "voices_dir": str(PIPER_VOICES_DIR),
+        "wan": _wan_health(),
+        "queue": {**queue_stats(db), "workers": _worker_pool.alive() if _worker_pool else 0},
+        "cache": cache_stats(),
+        "events": get_bus().stats(),
+        "auth_cache": token_cache().stats(),
+    }
 
 
 # ---------- HELPERS ----------
-def _rel_url(p: Path) -> str:
-    try:
-        rel = Path(p).resolve().relative_to(OUTPUT_DIR.resolve())
-        return f"/outputs/{rel.as_posix()}"
-    except Exception:
-        return str(p)
+def _wan_health():
+    # cihaz havuzu iş süreçlerini yöneten WorkerPool'da (ya da bu süreçte) yaşar
+    gpus = _worker_pool.gpus if _worker_pool is not None else current_gpu_pool()
+    if gpus is None:
+        return {"mode": WAN_MODE, "state": None, "devices": None}
+    return {"mode": WAN_MODE, "state": gpus.worker_state(), "devices": gpus.stats()}
 
 def _to_local_image_path(img_path: str) -> str:
     from urllib.parse import urlparse
@@ -100,36 +130,18 @@ def _to_local_image_path(img_path: str) -> str:
             return str(OUTPUT_DIR / rel)
     return img_path
 
-def _center_crop_to_aspect(img_path: Path, target_aspect: str) -> Path:
-    img = Image.open(img_path).convert("RGB")
-    w, h = img.size
-    if target_aspect == "9:16":
-        tw, th = 9, 16
-    else:
-        target_aspect = "16:9"
-        tw, th = 16, 9
-    ar_src = w / h
-    ar_tgt = tw / th
-    if abs(ar_src - ar_tgt) < 1e-3:
-        crop_img = img
-    elif ar_src > ar_tgt:
-        new_w = int(h * ar_tgt)
-        left = max(0, (w - new_w) // 2)
-        crop_img = img.crop((left, 0, left + new_w, h))
-    else:
-        new_h = int(w / ar_tgt)
-        top = max(0, (h - new_h) // 2)
-        crop_img = img.crop((0, top, w, top + new_h))
-    out_dir = OUTPUT_DIR / "inputs"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / f"{Path(img_path).stem}__crop.jpg"
-    crop_img.save(out_path, format="JPEG", quality=95)
-    return out_path
+def _derivative_urls(video_url: Optional[str]) -> Dict[str, str]:
+    """Final videonun poster/önizleme URL'leri (dosya varsa); bkz. services.mux.finalize_video."""
+    if not video_url or not video_url.startswith("/outputs/"):
+        return {}
+    base = video_url.rsplit("/", 1)[0]
+    return {k: f"{base}/{p.name}" for k, p in derivative_paths(Path(_to_local_image_path(video_url))).items()
+            if p.exists()}
 
 
 # ---------- AUTH ----------
 @app.post("/auth/register")
-async def register(request: Request, db: Session = Depends(get_db)):
+async def register(request: Request):
     try:
         body = await request.json()
     except Exception:
@@ -139,178 +151,300 @@ async def register(request: Request, db: Session = Depends(get_db)):
     password = body.get("password")
     if not email or not password:
         raise HTTPException(status_code=422, detail="Missing email or password")
-    if db.query(User).filter(User.email == email).first():
+    # DB ve hash event loop'u bloklamaz (bkz. db_async, passwords)
+    if await get_user_by_email(email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        user = await create_user(name, email, await hash_password_async(password))
+    except IntegrityError:
         raise HTTPException(status_code=400, detail="Email already registered")
-    user = User(name=name, email=email, password_hash=get_password_hash(password))
-    db.add(user); db.commit(); db.refresh(user)
     token = create_access_token({"sub": str(user.id)})
     return {"ok": True, "token": token, "user": {"id": user.id, "name": user.name, "email": user.email, "role": user.role, "credits": user.credits}}
 
 @app.post("/auth/login")
-async def login(request: Request, db: Session = Depends(get_db)):
+async def login(request: Request):
     try:
         body = await request.json()
     except Exception:
         body = await request.form()
     email = (body.get("email") or "").strip()
     password = body.get("password")
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.password_hash):
+    user = await get_user_by_email(email)
+    if not user or not password or not await verify_password_async(password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    import datetime as _dt
-    user.last_login = _dt.datetime.utcnow(); db.commit()
+    await touch_login(user.id)
     token = create_access_token({"sub": str(user.id)})
     return {"ok": True, "token": token, "user": {"id": user.id, "name": user.name, "email": user.email, "role": user.role, "credits": user.credits}}
 
 
 # ---------- UPLOAD ----------
+def _prepare_upload(path: Path):
+    """
+    Görüntü tek sefer decode edilir; yüz tespiti ve iki aspect crop'u aynı
+    bitmap'ten üretilir. /api/generate-s2v ve worker bu crop'ları yeniden kullanır.
+    """
+    img = load_rgb(str(path))
+    faces = detect_faces(str(path), img=img)
+    for aspect in ASPECTS:
+        center_crop_to_aspect(path, aspect, img=img)
+    return faces
+
 @app.post("/api/upload")
 async def upload_image(
     request: Request,
     file: UploadFile = File(...),
-    current_user: Optional[User] = Depends(get_current_user),
+    current_user: Optional[CurrentUser] = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
+    declared = int(request.headers.get("content-length") or 0)
+    if declared > UPLOAD_MAX_BYTES + 64 * 1024:  # multipart zarfı için pay
+        raise HTTPException(status_code=413, detail="File too large")
+
     uid = uuid.uuid4().hex[:8]
     up_dir = OUTPUT_DIR / "uploads"
     up_dir.mkdir(parents=True, exist_ok=True)
-    out_path = up_dir / f"{uid}_{file.filename}"
+    out_path = up_dir / f"{uid}_{Path(file.filename or 'image').name}"
+    # sabit boyutlu parçalarla diske akıt; tüm dosya belleğe alınmaz
+    size = 0
     with open(out_path, "wb") as f:
-        f.write(await file.read())
-
-    try:
-        im = Image.open(out_path); w, h = im.size
-    except Exception:
-        w = h = 0
-    up = Upload(user_id=(current_user.id if current_user else None), path=str(out_path), w=w, h=h, preview_url=None)
-    db.add(up); db.commit()
-
-    faces = detect_faces(str(out_path))
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                f.close(); out_path.unlink(missing_ok=True)
+                raise HTTPException(status_code=413, detail="File too large")
+            f.write(chunk)
+
+    w, h = probe_size(str(out_path))  # sadece header
+    if not (w and h):
+        out_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=415, detail="Unsupported image")
+    up = await create_upload(current_user.id if current_user else None, str(out_path), w, h)
+
+    faces = await run_in_threadpool(_prepare_upload, out_path)
+    await run_in_threadpool(_store_faces, db, up.id, faces)
     url = f"/outputs/uploads/{out_path.name}"
     return {"path": url, "faces": faces}
 
 
+# ---------- FACES ----------
+def _store_faces(db: Session, upload_id: int, faces: List[Dict[str, Any]]):
+    for f in faces:
+        b = f["boundingBox"]
+        db.add(Face(upload_id=upload_id, x=b["x"], y=b["y"], width=b["width"], height=b["height"]))
+    db.commit()
+
+def _faces_from_rows(rows: List[Face]) -> List[Dict[str, Any]]:
+    return [{
+        "id": f"face_{i+1}",
+        "name": f"Character {i+1}",
+        "boundingBox": {"x": r.x, "y": r.y, "width": r.width, "height": r.height},
+    } for i, r in enumerate(rows)]
+
+@app.post("/api/faces/detect")
+def detect_faces_for_uploads(payload: FaceDetectPayload, current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Birden çok upload için yüzler. Face tablosunda kaydı olanlar DB'den gelir;
+    kalanlar thread havuzunda toplu tespit edilip kaydedilir.
+    """
+    uploads: Dict[str, Optional[Upload]] = {}
+    for path in payload.paths:
+        local = _to_local_image_path(path)
+        up = db.query(Upload).filter(Upload.path == local).first()
+        if up is None or (up.user_id is not None and up.user_id != current_user.id and current_user.role != "admin"):
+            raise HTTPException(status_code=404, detail=f"Upload not found: {path}")
+        uploads[path] = up
+
+    ids = [up.id for up in uploads.values()]
+    rows: Dict[int, List[Face]] = {}
+    for r in db.query(Face).filter(Face.upload_id.in_(ids)).order_by(Face.upload_id, Face.id).all():
+        rows.setdefault(r.upload_id, []).append(r)
+
+    missing = [up for up in uploads.values() if up.id not in rows]
+    if missing:
+        for up, faces in zip(missing, detect_faces_batch([up.path for up in missing])):
+            _store_faces(db, up.id, faces)
+            rows[up.id] = db.query(Face).filter(Face.upload_id == up.id).order_by(Face.id).all()
+
+    return {"results": [{"path": path, "faces": _faces_from_rows(rows[up.id])} for path, up in uploads.items()]}
+
+
 # ---------- JOB STATUS ----------
 @app.get("/api/jobs/{job_id}")
-def job_status(job_id: str, db: Session = Depends(get_db)):
-    job = db.query(Job).filter(Job.id == job_id).first()
+async def job_status(job_id: str):
+    job = await get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    return {"status": job.status, "video_path": job.video_path, "error": job.error}
+    timings = json.loads(job.timings_json) if job.timings_json else None
+    out = {"status": job.status, "video_path": job.video_path, "error": job.error, "timings": timings,
+           "stage": job.stage, "progress": job.progress, **_derivative_urls(job.video_path)}
+    if job.status in ("queued", "running"):
+        out.update(await run_in_threadpool(_queue_info, job))
+    return out
+
+def _queue_info(job: Job) -> Dict[str, Any]:
+    with SessionLocal() as db:
+        return queue_info(db, job)
 
 
-# ---------- TTS: VOICE DISCOVERY ----------
-def _scan_piper_voices() -> List[Dict[str, Any]]:
+# ---------- JOB PROGRESS (SSE / WebSocket) ----------
+def _job_snapshot(job_id: str) -> Optional[Dict[str, Any]]:
+    with SessionLocal() as db:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            return None
+        snap = {"status": job.status, "video_path": job.video_path, "error": job.error,
+                "stage": job.stage, "progress": job.progress, **_derivative_urls(job.video_path)}
+        if job.timings_json:
+            snap["timings"] = json.loads(job.timings_json)
+        return snap
+
+def _snapshot_event(snap: Dict[str, Any]) -> str:
+    return snap["status"] if snap["status"] in TERMINAL else "status"
+
+async def _open_job_events(job_id: str, last_event_id: Optional[str]):
+    """
+    Bus bu işi tanımıyorsa (API yeniden başladı, iş ayrı bir worker havuzunda
+    koşuyor...) DB'den tek sefer okunan durumla açılır.
+    """
+    bus = get_bus()
+    if not bus.known(job_id):
+        snap = await run_in_threadpool(_job_snapshot, job_id)
+        if snap is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        bus.seed(job_id, _snapshot_event(snap), **snap)
+    return bus.subscribe(job_id, last_event_id)
+
+async def _job_event_stream(job_id: str, sub):
+    """
+    Olayları sırayla verir; JOB_EVENTS_KEEPALIVE boyunca olay gelmezse None
+    (keepalive). Olaylar bu sürece pompalanmıyorsa (JOB_WORKERS=0 ve ayrı
+    havuz) terminal durum keepalive'larda DB'den bir kez kontrol edilir.
+    """
+    try:
+        while True:
+            ev = await sub.next(timeout=JOB_EVENTS_KEEPALIVE)
+            if ev is None:
+                if _worker_pool is None:
+                    snap = await run_in_threadpool(_job_snapshot, job_id)
+                    if snap and snap["status"] in TERMINAL:
+                        get_bus().publish(job_id, _snapshot_event(snap), **snap)
+                yield None
+                continue
+            yield ev
+            if ev["event"] in TERMINAL or (ev["event"] == "snapshot" and ev["data"].get("event") in TERMINAL):
+                return
+    finally:
+        sub.close()
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, last_event_id: Optional[str] = None):
     """
-    PIPER_VOICES_DIR altında **/*.onnx dosyalarını bulur.
-    Her biri için {id,label,path,lang,name} döner.
+    Server-Sent Events: status / stage / progress / done / error.
+    Yeniden bağlanan EventSource `Last-Event-ID` başlığını kendisi gönderir;
+    `?last_event_id=` de kabul edilir.
     """
-    items: List[Dict[str, Any]] = []
-    if not PIPER_VOICES_DIR.exists():
-        return items
-
-    for onnx in PIPER_VOICES_DIR.rglob("*.onnx"):
-        rel = onnx.relative_to(PIPER_VOICES_DIR)
-        parts = rel.parts
-        lang = parts[0] if len(parts) > 1 else "unknown"
-        base = onnx.stem  # 'en_US-amy-medium'
-        label = f"{lang} · {base}"
-        items.append({
-            "id": str(rel).replace("/", "__"),
-            "label": label,
-            "path": str(onnx),
-            "lang": lang,
-            "name": base,
-            "config": (str(onnx) + ".json") if (onnx.parent / (onnx.name + ".json")).exists() else None,
-        })
-    # alfabetik tek tip
-    items.sort(key=lambda x: (x["lang"], x["name"]))
-    return items
+    if last_event_id is None:
+        last_event_id = request.headers.get("last-event-id") or None
+    sub = await _open_job_events(job_id, last_event_id)
+
+    async def body():
+        yield f"retry: {int(JOB_EVENTS_KEEPALIVE * 1000)}\n\n"
+        async for ev in _job_event_stream(job_id, sub):
+            if await request.is_disconnected():
+                break
+            yield ": keepalive\n\n" if ev is None else sse_format(ev)
+
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/jobs/{job_id}")
+async def job_events_ws(websocket: WebSocket, job_id: str, last_event_id: Optional[str] = None):
+    await websocket.accept()
+    try:
+        sub = await _open_job_events(job_id, last_event_id)
+    except HTTPException as e:
+        await websocket.close(code=4404, reason=e.detail)
+        return
+    try:
+        async for ev in _job_event_stream(job_id, sub):
+            await websocket.send_json({"event": "keepalive"} if ev is None else ev)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 
+# ---------- METRICS ----------
+@app.get("/api/metrics/timings")
+def timings_metrics():
+    """WAN alt adımları (wan.*) ve pipeline aşamaları (stage.*) için süre histogramları."""
+    return {"ok": True, "timings": timing_histograms()}
+
+
+# ---------- TTS: VOICE DISCOVERY ----------
 @app.get("/api/tts/voices")
-def list_voices():
+def list_voices(request: Request, lang: Optional[str] = None, gender: Optional[str] = None):
     """
     Frontend drop-down bu endpoint’i çağıracak.
+    Katalog bellekte tutulur; If-None-Match eşleşirse 304 döner.
     """
-    return {
+    registry = get_voice_registry()
+    etag = registry.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    voices = registry.find(lang=lang, gender=gender) if (lang or gender) else registry.all()
+    return JSONResponse({
         "ok": True,
         "dir": str(PIPER_VOICES_DIR),
-        "count": len(_scan_piper_voices()),
-        "voices": _scan_piper_voices(),
+        "count": len(voices),
+        "voices": voices,
         "defaults": {"female": DEFAULT_TTS_FEMALE, "male": DEFAULT_TTS_MALE},
-    }
+    }, headers=headers)
 
+@app.get("/api/tts/voices/{voice_id}")
+def get_voice(voice_id: str):
+    v = get_voice_registry().get(voice_id)
+    if not v:
+        raise HTTPException(status_code=404, detail="Voice not found")
+    return {"ok": True, "voice": v}
 
-# ---------- GENERATION PIPELINE ----------
-def _run_generation(job_id: str):
-    db = SessionLocal()
-    try:
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            return
-        import datetime as _dt
-        job.status = "running"; job.updated_at = _dt.datetime.utcnow(); db.commit()
 
-        # 1) SES
-        audio_dir = OUTPUT_DIR / "audio"; audio_dir.mkdir(parents=True, exist_ok=True)
-        audio_path = audio_dir / f"{job.id}.wav"
-        try:
-            dialogues = json.loads(job.dialogues_json or "[]")
-        except Exception:
-            dialogues = []
-        if dialogues:
-            synthesize_dialogues(dialogues, audio_path)
-        else:
-            from pydub import AudioSegment
-            AudioSegment.silent(duration=1000).export(audio_path, format="wav")
-
-        # 2) GÖRSEL + WAN
-        src = Path(job.image_path)
-        if not src.exists():
-            raise FileNotFoundError(f"image not found: {src}")
-        aspect = job.aspect or choose_aspect_from_image(str(src))
-        cropped = _center_crop_to_aspect(src, aspect)
-        base_video = run_ti2v(str(cropped), job.prompt, aspect, job.resolution)
-
-        # 3) LIPSYNC→mux
-        final_video = base_video
-        if ENABLE_MUSETALK and lipsync is not None:
-            try:
-                synced = base_video.parent / f"{base_video.stem}_synced.mp4"
-                lipsync(base_video, audio_path, synced)
-                if synced.exists():
-                    final_video = synced
-            except Exception:
-                pass
-
-        if final_video == base_video:
-            try:
-                with_audio = base_video.parent / f"{base_video.stem}_with_audio.mp4"
-                mux_audio_to_video(base_video, audio_path, with_audio)
-                if with_audio.exists():
-                    final_video = with_audio
-            except Exception:
-                final_video = base_video
-
-        job.video_path = _rel_url(final_video)
-        job.status = "done"; job.updated_at = _dt.datetime.utcnow(); db.commit()
-
-    except Exception as e:
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if job:
-            import datetime as _dt
-            job.status = "error"; job.error = str(e); job.updated_at = _dt.datetime.utcnow(); db.commit()
-    finally:
-        db.close()
+@app.post("/api/tts/warmup")
+def tts_warmup(payload: TTSWarmupPayload, current_user: CurrentUser = Depends(get_current_user)):
+    """
+    Sık kullanılan cümleleri (selamlaşma, slogan...) verilen ses için önceden
+    sentezleyip phrase cache'e yazar.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    if payload.voicePath:
+        model = Path(payload.voicePath)
+    elif payload.voiceId:
+        v = get_voice_registry().get(payload.voiceId)
+        model = Path(v["path"]) if v else PIPER_VOICES_DIR / payload.voiceId.replace("__", "/")
+    else:
+        raise HTTPException(status_code=422, detail="voiceId or voicePath required")
+    if model.suffix != ".onnx" or not model.exists():
+        raise HTTPException(status_code=404, detail="Voice not found")
+    return {"ok": True, **warmup_phrases(str(model), payload.phrases)}
 
+
+# ---------- GENERATION ----------
 @app.post("/api/generate-s2v")
-def generate(payload: GeneratePayload, bg: BackgroundTasks, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def generate(payload: GeneratePayload, current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
     job_id = uuid.uuid4().hex[:12]
     imgp = _to_local_image_path(payload.imagePath)
     p = Path(imgp)
     if not p.exists():
         raise HTTPException(status_code=404, detail="Image not found")
-    aspect = (payload.aspect or choose_aspect_from_image(str(p)))
+    if payload.aspect:
+        aspect = payload.aspect
+    else:
+        up = db.query(Upload).filter(Upload.path == str(p)).first()
+        aspect = ("16:9" if up.w >= up.h else "9:16") if (up and up.w and up.h) else choose_aspect_from_image(str(p))
 
     job = Job(
         id=job_id,
@@ -323,15 +457,19 @@ def generate(payload: GeneratePayload, bg: BackgroundTasks, current_user: User =
         dialogues_json=json.dumps([d.dict() for d in payload.dialogues]) if payload.dialogues else "[]",
         status="queued"
     )
-    db.add(job); db.commit()
-    bg.add_task(_run_generation, job_id)
-    return {"job_id": job_id}
+    # kredi ayrılır + adil paylaşım etiketi; worker havuzu claim_next() ile alır
+    try:
+        admit(db, job, current_user)
+    except AdmissionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if current_user:
+        invalidate_user(current_user.id)   # kredi değişti
+    emit(job_id, "status", status="queued")
+    return {"job_id": job_id, "credits_reserved": job.credit_cost, **queue_info(db, job)}
 
 
 # ---------- STATIC OUTPUTS ----------
-@app.get("/outputs/{path:path}")
-def get_output(path: str):
-    fpath = OUTPUT_DIR / path
-    if not fpath.exists():
-        raise HTTPException(status_code=404, detail="file not found")
-    return FileResponse(str(fpath))
+@app.api_route("/outputs/{path:path}", methods=["GET", "HEAD"])
+def get_output(path: str, request: Request):
+    # Range (206), ETag/Last-Modified (304) ve cache başlıkları: bkz. static_files.py
+    return serve_file(request, OUTPUT_DIR, path)
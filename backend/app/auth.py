@@ -1,19 +1,17 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
 import jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect as sa_inspect
 from .db import SessionLocal, User
-from .config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256", "bcrypt"],
-    default="pbkdf2_sha256",
-    deprecated="auto",
-    bcrypt__truncate_error=False
-)
+from .config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_CACHE_TTL, AUTH_CACHE_MAX
+from .passwords import hash_password, verify_password, hash_password_async, verify_password_async  # noqa: F401
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 def get_db():
@@ -23,11 +21,8 @@ def get_db():
     finally:
         db.close()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hash_password(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -36,7 +31,127 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """get_current_user'ın döndürdüğü, session'a bağlı olmayan kullanıcı görüntüsü."""
+    id: int
+    name: Optional[str]
+    email: str
+    role: str
+    credits: int
+
+    @classmethod
+    def from_row(cls, u: User) -> "CurrentUser":
+        return cls(id=u.id, name=u.name, email=u.email, role=u.role or "user", credits=u.credits or 0)
+
+
+class TokenCache:
+    """
+    Doğrulanmış token -> CurrentUser, TTL + boyut sınırlı (LRU).
+
+    Anahtar token'ın kendisidir: aynı bayt dizisi daha önce imza/exp
+    kontrolünden geçtiyse tekrar doğrulanmaz. Kayıt en geç token'ın exp
+    anında düşer. Rol/kredi değişince invalidate_user çağrılır; başka
+    süreçteki değişiklikler en geç AUTH_CACHE_TTL sonra görünür.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, CurrentUser]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self.hits = self.misses = self.expired = self.evictions = self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        with self._lock:
+            item = self._entries.get(token)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, user = item
+            if time.monotonic() >= expires:
+                self._drop(token)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def put(self, token: str, user: CurrentUser, token_exp: Optional[float] = None):
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (time.monotonic() + ttl, user)
+            self._by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._drop(token)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, token: str):
+        item = self._entries.pop(token, None)
+        if item is None:
+            return
+        tokens = self._by_user.get(item[1].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[item[1].id]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"enabled": self.enabled, "entries": len(self._entries), "hits": self.hits,
+                    "misses": self.misses, "hit_rate": round(self.hits / total, 4) if total else None,
+                    "expired": self.expired, "evictions": self.evictions,
+                    "invalidations": self.invalidations}
+
+
+_token_cache = TokenCache()
+
+def token_cache() -> TokenCache:
+    return _token_cache
+
+def invalidate_user(user_id: int):
+    """Rol/kredi/silme gibi değişikliklerden sonra çağrılmalı."""
+    _token_cache.invalidate_user(user_id)
+
+@event.listens_for(User, "after_update")
+def _invalidate_on_change(_mapper, _conn, target: User):
+    # ORM üzerinden yapılan rol/kredi değişiklikleri otomatik düşer;
+    # toplu UPDATE ifadelerinden sonra invalidate_user elle çağrılmalı
+    state = sa_inspect(target)
+    if any(state.attrs[k].history.has_changes() for k in ("role", "credits", "email", "name")):
+        _token_cache.invalidate_user(target.id)
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    cache = _token_cache
+    if cache.enabled:
+        user = cache.get(token)
+        if user is not None:
+            return user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.ExpiredSignatureError:
@@ -46,7 +161,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user_id = payload.get("sub")
     if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid token payload")
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
+    with SessionLocal() as db:
+        row = db.query(User).filter(User.id == int(user_id)).first()
+        if not row:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = CurrentUser.from_row(row)
+    if cache.enabled:
+        cache.put(token, user, payload.get("exp"))
     return user
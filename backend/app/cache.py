@@ -0,0 +1,271 @@
+"""
+İçerik adresli sonuç cache'i (OUTPUT_DIR/cache).
+
+Katmanlar bağımsız kullanılabilir:
+  tts   -> diyaloglardan üretilen wav        (anahtar: ses girdileri)
+  wan   -> ses eklenmemiş WAN videosu        (anahtar: crop görüntü + WAN ayarları)
+  final -> mux/lipsync sonrası teslim videosu (anahtar: wan + tts)
+           (wan/final yalnız sabit WAN_SEED ile; -1 rastgele tohumda kullanılmaz)
+  phrase -> tek diyalog satırının wav'ı       (anahtar: ses modeli + config + metin)
+
+Sadece diyalog değişirse wan katmanı, sadece prompt değişirse tts katmanı
+yeniden kullanılır. Dosyalar `<layer>/<key[:2]>/<key><ext>` altında durur;
+erişimde mtime güncellenir ve toplam boyut CACHE_MAX_BYTES'ı aşınca en eski
+kullanılanlar silinir (LRU); phrase katmanının kendi bütçesi vardır
+(TTS_PHRASE_CACHE_MAX_BYTES). İş dizinlerindeki çıktılar cache girişlerine
+hardlink'tir: boyut inode başına bir kez sayılır ve bütçe yalnız cache'in tek
+sahibi olduğu dosyaları kapsar (iş dizinine bağlı bir girişi silmek yer
+açmaz); teslim edilmiş sonuçlar evict ile asla silinmez. Hit/miss sayaçları süreçler arası paylaşılsın
+diye `cache_stats` tablosunda tutulur; bellekte biriktirilip toplu yazılır.
+"""
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import update
+
+from .db import SessionLocal, CacheStat
+from .config import (
+    OUTPUT_DIR, CACHE_MAX_BYTES, ENABLE_RESULT_CACHE, TTS_PHRASE_CACHE_MAX_BYTES,
+    CACHE_STATS_FLUSH_INTERVAL,
+)
+
+CACHE_DIR = OUTPUT_DIR / "cache"
+LAYERS = ("tts", "wan", "final", "phrase")
+# ayrı bütçeli katmanlar; geri kalanlar CACHE_MAX_BYTES'ı paylaşır
+LAYER_BUDGETS = {"phrase": TTS_PHRASE_CACHE_MAX_BYTES}
+EVICT_INTERVAL = 30.0
+
+_evict_lock = threading.Lock()
+_last_evict: Dict[str, float] = {}
+
+
+def hash_key(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        if isinstance(p, (bytes, bytearray)):
+            h.update(p)
+        else:
+            h.update(json.dumps(p, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_digest(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _entry(layer: str, key: str, ext: str) -> Path:
+    return CACHE_DIR / layer / key[:2] / f"{key}{ext}"
+
+
+class _StatBatcher:
+    """
+    Hit/miss sayaçlarını bellekte biriktirir; arka plan thread'i bunları
+    CACHE_STATS_FLUSH_INTERVAL'da bir tek transaction'da `cache_stats`'a
+    ekler (bkz. jobqueue.StatusBatcher). Her lookup'ta SQLite yazıcı kilidi
+    alınmaz; süreç çıkarken kalanlar yazılır.
+    """
+
+    def __init__(self, interval: float = CACHE_STATS_FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, layer: str, hit: bool):
+        with self._lock:
+            self._pending.setdefault(layer, [0, 0])[0 if hit else 1] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cache-stats-flush", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            db = SessionLocal()
+            try:
+                for layer, (hits, misses) in pending.items():
+                    res = db.execute(update(CacheStat).where(CacheStat.layer == layer).values(
+                        {CacheStat.hits: CacheStat.hits + hits, CacheStat.misses: CacheStat.misses + misses}))
+                    if res.rowcount == 0:
+                        db.add(CacheStat(layer=layer, hits=hits, misses=misses))
+                db.commit()
+            except Exception:
+                db.rollback()
+            finally:
+                db.close()
+
+
+_stats = _StatBatcher()
+
+
+def _count(layer: str, hit: bool):
+    _stats.add(layer, hit)
+
+
+def _link_or_copy(src: Path, dst: Path):
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f"{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def contains(layer: str, key: str, ext: str) -> bool:
+    return ENABLE_RESULT_CACHE and _entry(layer, key, ext).exists()
+
+
+def get(layer: str, key: str, ext: str, dst: Optional[Path] = None, count: bool = True) -> Optional[Path]:
+    """
+    Hit ise dosyayı döner. `dst` verilirse giriş oraya hardlink'lenir (aynı
+    inode; iş dizinindeki bağ kaldıkça giriş evict edilmez). Yan dosyalar
+    (poster vb.) için count=False: hit/miss sayaçlarına yazılmaz.
+    """
+    if not ENABLE_RESULT_CACHE:
+        return None
+    p = _entry(layer, key, ext)
+    if not p.exists():
+        if count:
+            _count(layer, False)
+        return None
+    try:
+        os.utime(p)  # LRU: son erişim
+    except OSError:
+        pass
+    if count:
+        _count(layer, True)
+    if dst is None:
+        return p
+    _link_or_copy(p, Path(dst))
+    return Path(dst)
+
+
+def put(layer: str, key: str, src: Path) -> Optional[Path]:
+    if not ENABLE_RESULT_CACHE or not Path(src).exists():
+        return None
+    p = _entry(layer, key, Path(src).suffix)
+    _link_or_copy(Path(src), p)
+    _maybe_evict(layer)
+    return p
+
+
+def put_bytes(layer: str, key: str, ext: str, data: bytes) -> Optional[Path]:
+    if not ENABLE_RESULT_CACHE:
+        return None
+    p = _entry(layer, key, ext)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, p)
+    _maybe_evict(layer)
+    return p
+
+
+def _maybe_evict(layer: str):
+    # put'lar (iş aşamalarının içinde) her seferinde tüm cache'i taramasın
+    group = layer if layer in LAYER_BUDGETS else "*"
+    now = time.monotonic()
+    if now - _last_evict.get(group, 0.0) < EVICT_INTERVAL:
+        return
+    _last_evict[group] = now
+    if group == "*":
+        evict()
+    else:
+        evict(LAYER_BUDGETS[group], layers=(group,))
+
+
+def _iter_entries(layers: Iterable[str]) -> Iterable[os.DirEntry]:
+    for layer in layers:
+        root = CACHE_DIR / layer
+        if not root.exists():
+            continue
+        for shard in os.scandir(root):
+            if shard.is_dir():
+                yield from (e for e in os.scandir(shard.path) if e.is_file())
+
+
+def evict(max_bytes: int = CACHE_MAX_BYTES, layers: Optional[Iterable[str]] = None) -> int:
+    """
+    Cache'in tek sahibi olduğu dosyaların toplamı max_bytes altına inene
+    kadar en eski erişilenleri siler. Boyut inode başına bir kez sayılır;
+    iş dizinlerine de hardlink'li (st_nlink > cache bağı sayısı) girişler
+    teslim edilmiş sonuçlarla aynı baytlardır: silinmeleri yer açmaz, bütçeye
+    sayılmaz ve dokunulmaz. İş dizinlerindeki dosyalar hiçbir zaman silinmez.
+    """
+    if layers is None:
+        layers = [l for l in LAYERS if l not in LAYER_BUDGETS]
+    with _evict_lock:
+        entries = []
+        refs: Dict[Tuple[int, int], int] = {}
+        nlinks: Dict[Tuple[int, int], int] = {}
+        sizes: Dict[Tuple[int, int], int] = {}
+        for e in _iter_entries(layers):
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            ino = (st.st_dev, st.st_ino)
+            entries.append((st.st_mtime, e.path, ino))
+            refs[ino] = refs.get(ino, 0) + 1
+            nlinks[ino] = st.st_nlink
+            sizes[ino] = st.st_size
+        # yalnız cache girişlerinin tuttuğu inode'lar; iş dizinine bağlı olanlar sayılmaz
+        owned = {ino for ino in refs if nlinks[ino] <= refs[ino]}
+        total = sum(sizes[ino] for ino in owned)
+        if total <= max_bytes:
+            return 0
+        removed = 0
+        for _, path, ino in sorted(entries):
+            if total <= max_bytes:
+                break
+            if ino not in owned:
+                continue
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                continue
+            refs[ino] -= 1
+            if not refs[ino]:
+                total -= sizes[ino]
+        return removed
+
+
+def stats() -> Dict[str, Any]:
+    _stats.flush()  # bu sürecin biriken sayaçları da görünsün
+    db = SessionLocal()
+    try:
+        rows = {r.layer: r for r in db.query(CacheStat).all()}
+    finally:
+        db.close()
+    out: Dict[str, Any] = {"enabled": ENABLE_RESULT_CACHE, "max_bytes": CACHE_MAX_BYTES}
+    for layer in LAYERS:
+        r = rows.get(layer)
+        hits, misses = (r.hits or 0, r.misses or 0) if r else (0, 0)
+        total = hits + misses
+        out[layer] = {"hits": hits, "misses": misses,
+                      "hit_rate": round(hits / total, 4) if total else None}
+    return out
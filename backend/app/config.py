@@ -11,10 +11,38 @@ DEFAULT_WAN_CKPT_TI2V5B = Path(os.environ.get(
     str(BACKEND_ROOT / "models" / "Wan2.2-TI2V-5B")
 ))
 
+# WAN çalıştırma modu:
+#   subprocess -> her iş için generate.py (eski yol)
+#   worker     -> modelleri bir kez yükleyen kalıcı WanTI2V süreci
+WAN_MODE = os.environ.get("WAN_MODE", "subprocess").strip().lower()
+WAN_WORKER_START_TIMEOUT = float(os.environ.get("WAN_WORKER_START_TIMEOUT", "900"))
+
+# WAN örnekleme ayarları (boş/0/-1 -> generate.py varsayılanı)
+WAN_SEED = int(os.environ.get("WAN_SEED", "-1"))
+WAN_SAMPLE_STEPS = int(os.environ.get("WAN_SAMPLE_STEPS", "0"))
+WAN_SAMPLE_SOLVER = os.environ.get("WAN_SAMPLE_SOLVER", "unipc")
+WAN_NEG_PROMPT = os.environ.get("WAN_NEG_PROMPT", "")
+# decode edilen parçaları doğrudan ffmpeg stdin'ine akıt (0 -> imageio save_video)
+WAN_STREAM_VIDEO = os.environ.get("WAN_STREAM_VIDEO", "1") == "1"
+# CFG koşullu/koşulsuz dallarını tek batch-of-2 forward'da koştur:
+#   auto -> boş GPU belleği yetiyorsa, true/false -> zorla
+WAN_BATCH_CFG = os.environ.get("WAN_BATCH_CFG", "auto").strip().lower()
+# attention çekirdeği (wan.modules.attention registry'si):
+#   auto -> fa3 > fa2 > sdpa (CUDA), sdpa (CPU); fa3 | fa2 | sdpa | chunked -> zorla
+WAN_ATTN_BACKEND = os.environ.get("WAN_ATTN_BACKEND", "auto").strip().lower()
+# T5 metin gömmesi cache'i: bellekte LRU + diskte safetensors (boş -> yalnız bellek).
+# Negatif prompt worker açılışında hesaplanır.
+WAN_T5_CACHE_SIZE = int(os.environ.get("WAN_T5_CACHE_SIZE", "32"))
+WAN_T5_CACHE_DIR = os.environ.get("WAN_T5_CACHE_DIR", str(HOME / "dev" / ".VizoAi" / "t5_cache"))
+
 # Çıktılar
 OUTPUT_DIR = Path(os.environ.get("VIZOAI_OUTPUT_DIR", str(HOME / "dev" / ".VizoAi" / "outputs")))
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Upload
+UPLOAD_MAX_BYTES = int(float(os.environ.get("UPLOAD_MAX_MB", "25")) * (1 << 20))
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", str(1 << 20)))
+
 # JWT/DB
 SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-change-me")
 ALGORITHM = os.environ.get("ALGORITHM", "HS256")
@@ -25,12 +53,29 @@ DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 # CUDA
 CUDA_DEVICE = os.environ.get("CUDA_DEVICE", "cuda:0")
 GPU_MEMORY_FRACTION = float(os.environ.get("GPU_MEMORY_FRACTION", "0.9"))
+# WAN işlerinin dağıtıldığı cihazlar (en az yüklü olana yerleşir, bkz. services/gpu_pool.py):
+#   ""              -> yalnız CUDA_DEVICE (tek cihaz)
+#   "auto"          -> görünen tüm GPU'lar (CUDA_VISIBLE_DEVICES / nvidia-smi)
+#   "cuda:0,cuda:1" -> liste ("0,1" de olur)
+#   "fake:N"        -> N sahte cihaz; yalnız yerleşim mantığını CPU'da denemek için
+WAN_DEVICES = os.environ.get("WAN_DEVICES", "")
+# >1 -> ardışık cihazlar bir grup olur; iş grupta torchrun + use_sp/DiT FSDP ile koşar
+WAN_DEVICE_GROUP_SIZE = int(os.environ.get("WAN_DEVICE_GROUP_SIZE", "1"))
+# cihaz hatasından sonra cihazın yeni iş almadığı süre
+WAN_DEVICE_COOLDOWN = float(os.environ.get("WAN_DEVICE_COOLDOWN", "300"))
 
 # Binaries
 FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "ffmpeg")
 PIPER_BIN = os.environ.get("PIPER_BIN", "piper")
 
+# Finalizasyon (tek ffmpeg çağrısı): poster + düşük çözünürlüklü önizleme; 0 -> üretme
+FINAL_THUMB_WIDTH = int(os.environ.get("FINAL_THUMB_WIDTH", "640"))
+FINAL_PREVIEW_HEIGHT = int(os.environ.get("FINAL_PREVIEW_HEIGHT", "240"))
+FINAL_CRF = int(os.environ.get("FINAL_CRF", "18"))   # yalnız re-encode gerektiğinde
+
 # Optional Piper voices
+PIPER_VOICES_DIR = Path(os.environ.get("PIPER_VOICES_DIR", "/workspace/models/piper-voices"))
+VOICE_REGISTRY_CHECK_INTERVAL = float(os.environ.get("VOICE_REGISTRY_CHECK_INTERVAL", "10"))
 PIPER_VOICE_FEMALE = os.environ.get("PIPER_VOICE_FEMALE", "")
 PIPER_VOICE_MALE = os.environ.get("PIPER_VOICE_MALE", "")
 
@@ -38,3 +83,59 @@ PIPER_VOICE_MALE = os.environ.get("PIPER_VOICE_MALE", "")
 ENABLE_MUSETALK = os.environ.get("ENABLE_MUSETALK", "0") == "1"
 MUSETALK_DIR = Path(os.environ.get("MUSETALK_DIR", str(BACKEND_ROOT / "models" / "MuseTalk")))
 
+
+# İş kuyruğu (SQLite jobs tablosu üzerinde)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))              # 0 -> API süreci iş çalıştırmaz
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "120"))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+GPU_STAGE_CONCURRENCY = int(os.environ.get("GPU_STAGE_CONCURRENCY", "1"))  # cihaz (grubu) başına
+
+# Sonuç cache'i (OUTPUT_DIR/cache, LRU)
+ENABLE_RESULT_CACHE = os.environ.get("ENABLE_RESULT_CACHE", "1") == "1"
+CACHE_MAX_BYTES = int(float(os.environ.get("CACHE_MAX_GB", "20")) * (1 << 30))
+TTS_PHRASE_CACHE_MAX_BYTES = int(float(os.environ.get("TTS_PHRASE_CACHE_MAX_MB", "512")) * (1 << 20))
+CACHE_STATS_FLUSH_INTERVAL = float(os.environ.get("CACHE_STATS_FLUSH_INTERVAL", "5.0"))  # hit/miss sayaç yazımı
+
+# İş ilerleme olayları (SSE / WebSocket)
+JOB_EVENTS_BUFFER = int(os.environ.get("JOB_EVENTS_BUFFER", "256"))            # iş başına saklanan son olay
+JOB_EVENTS_KEEPALIVE = float(os.environ.get("JOB_EVENTS_KEEPALIVE", "15"))
+JOB_EVENTS_RETAIN_SECONDS = float(os.environ.get("JOB_EVENTS_RETAIN_SECONDS", "600"))
+
+# SQLite bağlantı havuzu / pragmalar
+DB_WAL = os.environ.get("DB_WAL", "1") == "1"
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+JOB_STATUS_FLUSH_INTERVAL = float(os.environ.get("JOB_STATUS_FLUSH_INTERVAL", "1.0"))  # worker durum yazımı
+
+# Parola hash havuzu (0 -> havuz yok, hash thread'de)
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", str(max(1, PASSWORD_HASH_WORKERS) * 8)))
+
+# Async DB yolu (aiosqlite kuruluysa); 0 -> sync session'lar threadpool'da
+ASYNC_DB = os.environ.get("ASYNC_DB", "1") == "1"
+
+# Doğrulanmış token cache'i (get_current_user); TTL, rol/kredi değişikliğinin
+# başka süreçlere en geç ne zaman yansıyacağını da belirler
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "30"))   # 0 -> kapalı
+AUTH_CACHE_MAX = int(os.environ.get("AUTH_CACHE_MAX", "10000"))
+
+# Zamanlayıcı: kabul kontrolü, adil paylaşım, kredi, ETA
+def _kv_env(name: str, default: str) -> dict:
+    """"480p:10,720p:20" -> {"480p": 10.0, "720p": 20.0}"""
+    out = {}
+    for part in os.environ.get(name, default).split(","):
+        k, _, v = part.partition(":")
+        if k.strip() and v.strip():
+            out[k.strip()] = float(v)
+    return out
+
+USER_MAX_ACTIVE_JOBS = int(os.environ.get("USER_MAX_ACTIVE_JOBS", "5"))    # queued + running
+USER_MAX_RUNNING_JOBS = int(os.environ.get("USER_MAX_RUNNING_JOBS", "1"))
+JOB_CREDIT_COST = _kv_env("JOB_CREDIT_COST", "480p:10,720p:20")           # çözünürlük -> kredi
+FAIR_SHARE_WEIGHTS = _kv_env("FAIR_SHARE_WEIGHTS", "user:1,admin:2")        # rol -> ağırlık
+ETA_DEFAULT_SECONDS = _kv_env("ETA_DEFAULT_SECONDS", "480p:300,720p:900")   # geçmiş yoksa
+ETA_HISTORY_JOBS = int(os.environ.get("ETA_HISTORY_JOBS", "50"))
+ETA_CACHE_SECONDS = float(os.environ.get("ETA_CACHE_SECONDS", "60"))
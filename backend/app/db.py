@@ -1,9 +1,43 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime
+import threading
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, Float, Index
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 from datetime import datetime
-from .config import DB_PATH
+from .config import (
+    DB_PATH, DB_WAL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_BUSY_TIMEOUT_MS,
+)
 
-engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    if DB_WAL:
+        # okuyucular yazıcıyı beklemez; commit'te fsync yerine checkpoint
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA cache_size=-16000")  # ~16 MB
+    cur.close()
+
+def make_engine(path=DB_PATH, tuned: bool = True):
+    """
+    tuned=False eski varsayılan engine'dir (rollback journal, varsayılan havuz);
+    benchmarks/bench_db.py karşılaştırma için kullanır.
+    """
+    url = f"sqlite:///{path}"
+    if not tuned:
+        return create_engine(url, connect_args={"check_same_thread": False})
+    eng = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_MS / 1000},
+        poolclass=QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    event.listen(eng, "connect", _sqlite_pragmas)
+    return eng
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -27,6 +61,9 @@ class Upload(Base):
     w = Column(Integer, default=0); h = Column(Integer, default=0)
     preview_url = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_uploads_path", "path"),   # generate / faces: path -> upload
+    )
 
 class Face(Base):
     __tablename__ = "faces"
@@ -60,10 +97,76 @@ class Job(Base):
     error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    # kuyruk: claim/lease + heartbeat
+    lease_owner = Column(String(64), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    timings_json = Column(Text, nullable=True)   # {"tts": 1.2, "wan": 310.5, ...}
+    # ilerleme: aktif aşama + WAN denoising adımına göre 0..1
+    stage = Column(String(32), nullable=True)
+    progress = Column(Float, default=0.0)
+    # zamanlayıcı: ayrılan kredi (reserved -> charged | refunded) ve WFQ bitiş etiketi
+    credit_cost = Column(Integer, default=0)
+    credit_state = Column(String(16), nullable=True)
+    fair_tag = Column(Float, nullable=True)
+    __table_args__ = (
+        Index("ix_jobs_user_status_created", "user_id", "status", "created_at"),
+        Index("ix_jobs_status_created", "status", "created_at"),   # requeue
+        Index("ix_jobs_status_fair", "status", "fair_tag", "created_at"),   # claim_next
+    )
+
+class CacheStat(Base):
+    __tablename__ = "cache_stats"
+    layer = Column(String(16), primary_key=True)
+    hits = Column(Integer, default=0)
+    misses = Column(Integer, default=0)
+
+class TimingStat(Base):
+    """Süre histogramı; bucket = metrics.BUCKETS indeksi (kümülatif değil)."""
+    __tablename__ = "timing_stats"
+    name = Column(String(48), primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)
+    total = Column(Float, default=0.0)
+
+# migrate_schema'ya kolon/index eklerken artır: ensure_schema yalnızca
+# PRAGMA user_version bundan küçükse migrate çalıştırır
+SCHEMA_VERSION = 4
+
+# sonradan eklenen index'ler (create_all mevcut tablolara index eklemez)
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_jobs_user_status_created ON jobs (user_id, status, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_uploads_path ON uploads (path)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_status_fair ON jobs (status, fair_tag, created_at)",
+)
+
+_schema_lock = threading.Lock()
+_schema_ready = False
 
 def init_db():
     Base.metadata.create_all(bind=engine)
 
+def ensure_schema():
+    """
+    Tablo oluşturma + migrate, süreç başına bir kez ve yalnızca DB şeması
+    eskiyse çalışır (PRAGMA user_version).
+    """
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with engine.connect() as conn:
+            version = conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+        if version < SCHEMA_VERSION:
+            init_db()
+            migrate_schema(engine)
+            with engine.connect() as conn:
+                conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.commit()
+        _schema_ready = True
+
 def migrate_schema(engine):
     conn = engine.connect()
     try:
@@ -80,6 +183,32 @@ def migrate_schema(engine):
             conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN job_uid VARCHAR(64)")
         if "updated_at" not in cols:
             conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN updated_at DATETIME")
+        if "lease_owner" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN lease_owner VARCHAR(64)")
+        if "lease_expires_at" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN lease_expires_at DATETIME")
+        if "heartbeat_at" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN heartbeat_at DATETIME")
+        if "attempts" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN attempts INTEGER DEFAULT 0")
+        if "timings_json" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN timings_json TEXT")
+        if "stage" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN stage VARCHAR(32)")
+        if "progress" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN progress FLOAT DEFAULT 0")
+        if "credit_cost" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN credit_cost INTEGER DEFAULT 0")
+        if "credit_state" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN credit_state VARCHAR(16)")
+        if "fair_tag" not in cols:
+            conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN fair_tag FLOAT")
     except Exception:
         pass
+    for ddl in _INDEXES:
+        try:
+            conn.exec_driver_sql(ddl)
+        except Exception:
+            pass
+    conn.commit()
     conn.close()
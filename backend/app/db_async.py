@@ -0,0 +1,126 @@
+"""
+User / Job / Upload için async veri erişimi.
+
+aiosqlite kuruluysa ve ASYNC_DB=1 ise sorgular AsyncSession ile doğrudan
+event loop'ta çalışır (threadpool'dan thread tutmaz). Sürücü yoksa aynı
+fonksiyonlar sync engine'i threadpool'da çalıştırır; handler'lar her iki
+durumda da aynı `await` çağrısını yapar.
+
+Dönen nesneler session'dan ayrılmıştır (expire_on_commit=False): okunabilir,
+ama lazy-load / yazma için kullanılmamalıdır.
+"""
+import datetime as _dt
+from typing import Any, Optional
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from .db import engine, _sqlite_pragmas, User, Job, Upload
+from .config import ASYNC_DB, DB_PATH, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_BUSY_TIMEOUT_MS
+
+try:
+    import aiosqlite  # noqa: F401
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    ASYNC_AVAILABLE = True
+except ImportError:
+    ASYNC_AVAILABLE = False
+
+ASYNC_ENABLED = ASYNC_DB and ASYNC_AVAILABLE
+
+
+def make_async_engine(path=DB_PATH):
+    eng = create_async_engine(
+        f"sqlite+aiosqlite:///{path}",
+        connect_args={"timeout": DB_BUSY_TIMEOUT_MS / 1000},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    # WAL / busy_timeout vb. sync engine ile aynı
+    event.listen(eng.sync_engine, "connect", _sqlite_pragmas)
+    return eng
+
+
+async_engine = make_async_engine() if ASYNC_ENABLED else None
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False) if async_engine else None
+_SyncSession = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+# ---------- çekirdek ----------
+async def _first(stmt) -> Optional[Any]:
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as s:
+            return (await s.execute(stmt)).scalars().first()
+
+    def run():
+        with _SyncSession() as s:
+            return s.execute(stmt).scalars().first()
+    return await run_in_threadpool(run)
+
+
+async def _add(obj):
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as s:
+            s.add(obj)
+            await s.commit()
+            return obj
+
+    def run():
+        with _SyncSession() as s:
+            s.add(obj)
+            s.commit()
+            return obj
+    return await run_in_threadpool(run)
+
+
+async def _execute(stmt) -> int:
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as s:
+            res = await s.execute(stmt)
+            await s.commit()
+            return res.rowcount
+
+    def run():
+        with _SyncSession() as s:
+            res = s.execute(stmt)
+            s.commit()
+            return res.rowcount
+    return await run_in_threadpool(run)
+
+
+# ---------- users ----------
+async def get_user(user_id: int) -> Optional[User]:
+    return await _first(select(User).where(User.id == user_id))
+
+
+async def get_user_by_email(email: str) -> Optional[User]:
+    return await _first(select(User).where(User.email == email))
+
+
+async def create_user(name: str, email: str, password_hash: str) -> User:
+    """Aynı e-posta eşzamanlı kaydedilirse sqlalchemy IntegrityError yükselir."""
+    return await _add(User(name=name, email=email, password_hash=password_hash))
+
+
+async def touch_login(user_id: int) -> None:
+    await _execute(update(User).where(User.id == user_id).values(last_login=_dt.datetime.utcnow()))
+
+
+# ---------- jobs ----------
+async def get_job(job_id: str) -> Optional[Job]:
+    return await _first(select(Job).where(Job.id == job_id))
+
+
+# ---------- uploads ----------
+async def get_upload_by_path(path: str) -> Optional[Upload]:
+    return await _first(select(Upload).where(Upload.path == path))
+
+
+async def create_upload(user_id: Optional[int], path: str, w: int, h: int) -> Upload:
+    return await _add(Upload(user_id=user_id, path=path, w=w, h=h, preview_url=None))
+
+
+async def dispose():
+    if async_engine is not None:
+        await async_engine.dispose()
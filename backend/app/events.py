@@ -0,0 +1,238 @@
+"""
+İş ilerleme olayları için süreç içi pub/sub.
+
+Worker'lar `emit(job_id, event, **data)` çağırır:
+  status   -> {"status": "queued" | "running"}
+  stage    -> {"stage": "wan", "state": "start" | "done", "seconds": ...}
+  progress -> {"stage": "wan", "step": 12, "total": 50, "seconds": 4.1}
+  timing   -> {"stage": "wan", "name": "vae_decode", "seconds": 9.8}
+  done     -> {"video_path": ...}            (terminal)
+  error    -> {"error": ...}                 (terminal)
+
+Worker süreçleri (WorkerPool) olayları bir multiprocessing kuyruğuna yazar;
+API sürecindeki pompa thread'i bunları ProgressBus'a aktarır. Her iş için son
+JOB_EVENTS_BUFFER olay artan `id` ile saklanır; yeniden bağlanan abone
+Last-Event-ID'den sonrasını alır, tampondan düşmüşse önce bir `snapshot`
+(işin son durumu) gönderilir.
+
+Id'ler `<epoch>-<sıra>` biçimindedir; epoch süreç başına rastgeledir. Sıra
+her süreçte 1'den başladığı için API yeniden başlayınca (ya da başka bir
+sürece düşünce) eski id'ler bu epoch'la eşleşmez ve abone snapshot alır.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from .config import JOB_EVENTS_BUFFER, JOB_EVENTS_RETAIN_SECONDS
+
+log = logging.getLogger("vizoai.events")
+
+TERMINAL = ("done", "error")
+GC_INTERVAL = 30.0
+
+Event = Dict[str, Any]  # {"id": "<epoch>-<seq>", "event": str, "data": dict}
+
+
+class _Channel:
+    __slots__ = ("events", "next_id", "state", "subscribers", "closed", "touched")
+
+    def __init__(self, maxlen: int):
+        self.events: Deque[Event] = deque(maxlen=maxlen)
+        self.next_id = 1
+        self.state: Dict[str, Any] = {}
+        self.subscribers: Set["Subscription"] = set()
+        self.closed = False
+        self.touched = time.monotonic()
+
+
+class Subscription:
+
+    def __init__(self, bus: "ProgressBus", job_id: str, backlog: List[Event]):
+        self._bus = bus
+        self.job_id = job_id
+        self._backlog = deque(backlog)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+
+    def _deliver(self, ev: Event):
+        # publish herhangi bir thread'den gelebilir
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, ev)
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """Sıradaki olay; `timeout` içinde gelmezse None (keepalive için)."""
+        if self._backlog:
+            return self._backlog.popleft()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._bus._unsubscribe(self)
+
+
+class ProgressBus:
+
+    def __init__(self, buffer: int = JOB_EVENTS_BUFFER, retain_seconds: float = JOB_EVENTS_RETAIN_SECONDS):
+        self.buffer = buffer
+        self.retain_seconds = retain_seconds
+        self._lock = threading.Lock()
+        self._channels: Dict[str, _Channel] = {}
+        self._gc_at = 0.0
+        self.epoch = secrets.token_hex(4)
+
+    def _event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def _parse_id(self, event_id: Optional[str]) -> Optional[int]:
+        """Bu sürecin id'si ise sıra numarası; başka epoch / bozuk ise None."""
+        epoch, _, seq = str(event_id).rpartition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, job_id: str, event: str, **data) -> Optional[str]:
+        """Olayı yayınlar ve id'sini döner; iş zaten kapanmışsa yok sayılır."""
+        with self._lock:
+            ch = self._channels.get(job_id)
+            if ch is None:
+                ch = self._channels[job_id] = _Channel(self.buffer)
+            if ch.closed:
+                return None
+            ev = {"id": self._event_id(ch.next_id), "event": event, "data": data}
+            ch.next_id += 1
+            ch.events.append(ev)
+            ch.state.update(data)
+            ch.state["event"] = event
+            ch.touched = time.monotonic()
+            ch.closed = event in TERMINAL
+            subs = list(ch.subscribers)
+        for sub in subs:
+            try:
+                sub._deliver(ev)
+            except RuntimeError:  # abonenin event loop'u kapanmış
+                self._unsubscribe(sub)
+        self._maybe_gc()
+        return ev["id"]
+
+    def seed(self, job_id: str, event: str, **data) -> bool:
+        """Kanal yoksa (ör. API yeniden başladı) DB'den okunan durumla açar."""
+        with self._lock:
+            if job_id in self._channels:
+                return False
+        return self.publish(job_id, event, **data) is not None
+
+    def known(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._channels
+
+    def state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            ch = self._channels.get(job_id)
+            return dict(ch.state) if ch else None
+
+    def subscribe(self, job_id: str, last_event_id: Optional[str] = None) -> Subscription:
+        """
+        Abonelik açar. `last_event_id` verilirse ondan sonraki tamponlu olaylar
+        önce gelir; tampon yetmiyorsa ya da id bu sürece ait değilse (başka
+        epoch, henüz verilmemiş sıra) tek bir `snapshot` olayı gönderilir.
+        Tampon kopyası ve kayıt aynı kilit altında: arada olay kaybolmaz.
+        """
+        with self._lock:
+            ch = self._channels.get(job_id)
+            if ch is None:
+                ch = self._channels[job_id] = _Channel(self.buffer)
+            events = list(ch.events)
+            backlog: List[Event]
+            seq = None if last_event_id is None else self._parse_id(last_event_id)
+            first = ch.next_id - len(events)  # tampondaki ilk olayın sırası
+            if last_event_id is None:
+                backlog = events
+            elif seq is None or seq >= ch.next_id or (events and first > seq + 1):
+                backlog = [{"id": self._event_id(ch.next_id - 1), "event": "snapshot", "data": dict(ch.state)}]
+            else:
+                backlog = events[max(0, seq + 1 - first):]
+            sub = Subscription(self, job_id, backlog)
+            ch.subscribers.add(sub)
+            ch.touched = time.monotonic()
+            return sub
+
+    def _unsubscribe(self, sub: Subscription):
+        with self._lock:
+            ch = self._channels.get(sub.job_id)
+            if ch is not None:
+                ch.subscribers.discard(sub)
+                ch.touched = time.monotonic()
+
+    def _maybe_gc(self):
+        now = time.monotonic()
+        if now - self._gc_at < GC_INTERVAL:
+            return
+        self._gc_at = now
+        with self._lock:
+            stale = [jid for jid, ch in self._channels.items()
+                     if not ch.subscribers and now - ch.touched > self.retain_seconds]
+            for jid in stale:
+                del self._channels[jid]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"channels": len(self._channels),
+                    "subscribers": sum(len(ch.subscribers) for ch in self._channels.values())}
+
+
+_bus: Optional[ProgressBus] = None
+_bus_lock = threading.Lock()
+
+
+def get_bus() -> ProgressBus:
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = ProgressBus()
+        return _bus
+
+
+# ---------- worker tarafı ----------
+# WorkerPool süreçlerinde API'ye giden multiprocessing kuyruğu; None ise
+# olaylar doğrudan bu süreçteki bus'a yazılır.
+_sink = None
+
+
+def set_sink(queue):
+    global _sink
+    _sink = queue
+
+
+def emit(job_id: str, event: str, **data):
+    """İlerleme olayı yayınlar; hata işi asla durdurmaz."""
+    try:
+        if _sink is not None:
+            _sink.put_nowait((job_id, event, data))
+        else:
+            get_bus().publish(job_id, event, **data)
+    except Exception:
+        log.debug("event dropped: %s %s", job_id, event, exc_info=True)
+
+
+def pump(queue, stop_evt: threading.Event, poll: float = 0.5):
+    """Worker kuyruğundaki olayları bus'a aktarır (API sürecinde thread olarak)."""
+    import queue as _queue
+    bus = get_bus()
+    while not stop_evt.is_set():
+        try:
+            job_id, event, data = queue.get(timeout=poll)
+        except _queue.Empty:
+            continue
+        except (EOFError, OSError):
+            return
+        bus.publish(job_id, event, **data)
+
+
+def sse_format(ev: Event) -> str:
+    return f"id: {ev['id']}\nevent: {ev['event']}\ndata: {json.dumps(ev['data'], ensure_ascii=False)}\n\n"
@@ -0,0 +1,368 @@
+"""
+SQLite `jobs` tablosu üzerinde kalıcı iş kuyruğu.
+
+- claim_next(): adil paylaşım sırasındaki (fair_tag, bkz. scheduler) ilk
+  uygun `queued` işi atomik olarak `running`'e çeker ve worker'a süreli bir
+  lease verir (UPDATE ... WHERE status='queued'). Kullanıcı başına çalışan
+  iş sayısı USER_MAX_RUNNING_JOBS'u aşmaz.
+- Çalışan iş boyunca bir heartbeat thread'i lease'i uzatır.
+- requeue_expired(): lease'i dolmuş (worker çökmüş) işleri tekrar kuyruğa
+  alır; JOB_MAX_ATTEMPTS aşılırsa `error` yapar.
+- WorkerPool: JOB_WORKERS adet süreç; `stage("gpu")` süreçler arası bir
+  semaphore ile cihaz slotu başına GPU_STAGE_CONCURRENCY'ye sınırlanır, diğer
+  aşamalar serbest. WAN işleri paylaşılan GpuPool üzerinden en az yüklü
+  cihaza yerleşir (bkz. services/gpu_pool.py).
+  İlerleme olayları (events.emit) bir kuyruk üzerinden API sürecindeki
+  ProgressBus'a pompalanır.
+- StatusBatcher: worker'ların stage/progress yazımlarını birleştirip
+  JOB_STATUS_FLUSH_INTERVAL'da bir tek transaction'da yazar.
+"""
+import json
+import logging
+import multiprocessing as mp
+import os
+import signal
+import threading
+import time
+import datetime as _dt
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, or_, select, true, update
+from sqlalchemy.orm import Session, aliased
+
+from .db import SessionLocal, Job, ensure_schema
+from . import events
+from .scheduler import settle
+from .services.gpu_pool import GpuPool, set_gpu_pool
+from .config import (
+    JOB_WORKERS,
+    JOB_LEASE_SECONDS,
+    JOB_POLL_INTERVAL,
+    JOB_MAX_ATTEMPTS,
+    JOB_STATUS_FLUSH_INTERVAL,
+    GPU_STAGE_CONCURRENCY,
+    USER_MAX_RUNNING_JOBS,
+)
+
+log = logging.getLogger("vizoai.jobqueue")
+
+# süreç başına stage -> semaphore (None = limitsiz)
+_stage_limits: Dict[str, Any] = {}
+
+
+@contextmanager
+def stage(name: str):
+    sem = _stage_limits.get(name)
+    if sem is None:
+        yield
+        return
+    with sem:
+        yield
+
+
+def _now() -> _dt.datetime:
+    return _dt.datetime.utcnow()
+
+
+# ---------- claim / lease ----------
+def _runnable():
+    """Kullanıcısının çalışan iş sayısı sınırın altında olan işler."""
+    if USER_MAX_RUNNING_JOBS <= 0:
+        return true()
+    other = aliased(Job)
+    running = (select(func.count(other.id))
+               .where(other.user_id == Job.user_id, other.status == "running")
+               .scalar_subquery())
+    return or_(Job.user_id.is_(None), running < USER_MAX_RUNNING_JOBS)
+
+
+def claim_next(db: Session, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> Optional[str]:
+    """Adil paylaşım sırasındaki ilk uygun işi bu worker'a kilitler; yoksa None."""
+    while True:
+        # fair_tag'siz (eski) işler NULL olduğundan önce gelir
+        row = (db.query(Job.id)
+                 .filter(Job.status == "queued", _runnable())
+                 .order_by(Job.fair_tag, Job.created_at, Job.id)
+                 .first())
+        if row is None:
+            return None
+        now = _now()
+        # sınır UPDATE'te tekrar kontrol edilir: aynı kullanıcının iki işi
+        # iki worker'a aynı anda verilmez
+        res = db.execute(
+            update(Job)
+            .where(Job.id == row.id, Job.status == "queued", _runnable())
+            .values(status="running", lease_owner=worker_id,
+                    lease_expires_at=now + _dt.timedelta(seconds=lease_seconds),
+                    heartbeat_at=now, updated_at=now,
+                    attempts=Job.attempts + 1, stage=None, progress=0.0)
+        )
+        db.commit()
+        if res.rowcount == 1:
+            return row.id
+        # başka bir worker kaptı → sıradakine bak
+
+
+def heartbeat(db: Session, job_id: str, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    """Lease'i uzatır; lease başka worker'a geçmişse False döner."""
+    now = _now()
+    res = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.lease_owner == worker_id, Job.status == "running")
+        .values(heartbeat_at=now, lease_expires_at=now + _dt.timedelta(seconds=lease_seconds))
+    )
+    db.commit()
+    return res.rowcount == 1
+
+
+class StatusBatcher:
+    """
+    İş satırı güncellemelerini (stage, progress...) biriktirir. Aynı işe
+    gelen ardışık güncellemeler birleşir; bekleyenlerin hepsi arka plan
+    thread'inde tek transaction'da yazılır. SQLite'ta yazıcı kilidi her
+    denoising adımı yerine saniyede bir alınır.
+    """
+
+    def __init__(self, interval: float = JOB_STATUS_FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def update(self, job_id: str, **values):
+        with self._lock:
+            self._pending.setdefault(job_id, {}).update(values)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-status-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self, job_id: Optional[str] = None):
+        """
+        Bekleyenleri yazar; `job_id` verilirse yalnızca o işinkileri. Yazım
+        kilidi, arka planda süren bir flush bitmeden dönülmemesini sağlar.
+        """
+        with self._write_lock:
+            with self._lock:
+                if job_id is None:
+                    pending, self._pending = self._pending, {}
+                else:
+                    vals = self._pending.pop(job_id, None)
+                    pending = {job_id: vals} if vals else {}
+            if not pending:
+                return
+            db = SessionLocal()
+            try:
+                for jid, values in pending.items():
+                    db.execute(update(Job).where(Job.id == jid).values(updated_at=_now(), **values))
+                db.commit()
+            except Exception:
+                db.rollback()
+                log.exception("job status flush failed")
+            finally:
+                db.close()
+
+
+_status_batcher: Optional[StatusBatcher] = None
+_status_batcher_lock = threading.Lock()
+
+
+def status_batcher() -> StatusBatcher:
+    global _status_batcher
+    with _status_batcher_lock:
+        if _status_batcher is None:
+            _status_batcher = StatusBatcher()
+        return _status_batcher
+
+
+def finish_job(db: Session, job_id: str, worker_id: Optional[str], status: str,
+               video_path: Optional[str] = None, error: Optional[str] = None,
+               timings: Optional[Dict[str, float]] = None) -> bool:
+    """İşi kapatır ve lease'i bırakır. Lease kaybedildiyse sonuç yazılmaz."""
+    # bekleyen progress yazımı final durumun üstüne yazılmasın
+    status_batcher().flush(job_id)
+    q = update(Job).where(Job.id == job_id)
+    if worker_id is not None:
+        q = q.where(Job.lease_owner == worker_id)
+    values = dict(status=status, error=error, updated_at=_now(),
+                  lease_owner=None, lease_expires_at=None)
+    if video_path is not None:
+        values["video_path"] = video_path
+    if status == "done":
+        values["progress"] = 1.0
+    if timings:
+        values["timings_json"] = json.dumps(timings)
+    db.rollback()
+    res = db.execute(q.values(**values))
+    if res.rowcount == 1:
+        # ayrılan kredi: done -> tahsil, error -> iade (aynı transaction)
+        settle(db, job_id, status)
+    db.commit()
+    return res.rowcount == 1
+
+
+def requeue_expired(db: Session, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """
+    Lease'i dolmuş `running` işleri geri kuyruğa alır. Lease'siz running
+    işler (eski BackgroundTasks döneminden kalanlar) da süresi dolmuş sayılır.
+    """
+    now = _now()
+    expired = or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now)
+    failing = [r.id for r in db.query(Job.id)
+                               .filter(Job.status == "running", expired, Job.attempts >= max_attempts)]
+    failed = 0
+    for job_id in failing:
+        res = db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "running", expired)
+            .values(status="error", error="worker lease expired too many times",
+                    lease_owner=None, lease_expires_at=None, updated_at=now))
+        if res.rowcount == 1:
+            settle(db, job_id, "error")
+            failed += 1
+    requeued = db.execute(
+        update(Job)
+        .where(Job.status == "running", expired,
+               or_(Job.attempts.is_(None), Job.attempts < max_attempts))
+        .values(status="queued", lease_owner=None, lease_expires_at=None, updated_at=now)
+    ).rowcount
+    db.commit()
+    if failed or requeued:
+        log.warning("lease expiry: requeued=%d failed=%d", requeued, failed)
+    return requeued
+
+
+def queue_stats(db: Session) -> Dict[str, int]:
+    from sqlalchemy import func
+    rows = (db.query(Job.status, func.count(Job.id))
+              .filter(Job.status.in_(("queued", "running")))
+              .group_by(Job.status).all())
+    out = {"queued": 0, "running": 0}
+    out.update({s: n for s, n in rows})
+    return out
+
+
+# ---------- worker süreci ----------
+class _Heartbeat(threading.Thread):
+    def __init__(self, job_id: str, worker_id: str, interval: float):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        while not self._stop_evt.wait(self.interval):
+            db = SessionLocal()
+            try:
+                if not heartbeat(db, self.job_id, self.worker_id):
+                    log.warning("job %s: lease lost by %s", self.job_id, self.worker_id)
+                    return
+            except Exception:
+                log.exception("heartbeat failed")
+            finally:
+                db.close()
+
+    def stop(self):
+        self._stop_evt.set()
+
+
+def _worker_main(index: int, limits: Dict[str, Any], stop_evt, event_queue=None, gpus=None):
+    from .pipeline import run_generation
+
+    _stage_limits.update(limits)
+    if gpus is not None:
+        set_gpu_pool(gpus)
+    if event_queue is not None:
+        events.set_sink(event_queue)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_id = f"{os.uname().nodename}:{os.getpid()}:{index}"
+    log.info("job worker %s started", worker_id)
+    while not stop_evt.is_set():
+        db = SessionLocal()
+        try:
+            requeue_expired(db)
+            job_id = claim_next(db, worker_id)
+        except Exception:
+            log.exception("claim failed")
+            job_id = None
+        finally:
+            db.close()
+        if job_id is None:
+            stop_evt.wait(JOB_POLL_INTERVAL)
+            continue
+
+        hb = _Heartbeat(job_id, worker_id, interval=max(1.0, JOB_LEASE_SECONDS / 3))
+        hb.start()
+        try:
+            run_generation(job_id, worker_id)
+        finally:
+            hb.stop()
+
+
+class WorkerPool:
+    """
+    JOB_WORKERS adet iş süreci; GPU aşaması süreçler arası sınırlıdır.
+    Cihaz havuzunun (ve resident WAN worker'larının) sahibidir.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, gpu_concurrency: int = GPU_STAGE_CONCURRENCY):
+        self.workers = workers
+        ctx = mp.get_context("spawn")
+        self._ctx = ctx
+        self._stop = ctx.Event()
+        self.gpus = GpuPool(ctx=ctx)
+        self._limits = {"gpu": ctx.BoundedSemaphore(max(1, gpu_concurrency) * len(self.gpus.slots))}
+        self._procs: List[mp.Process] = []
+        self._events = ctx.Queue()
+        self._pump_stop = threading.Event()
+        self._pump: Optional[threading.Thread] = None
+
+    def start(self):
+        self._pump = threading.Thread(target=events.pump, args=(self._events, self._pump_stop),
+                                      name="vizoai-event-pump", daemon=True)
+        self._pump.start()
+        self.gpus.start()
+        for i in range(self.workers):
+            p = self._ctx.Process(target=_worker_main,
+                                  args=(i, self._limits, self._stop, self._events, self.gpus),
+                                  name=f"vizoai-job-worker-{i}", daemon=True)
+            p.start()
+            self._procs.append(p)
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        for p in self._procs:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        self._procs = []
+        self._pump_stop.set()
+        if self._pump is not None:
+            self._pump.join(timeout)
+            self._pump = None
+        self.gpus.stop()
+
+    def alive(self) -> int:
+        return sum(1 for p in self._procs if p.is_alive())
+
+
+if __name__ == "__main__":
+    # API'den bağımsız worker havuzu: JOB_WORKERS=0 ile API'yi, bunu ayrı çalıştır
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s: %(message)s")
+    ensure_schema()
+    pool = WorkerPool(workers=max(1, JOB_WORKERS))
+    pool.start()
+    try:
+        while pool.alive():
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
@@ -0,0 +1,74 @@
+"""
+Süre histogramları (timing_stats tablosu).
+
+WAN yan kanalından gelen olaylar (`wan.model_load`, `wan.text_encode`,
+`wan.vae_encode`, `wan.step`, `wan.vae_decode`, `wan.video_write`) ve
+pipeline aşama süreleri (`stage.<ad>`) sabit bucket'lara sayılır. Worker
+süreçleri aynı tabloya yazdığı için sayaçlar süreçler arası paylaşılır
+(bkz. cache_stats). Gözlemler iş sonunda tek transaction'da yazılır.
+"""
+import bisect
+from typing import Any, Dict, Iterable, Tuple
+
+from sqlalchemy import update
+
+from .db import SessionLocal, TimingStat
+
+# saniye; son bucket +Inf
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _bucket(seconds: float) -> int:
+    return bisect.bisect_left(BUCKETS, seconds)
+
+
+def observe_many(samples: Iterable[Tuple[str, float]]):
+    """(ad, saniye) çiftlerini histogramlara ekler; hata işi durdurmaz."""
+    agg: Dict[Tuple[str, int], list] = {}
+    for name, seconds in samples:
+        if seconds is None:
+            continue
+        key = (name, _bucket(float(seconds)))
+        c = agg.setdefault(key, [0, 0.0])
+        c[0] += 1
+        c[1] += float(seconds)
+    if not agg:
+        return
+    db = SessionLocal()
+    try:
+        for (name, bucket), (count, total) in agg.items():
+            res = db.execute(
+                update(TimingStat)
+                .where(TimingStat.name == name, TimingStat.bucket == bucket)
+                .values(count=TimingStat.count + count, total=TimingStat.total + total))
+            if res.rowcount == 0:
+                db.add(TimingStat(name=name, bucket=bucket, count=count, total=total))
+        db.commit()
+    except Exception:
+        db.rollback()
+    finally:
+        db.close()
+
+
+def histograms() -> Dict[str, Any]:
+    """Ad başına kümülatif bucket'lar (Prometheus `le` biçimi), count, sum, ortalama."""
+    db = SessionLocal()
+    try:
+        rows = db.query(TimingStat).all()
+    finally:
+        db.close()
+    by_name: Dict[str, Dict[int, TimingStat]] = {}
+    for r in rows:
+        by_name.setdefault(r.name, {})[r.bucket] = r
+    out: Dict[str, Any] = {}
+    for name in sorted(by_name):
+        buckets, running, total = {}, 0, 0.0
+        for i, le in enumerate(BUCKETS + (float("inf"),)):
+            r = by_name[name].get(i)
+            if r is not None:
+                running += r.count or 0
+                total += r.total or 0.0
+            buckets["+Inf" if le == float("inf") else str(le)] = running
+        out[name] = {"buckets": buckets, "count": running, "sum": round(total, 3),
+                     "mean": round(total / running, 4) if running else None}
+    return out
@@ -0,0 +1,93 @@
+"""
+Parola hash/doğrulama.
+
+pbkdf2/bcrypt her çağrıda onlarca ms CPU harcar; async handler'larda
+doğrudan çağrılırsa event loop'u, threadpool'da çağrılırsa diğer isteklerin
+thread'lerini meşgul eder. hash_password_async / verify_password_async işi
+PASSWORD_HASH_WORKERS süreçli bir havuza gönderir; havuza aynı anda en fazla
+PASSWORD_HASH_MAX_PENDING iş girer, fazlası sırada bekler.
+
+Havuz süreçleri spawn ile başlar ve yalnızca bu modülü (passlib + config)
+import eder.
+"""
+import asyncio
+import logging
+import multiprocessing as mp
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from .config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+log = logging.getLogger("vizoai.passwords")
+
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256", "bcrypt"],
+    default="pbkdf2_sha256",
+    deprecated="auto",
+    bcrypt__truncate_error=False
+)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pending: Optional[asyncio.Semaphore] = None
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if PASSWORD_HASH_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                        mp_context=mp.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _run(fn, *args):
+    global _pending
+    if _pending is None:
+        _pending = asyncio.Semaphore(max(1, PASSWORD_HASH_MAX_PENDING))
+    loop = asyncio.get_running_loop()
+    async with _pending:
+        pool = _get_pool()
+        if pool is not None:
+            try:
+                return await loop.run_in_executor(pool, fn, *args)
+            except BrokenProcessPool:
+                # havuz süreci öldü: sonraki çağrı yenisini kurar, bu çağrı thread'de biter
+                log.warning("password hash pool broken; recreating")
+                _reset_pool()
+        return await loop.run_in_executor(None, fn, *args)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run(verify_password, plain_password, hashed_password)
+
+
+def shutdown():
+    _reset_pool()
@@ -0,0 +1,347 @@
+import json
+import os
+import time
+import datetime as _dt
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .db import SessionLocal, Job
+from . import cache as result_cache
+from . import metrics
+from .config import (
+    OUTPUT_DIR, ENABLE_MUSETALK,
+    WAN_SEED, WAN_SAMPLE_STEPS, WAN_SAMPLE_SOLVER, WAN_NEG_PROMPT,
+)
+from .jobqueue import stage, finish_job, status_batcher
+from .events import emit
+from .services.face_detect import choose_aspect_from_image
+from .services.image_prep import center_crop_to_aspect
+from .services.wan22 import run_ti2v, size_from_aspect_and_res
+from .services.tts_piper import synthesize_dialogues, _resolve_voice_path, _guess_config_path
+from .services.mux import finalize_video, derivative_paths
+try:
+    from .services.musetalk import lipsync
+except Exception:
+    lipsync = None
+
+
+# ---------- HELPERS ----------
+def _rel_url(p: Path) -> str:
+    try:
+        rel = Path(p).resolve().relative_to(OUTPUT_DIR.resolve())
+        return f"/outputs/{rel.as_posix()}"
+    except Exception:
+        return str(p)
+
+
+def _publish_final(video: Path) -> Path:
+    """
+    Teslim videosunu ve türevlerini içerik özetli adlara taşır
+    (final.mp4 -> final.<sha256[:16]>.mp4, .jpg, .preview.mp4). Aynı URL hep
+    aynı baytları gösterdiği için static_files bunları `immutable` sunar.
+    """
+    video = Path(video)
+    if not video.exists():
+        return video
+    digest = result_cache.file_digest(video)[:16]
+    out = video.with_name(f"{video.stem}.{digest}{video.suffix}")
+    src, dst = derivative_paths(video), derivative_paths(out)
+    for a, b in [(video, out)] + [(src[k], dst[k]) for k in src]:
+        if a.exists():
+            os.replace(a, b)
+    return out
+
+
+def _mark_cached(timings: Dict[str, float], cached: Iterable[str]):
+    """Cache'ten gelen aşamaların süresini "<aşama>.cached" altına taşır (ETA/histogram dışı)."""
+    for name in cached:
+        if name in timings:
+            timings[f"{name}.cached"] = timings.pop(name)
+
+
+# ---------- STAGE DAG ----------
+class Stage:
+    """
+    Pipeline düğümü. `fn(results)` bağımlılıkların sonuçlarını alır;
+    `limit` verilirse jobqueue.stage(limit) altında koşar (ör. "gpu").
+    """
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any],
+                 deps: Iterable[str] = (), limit: Optional[str] = None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.limit = limit
+
+
+def run_dag(stages: List[Stage], max_workers: int = 4,
+            timings: Optional[Dict[str, float]] = None,
+            on_stage: Optional[Callable[..., None]] = None) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """
+    Bağımlılıkları hazır olan aşamaları thread havuzunda eşzamanlı çalıştırır.
+    Dönüş: (aşama sonuçları, aşama süreleri [sn]). İlk hata tüm DAG'ı durdurur;
+    `timings` verilirse hata durumunda da biten aşamaların süreleri içinde kalır.
+    `on_stage(name, state, seconds=None)` aşama başlarken ("start") ve
+    bittiğinde ("done" / "error") çağrılır.
+    """
+    by_name = {st.name: st for st in stages}
+    for st in stages:
+        for d in st.deps:
+            if d not in by_name:
+                raise ValueError(f"stage {st.name!r} depends on unknown stage {d!r}")
+
+    results: Dict[str, Any] = {}
+    timings = {} if timings is None else timings
+    pending = dict(by_name)
+    running: Dict[Future, str] = {}
+
+    def _timed(st: Stage):
+        t0 = time.perf_counter()
+        state = "error"
+        try:
+            with stage(st.limit or st.name):
+                if on_stage:
+                    on_stage(st.name, "start")
+                out = st.fn(results)
+            state = "done"
+            return out
+        finally:
+            timings[st.name] = round(time.perf_counter() - t0, 3)
+            if on_stage:
+                on_stage(st.name, state, seconds=timings[st.name])
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as ex:
+        while pending or running:
+            ready = [st for st in pending.values() if all(d in results for d in st.deps)]
+            for st in ready:
+                del pending[st.name]
+                running[ex.submit(_timed, st)] = st.name
+            if not running:
+                raise RuntimeError(f"stage cycle: {sorted(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                exc = fut.exception()
+                if exc is not None:
+                    for f in running:
+                        f.cancel()
+                    raise exc
+                results[name] = fut.result()
+    return results, timings
+
+
+# ---------- PROGRESS ----------
+class _JobProgress:
+    """
+    Aşama geçişlerini ve WAN yan kanal olaylarını (bkz. wan/utils/events.py)
+    işin `stage` / `progress` alanlarına, bus olaylarına ve histogram
+    örneklerine çevirir. DB yazımları jobqueue.StatusBatcher ile birleştirilir.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.samples: List[Tuple[str, float]] = []
+
+    def _write(self, **values):
+        status_batcher().update(self.job_id, **values)
+
+    def on_stage(self, name: str, state: str, seconds: Optional[float] = None):
+        emit(self.job_id, "stage", stage=name, state=state, seconds=seconds)
+        if state == "start":
+            self._write(stage=name)
+
+    def on_wan_event(self, ev: Dict[str, Any]):
+        kind = ev.get("event")
+        if kind == "step":
+            step, total = int(ev.get("step") or 0), int(ev.get("total") or 0)
+            self.samples.append(("wan.step", ev.get("seconds")))
+            emit(self.job_id, "progress", stage="wan", step=step, total=total, seconds=ev.get("seconds"))
+            if total:
+                self._write(progress=round(step / total, 4))
+        elif kind == "timing" and ev.get("name"):
+            self.samples.append((f"wan.{ev['name']}", ev.get("seconds")))
+            emit(self.job_id, "timing", stage="wan", name=ev["name"], seconds=ev.get("seconds"))
+
+
+# ---------- GENERATION PIPELINE ----------
+def _tts_key(dialogues: List[Dict[str, Any]]) -> str:
+    segs = []
+    for d in dialogues:
+        text = (d.get("text") or "").strip()
+        if not text:
+            continue
+        model = _resolve_voice_path(d)
+        segs.append([text, model, _guess_config_path(model)])
+    return result_cache.hash_key("tts", segs)
+
+
+def _wan_key(cropped: Path, prompt: str, aspect: str, resolution: str) -> Optional[str]:
+    # WAN_SEED=-1: her iş yeni bir rastgele video ister; wan/final katmanı kullanılmaz
+    if WAN_SEED < 0:
+        return None
+    w, h = size_from_aspect_and_res(aspect, resolution)
+    return result_cache.hash_key(
+        "wan-ti2v-5B",
+        result_cache.file_digest(cropped),
+        prompt or "", WAN_NEG_PROMPT, WAN_SEED, f"{w}*{h}",
+        WAN_SAMPLE_STEPS, WAN_SAMPLE_SOLVER,
+    )
+
+
+def _derivative_key(final_key: str, name: str) -> str:
+    return result_cache.hash_key(name, final_key)
+
+
+def _build_stages(job: Job, progress: Optional[_JobProgress] = None,
+                  cached: Optional[set] = None) -> List[Stage]:
+    # cached: sonucu cache'ten gelen aşama adları (bkz. _mark_cached)
+    cached = set() if cached is None else cached
+    audio_dir = OUTPUT_DIR / "audio"; audio_dir.mkdir(parents=True, exist_ok=True)
+    audio_path = audio_dir / f"{job.id}.wav"
+    job_id = job.id
+    job_dir = OUTPUT_DIR / "wan" / job_id
+    try:
+        dialogues = json.loads(job.dialogues_json or "[]")
+    except Exception:
+        dialogues = []
+    src = Path(job.image_path)
+    prompt, resolution, job_aspect = job.prompt, job.resolution, job.aspect
+    use_lipsync = ENABLE_MUSETALK and lipsync is not None
+
+    # 0) GÖRSEL (CPU) + cache anahtarları; final hit ise geri kalan her şey atlanır
+    def crop(_):
+        if not src.exists():
+            raise FileNotFoundError(f"image not found: {src}")
+        aspect = job_aspect or choose_aspect_from_image(str(src))
+        # upload sırasında üretilen crop varsa yeniden decode edilmez
+        return center_crop_to_aspect(src, aspect), aspect
+
+    def keys(r):
+        cropped, aspect = r["crop"]
+        k = {"tts": _tts_key(dialogues), "wan": _wan_key(cropped, prompt, aspect, resolution)}
+        k["final"] = k["wan"] and result_cache.hash_key("final", k["wan"], k["tts"], use_lipsync)
+        k["hit"] = k["final"] and result_cache.get("final", k["final"], ".mp4", dst=job_dir / "final.mp4")
+        if k["hit"]:
+            cached.update(("tts", "wan", "lipsync", "mux"))
+        return k
+
+    # 1) SES (CPU) — WAN ile eşzamanlı
+    def tts(r):
+        k = r["keys"]
+        if k["hit"]:
+            return None
+        if result_cache.get("tts", k["tts"], ".wav", dst=audio_path):
+            cached.add("tts")
+            return audio_path
+        if dialogues:
+            synthesize_dialogues(dialogues, audio_path)
+        else:
+            from pydub import AudioSegment
+            AudioSegment.silent(duration=1000).export(audio_path, format="wav")
+        result_cache.put("tts", k["tts"], audio_path)
+        return audio_path
+
+    # 2) WAN (GPU)
+    def wan(r):
+        k = r["keys"]
+        if k["hit"]:
+            return None
+        hit = k["wan"] and result_cache.get("wan", k["wan"], ".mp4", dst=job_dir / "result.mp4")
+        if hit:
+            cached.add("wan")
+            return hit
+        cropped, aspect = r["crop"]
+        base_video = run_ti2v(str(cropped), prompt, aspect, resolution,
+                              on_event=progress.on_wan_event if progress else None)
+        if k["wan"]:
+            result_cache.put("wan", k["wan"], base_video)
+        return base_video
+
+    # 3) LIPSYNC→mux
+    def lipsync_stage(r):
+        if r["keys"]["hit"]:
+            return None
+        base_video, audio = r["wan"], r["tts"]
+        try:
+            synced = base_video.parent / f"{base_video.stem}_synced.mp4"
+            lipsync(base_video, audio, synced)
+            if synced.exists():
+                return synced
+        except Exception:
+            pass
+        return None
+
+    def mux(r):
+        # tek ffmpeg çağrısı: ses + faststart + poster + önizleme (bkz. services/mux.py)
+        k = r["keys"]
+        if k["hit"]:
+            for name, path in derivative_paths(k["hit"]).items():
+                result_cache.get("final", _derivative_key(k["final"], name), path.suffix, dst=path, count=False)
+            return k["hit"]
+        base_video = r["wan"]
+        # MuseTalk çıktısı kendi sesini taşır; yalnız WAN videosuna TTS eklenir
+        src, audio = (r["lipsync"], None) if r.get("lipsync") else (base_video, r["tts"])
+        try:
+            out = finalize_video(src, audio, base_video.parent / f"{base_video.stem}_final.mp4")
+        except Exception:
+            return src
+        if k["final"]:
+            result_cache.put("final", k["final"], out["video"])
+            for name in ("thumbnail", "preview"):
+                if out[name]:
+                    result_cache.put("final", _derivative_key(k["final"], name), out[name])
+        return out["video"]
+
+    stages = [
+        Stage("crop", crop),
+        Stage("keys", keys, deps=["crop"]),
+        Stage("tts", tts, deps=["keys"]),
+        Stage("wan", wan, deps=["keys"], limit="gpu"),
+    ]
+    mux_deps = ["wan", "tts"]
+    if use_lipsync:
+        stages.append(Stage("lipsync", lipsync_stage, deps=["wan", "tts"], limit="gpu"))
+        mux_deps.append("lipsync")
+    stages.append(Stage("mux", mux, deps=mux_deps))
+    return stages
+
+
+def run_generation(job_id: str, worker_id: str = None):
+    """
+    Kuyruktan claim edilmiş bir işi stage DAG'ı olarak çalıştırır: TTS, WAN
+    ile eşzamanlı koşar; GPU aşamaları `stage("gpu")` ile sınırlı. Her katman
+    önce sonuç cache'ine bakar (bkz. app/cache.py).
+    Aşama süreleri job.timings_json'a yazılır (cache'ten gelen aşamalar
+    "<aşama>.cached" adıyla; scheduler ETA'sına girmez); aşama geçişleri ve WAN adım
+    ilerlemesi events.emit ile yayınlanır (bkz. /api/jobs/{id}/events) ve
+    iş bitince süreler timing histogramlarına eklenir (bkz. app/metrics.py).
+    """
+    db = SessionLocal()
+    timings: Dict[str, float] = {}
+    cached: set = set()
+    progress = _JobProgress(job_id)
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            return
+        if job.status != "running":
+            job.status = "running"; job.updated_at = _dt.datetime.utcnow(); db.commit()
+        emit(job_id, "status", status="running")
+
+        results, _ = run_dag(_build_stages(job, progress, cached), timings=timings, on_stage=progress.on_stage)
+        _mark_cached(timings, cached)
+        final = _publish_final(results["mux"])
+        video_path = _rel_url(final)
+        extras = {k: _rel_url(p) for k, p in derivative_paths(final).items() if p.exists()}
+        if finish_job(db, job_id, worker_id, status="done", video_path=video_path, timings=timings):
+            emit(job_id, "done", status="done", video_path=video_path, timings=timings, **extras)
+
+    except Exception as e:
+        _mark_cached(timings, cached)
+        # lease kaybedildiyse iş başka worker'da sürüyor: abonelere hata gönderme
+        if finish_job(db, job_id, worker_id, status="error", error=str(e), timings=timings):
+            emit(job_id, "error", status="error", error=str(e), timings=timings)
+    finally:
+        db.close()
+        metrics.observe_many(progress.samples + [(f"stage.{k}", v) for k, v in timings.items()])
@@ -0,0 +1,214 @@
+"""
+İş zamanlayıcı: kabul kontrolü, adil paylaşım, kredi ve ETA.
+
+- admit(): iş kuyruğa girmeden önce kullanıcının kredisini ayırır
+  (credit_state="reserved") ve aktif iş sınırını (USER_MAX_ACTIVE_JOBS)
+  kontrol eder; ikisi iş satırıyla aynı transaction'da yazılır.
+- Ağırlıklı adil kuyruk (WFQ): her işe bir bitiş etiketi (fair_tag) verilir:
+  max(sanal zaman, kullanıcının son etiketi) + tahmini_süre / ağırlık.
+  Sanal zaman kuyruğun başındaki (en küçük) etikettir. claim_next en küçük
+  etiketi alır; böylece bir kullanıcının uzun backlog'u yeni gelenleri
+  bekletmez, ağırlık (FAIR_SHARE_WEIGHTS, role göre) GPU payını belirler.
+  Kullanıcı başına eşzamanlı çalışan iş USER_MAX_RUNNING_JOBS ile sınırlı
+  (bkz. jobqueue.claim_next).
+- settle(): iş kapanırken ayrılan kredi done -> charged, aksi halde iade.
+- estimate_seconds() / queue_info(): çözünürlük/aspect başına geçmiş aşama
+  sürelerinden (jobs.timings_json) iş süresi, kuyruk sırası ve ETA.
+"""
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from .db import Job, User
+from .services.gpu_pool import device_slots
+from .config import (
+    USER_MAX_ACTIVE_JOBS,
+    JOB_CREDIT_COST,
+    FAIR_SHARE_WEIGHTS,
+    ETA_DEFAULT_SECONDS,
+    ETA_HISTORY_JOBS,
+    ETA_CACHE_SECONDS,
+    GPU_STAGE_CONCURRENCY,
+)
+
+ACTIVE = ("queued", "running")
+
+
+class AdmissionError(Exception):
+    """İş kabul edilmedi; status_code HTTP karşılığıdır (402 kredi, 429 sınır)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def job_cost(resolution: Optional[str]) -> int:
+    if resolution in JOB_CREDIT_COST:
+        return int(JOB_CREDIT_COST[resolution])
+    return int(max(JOB_CREDIT_COST.values(), default=0))
+
+
+def user_weight(role: Optional[str]) -> float:
+    return max(0.01, FAIR_SHARE_WEIGHTS.get(role or "user", FAIR_SHARE_WEIGHTS.get("user", 1.0)))
+
+
+# ---------- süre tahmini ----------
+_est_cache: Dict[Tuple[str, str], Tuple[float, float]] = {}
+_est_lock = threading.Lock()
+
+
+def _critical_path(t: Dict[str, float]) -> float:
+    # pipeline DAG'ı: crop -> keys -> (tts || wan) -> lipsync -> mux
+    g = lambda k: t.get(k, 0.0)  # noqa: E731
+    return g("crop") + g("keys") + max(g("tts"), g("wan")) + g("lipsync") + g("mux")
+
+
+def _history(db: Session, resolution: str, aspect: Optional[str]):
+    # cache hit'li işler (aşama süresi "<aşama>.cached", bkz. pipeline._mark_cached)
+    # ~0 sn'lik wan/tts ile tahmini aşağı çekmesin
+    q = db.query(Job.timings_json).filter(Job.status == "done", Job.resolution == resolution,
+                                          Job.timings_json.isnot(None),
+                                          Job.timings_json.notlike('%.cached"%'))
+    if aspect is not None:
+        q = q.filter(Job.aspect == aspect)
+    return [r[0] for r in q.order_by(Job.updated_at.desc()).limit(ETA_HISTORY_JOBS).all()]
+
+
+def estimate_seconds(db: Session, resolution: Optional[str], aspect: Optional[str]) -> float:
+    """
+    Tipik iş süresi: cache'e düşmeden tamamlanmış son ETA_HISTORY_JOBS işin
+    aşama ortalamaları üzerinden DAG kritik yolu. Aynı aspect'te az örnek varsa yalnız
+    çözünürlüğe, hiç yoksa ETA_DEFAULT_SECONDS'a düşer. ETA_CACHE_SECONDS
+    boyunca süreç içinde cache'lenir.
+    """
+    resolution = resolution or "480p"
+    key = (resolution, aspect or "")
+    now = time.monotonic()
+    with _est_lock:
+        hit = _est_cache.get(key)
+    if hit and now - hit[0] < ETA_CACHE_SECONDS:
+        return hit[1]
+
+    rows = _history(db, resolution, aspect)
+    if len(rows) < 3:
+        rows = _history(db, resolution, None)
+    sums: Dict[str, float] = {}
+    n = 0
+    for raw in rows:
+        try:
+            t = json.loads(raw)
+        except ValueError:
+            continue
+        n += 1
+        for k, v in t.items():
+            sums[k] = sums.get(k, 0.0) + float(v or 0.0)
+    if n:
+        est = _critical_path({k: v / n for k, v in sums.items()})
+    else:
+        est = ETA_DEFAULT_SECONDS.get(resolution, max(ETA_DEFAULT_SECONDS.values(), default=600.0))
+    with _est_lock:
+        _est_cache[key] = (now, est)
+    return est
+
+
+# ---------- kabul ----------
+def _virtual_time(db: Session) -> float:
+    head = db.query(func.min(Job.fair_tag)).filter(Job.status == "queued").scalar()
+    if head is not None:
+        return head
+    # kuyruk boş: çalışan işlerin etiketinden devam edilir
+    return db.query(func.max(Job.fair_tag)).filter(Job.status == "running").scalar() or 0.0
+
+
+def admit(db: Session, job: Job, user: Optional[Any]) -> Job:
+    """
+    İşi kredi ayırarak ve adil paylaşım etiketiyle kuyruğa yazar (commit eder).
+    `user` id/role alanları olan herhangi bir nesne (auth.CurrentUser).
+    Yetersiz kredi -> AdmissionError(402), aktif iş sınırı -> AdmissionError(429).
+    """
+    cost = job_cost(job.resolution) if user is not None else 0
+    try:
+        last = None
+        if user is not None:
+            # kredi ayırma transaction'ın ilk yazımıdır: SQLite yazıcı kilidi
+            # alınır, aynı kullanıcının eşzamanlı istekleri aşağıdaki sayımı
+            # sırayla görür
+            res = db.execute(update(User)
+                             .where(User.id == user.id, User.credits >= cost)
+                             .values(credits=User.credits - cost))
+            if res.rowcount != 1:
+                raise AdmissionError(402, "Insufficient credits")
+            active = (db.query(func.count(Job.id))
+                        .filter(Job.user_id == user.id, Job.status.in_(ACTIVE)).scalar())
+            if USER_MAX_ACTIVE_JOBS > 0 and active >= USER_MAX_ACTIVE_JOBS:
+                raise AdmissionError(429, f"Too many active jobs (max {USER_MAX_ACTIVE_JOBS})")
+            last = (db.query(func.max(Job.fair_tag))
+                      .filter(Job.user_id == user.id, Job.status.in_(ACTIVE)).scalar())
+        start = max(_virtual_time(db), last or 0.0)
+        weight = user_weight(getattr(user, "role", None))
+        job.fair_tag = start + estimate_seconds(db, job.resolution, job.aspect) / weight
+        job.credit_cost = cost
+        job.credit_state = "reserved" if cost else None
+        db.add(job)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return job
+
+
+# ---------- kapanış ----------
+def settle(db: Session, job_id: str, status: str) -> int:
+    """
+    Ayrılan krediyi kapatır: done -> charged, diğerleri -> iade. Yalnızca
+    `reserved` durumdaki işi değiştirir (tekrar çağrılması güvenli). commit
+    çağırana aittir. İade edilen kredi miktarını döner.
+    """
+    if status == "done":
+        db.execute(update(Job).where(Job.id == job_id, Job.credit_state == "reserved")
+                   .values(credit_state="charged"))
+        return 0
+    row = (db.query(Job.user_id, Job.credit_cost)
+             .filter(Job.id == job_id, Job.credit_state == "reserved").first())
+    if row is None:
+        return 0
+    res = db.execute(update(Job).where(Job.id == job_id, Job.credit_state == "reserved")
+                     .values(credit_state="refunded"))
+    if res.rowcount != 1 or row.user_id is None or not row.credit_cost:
+        return 0
+    db.execute(update(User).where(User.id == row.user_id)
+               .values(credits=User.credits + row.credit_cost))
+    return row.credit_cost
+
+
+# ---------- sıra / ETA ----------
+def queue_info(db: Session, job: Job) -> Dict[str, Any]:
+    """
+    Aktif iş için kuyruk sırası (1 = sıradaki) ve tahmini bitiş süresi (sn).
+    Sıra fair_tag düzenidir; kullanıcı başına çalışan iş sınırının sırayı
+    öteleme etkisi hesaba katılmaz (yaklaşık).
+    """
+    if job.status not in ACTIVE:
+        return {}
+    est = estimate_seconds(db, job.resolution, job.aspect)
+    if job.status == "running":
+        return {"queue_position": 0, "eta_seconds": round(est * (1.0 - (job.progress or 0.0)), 1)}
+
+    slots = max(1, GPU_STAGE_CONCURRENCY) * len(device_slots())
+    busy = sum(estimate_seconds(db, r.resolution, r.aspect) * (1.0 - (r.progress or 0.0))
+               for r in db.query(Job.resolution, Job.aspect, Job.progress)
+                          .filter(Job.status == "running").all())
+    ahead, position = 0.0, 0
+    for r in (db.query(Job.id, Job.resolution, Job.aspect)
+                .filter(Job.status == "queued")
+                .order_by(Job.fair_tag, Job.created_at, Job.id).all()):
+        position += 1
+        if r.id == job.id:
+            break
+        ahead += estimate_seconds(db, r.resolution, r.aspect)
+    return {"queue_position": position, "eta_seconds": round((busy + ahead) / slots + est, 1)}
@@ -33,3 +33,11 @@ class GeneratePayload(BaseModel):
     dialogues: List[Dialogue]
     voice: Dict[str, Any] = {}
     settings: VideoSettings
+
+class TTSWarmupPayload(BaseModel):
+    voiceId: Optional[str] = None
+    voicePath: Optional[str] = None
+    phrases: List[str]
+
+class FaceDetectPayload(BaseModel):
+    paths: List[str]
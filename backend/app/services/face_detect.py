@@ -1,7 +1,9 @@
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Sequence
 from PIL import Image
 import numpy as np
 import os
+import threading
 
 # MediaPipe (optional; can be disabled by env)
 try:
@@ -19,6 +21,27 @@ except Exception:
     CV_AVAILABLE = False
     HAAR_PATH = None
 
+# Tespit bu çözünürlükte yapılır, kutular orijinal boyuta geri ölçeklenir
+DETECT_MAX_SIDE = int(os.environ.get("FACE_DETECT_MAX_SIDE", "1024"))
+DETECT_THREADS = int(os.environ.get("FACE_DETECT_THREADS", "4"))
+
+# Dedektörler thread başına bir kez yüklenir (CascadeClassifier / MediaPipe
+# grafikleri eşzamanlı kullanım için güvenli değil)
+_local = threading.local()
+
+def _haar():
+    c = getattr(_local, "haar", None)
+    if c is None:
+        c = _local.haar = cv2.CascadeClassifier(HAAR_PATH)
+    return c
+
+def _mediapipe():
+    fd = getattr(_local, "mp_fd", None)
+    if fd is None:
+        fd = _local.mp_fd = mp.solutions.face_detection.FaceDetection(
+            model_selection=1, min_detection_confidence=0.5)
+    return fd
+
 def _fallback_center(w: int, h: int):
     bw, bh = int(w*0.3), int(h*0.3)
     x = max(0, (w - bw)//2); y = max(0, (h - bh)//2)
@@ -27,56 +50,78 @@ def _fallback_center(w: int, h: int):
         "boundingBox":{"x":x,"y":y,"width":bw,"height":bh}
     }]
 
-def detect_faces(image_path: str) -> List[Dict[str, Any]]:
-    img = Image.open(image_path).convert("RGB")
+def _faces(boxes) -> List[Dict[str, Any]]:
+    return [{
+        "id": f"face_{i+1}",
+        "name": f"Character {i+1}",
+        "boundingBox": {"x": x, "y": y, "width": ww, "height": hh}
+    } for i, (x, y, ww, hh) in enumerate(boxes)]
+
+def _downscale(img: Image.Image, max_side: int):
+    w, h = img.size
+    scale = min(1.0, max_side / float(max(w, h))) if max_side > 0 else 1.0
+    if scale >= 1.0:
+        return img, 1.0
+    small = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.BILINEAR)
+    return small, scale
+
+def detect_faces(image_path: str, img: Optional[Image.Image] = None,
+                 max_side: int = DETECT_MAX_SIDE) -> List[Dict[str, Any]]:
+    # upload zaten decode ettiyse aynı görüntüyü kullan
+    if img is None:
+        img = Image.open(image_path).convert("RGB")
     w, h = img.size
+    small, scale = _downscale(img, max_side)
+    sw, sh = small.size
+    inv = 1.0 / scale
 
     # 1) OpenCV Haar first
     if CV_AVAILABLE and HAAR_PATH:
         try:
-            gray = np.array(img.convert("L"))
-            face_cascade = cv2.CascadeClassifier(HAAR_PATH)
-            rects = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(40,40))
-            faces = []
-            for i, (x,y,ww,hh) in enumerate(rects):
-                faces.append({
-                    "id": f"face_{i+1}",
-                    "name": f"Character {i+1}",
-                    "boundingBox": {"x": int(x), "y": int(y), "width": int(ww), "height": int(hh)}
-                })
-            if faces:
-                return faces
+            gray = np.array(small.convert("L"))
+            # minSize orijinal piksel cinsinden; küçültülmüş görüntüye ölçekle
+            min_side = max(1, round(40 * scale))
+            rects = _haar().detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_side, min_side))
+            boxes = [(int(x*inv), int(y*inv), int(ww*inv), int(hh*inv)) for (x,y,ww,hh) in rects]
+            if boxes:
+                return _faces(boxes)
         except Exception:
             pass
 
     # 2) MediaPipe fallback (if available)
     if MP_AVAILABLE:
         try:
-            arr = np.array(img)
-            mp_face = mp.solutions.face_detection
-            with mp_face.FaceDetection(model_selection=1, min_detection_confidence=0.5) as fd:
-                results = fd.process(arr)
-                faces = []
-                if results.detections:
-                    for i, det in enumerate(results.detections):
-                        bbox = det.location_data.relative_bounding_box
-                        x = max(0, int(bbox.xmin * w))
-                        y = max(0, int(bbox.ymin * h))
-                        ww = max(1, int(bbox.width * w))
-                        hh = max(1, int(bbox.height * h))
-                        faces.append({
-                            "id": f"face_{i+1}",
-                            "name": f"Character {i+1}",
-                            "boundingBox": {"x": x, "y": y, "width": ww, "height": hh}
-                        })
-                if faces:
-                    return faces
+            arr = np.array(small)
+            results = _mediapipe().process(arr)
+            boxes = []
+            if results.detections:
+                for det in results.detections:
+                    # göreli kutu → doğrudan orijinal boyuta
+                    bbox = det.location_data.relative_bounding_box
+                    x = max(0, int(bbox.xmin * w))
+                    y = max(0, int(bbox.ymin * h))
+                    ww = max(1, int(bbox.width * w))
+                    hh = max(1, int(bbox.height * h))
+                    boxes.append((x, y, ww, hh))
+            if boxes:
+                return _faces(boxes)
         except Exception:
             pass
 
     # 3) Center fallback (never block the flow)
     return _fallback_center(w, h)
 
+_batch_pool: Optional[ThreadPoolExecutor] = None
+_batch_lock = threading.Lock()
+
+def detect_faces_batch(image_paths: Sequence[str]) -> List[List[Dict[str, Any]]]:
+    """Birden çok görüntüde paralel tespit; sonuç sırası girdiyle aynı."""
+    global _batch_pool
+    with _batch_lock:
+        if _batch_pool is None:
+            _batch_pool = ThreadPoolExecutor(max_workers=max(1, DETECT_THREADS), thread_name_prefix="face")
+    return list(_batch_pool.map(detect_faces, image_paths))
+
 def choose_aspect_from_image(image_path: str) -> str:
     img = Image.open(image_path)
     w, h = img.size
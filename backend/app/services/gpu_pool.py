@@ -0,0 +1,318 @@
+"""
+Çoklu GPU: cihaz (grubu) başına resident WAN worker'ı ve iş yerleşimi.
+
+- parse_devices(): WAN_DEVICES / WAN_DEVICE_GROUP_SIZE'dan cihaz slotları.
+  Grup boyu >1 ise ardışık cihazlar tek slottur; worker torchrun ile her
+  cihazda bir rank olarak (use_sp + DiT FSDP) çalışır.
+- GpuPool: süreçler arası paylaşılan cihaz tablosu (çalışan iş, biten iş,
+  hata, meşgul süre, soğuma bitişi). run() işi en az yüklü sağlıklı slota
+  yerleştirir; WorkerDeviceError (worker çöktü, CUDA/NCCL hatası) alınırsa
+  slotu WAN_DEVICE_COOLDOWN boyunca devre dışı bırakıp işi başka slotta
+  yeniden dener. stats() cihaz başına kullanım raporu.
+- WAN_MODE=worker iken havuzun sahibi (jobqueue.WorkerPool) her slot için bir
+  resident worker başlatır ve ölen / hata veren worker'ı yeniden başlatır;
+  iş süreçlerine geçen kopyalar yalnız bağlanır.
+
+Tüm cihazların kullanılması için JOB_WORKERS en az slot sayısı kadar olmalı.
+"fake:N" cihazları CUDA_VISIBLE_DEVICES'a dokunmaz; yerleşim ve yeniden
+yönlendirme CPU'da denenebilir (bkz. benchmarks/bench_gpu_pool.py).
+"""
+import logging
+import multiprocessing as mp
+import os
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from ..config import (
+    CUDA_DEVICE,
+    DEFAULT_WAN_CKPT_TI2V5B,
+    DEFAULT_WAN_REPO,
+    WAN_DEVICES,
+    WAN_DEVICE_GROUP_SIZE,
+    WAN_DEVICE_COOLDOWN,
+    WAN_MODE,
+)
+from .wan_worker import (
+    STATE_COLD,
+    STATE_WARM,
+    STATE_WARMING,
+    WanWorkerClient,
+    WorkerDeviceError,
+    worker_address,
+)
+
+log = logging.getLogger("vizoai.gpu_pool")
+
+T = TypeVar("T")
+
+_STATES = (STATE_COLD, STATE_WARMING, STATE_WARM)
+
+
+@dataclass(frozen=True)
+class DeviceSlot:
+    """Bir iş yerleşim birimi: tek cihaz ya da cihaz grubu."""
+    index: int
+    devices: Tuple[str, ...]
+    # worker'ın CUDA_VISIBLE_DEVICES değeri (fiziksel id'ler); sahte cihazda None
+    visible: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return "+".join(self.devices)
+
+    @property
+    def key(self) -> str:
+        return "-".join(d.split(":")[-1] for d in self.devices)
+
+    @property
+    def size(self) -> int:
+        return len(self.devices)
+
+    @property
+    def fake(self) -> bool:
+        return self.devices[0].startswith("fake")
+
+
+def _visible_gpu_count() -> int:
+    env = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if env is not None:
+        return len([d for d in env.split(",") if d.strip()])
+    try:
+        out = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return 0
+    return sum(1 for line in out.stdout.splitlines() if line.startswith("GPU "))
+
+
+def _physical(device: str) -> str:
+    # "cuda:1" -> bu sürecin CUDA_VISIBLE_DEVICES listesindeki 1. eleman
+    idx = device.split(":")[-1]
+    parent = [d.strip() for d in os.environ.get("CUDA_VISIBLE_DEVICES", "").split(",") if d.strip()]
+    if idx.isdigit() and int(idx) < len(parent):
+        return parent[int(idx)]
+    return idx
+
+
+def parse_devices(spec: str = WAN_DEVICES, group_size: int = WAN_DEVICE_GROUP_SIZE) -> List[DeviceSlot]:
+    spec = (spec or "").strip().lower()
+    if spec.startswith("fake:"):
+        devices = [f"fake:{i}" for i in range(max(1, int(spec[5:] or 1)))]
+    elif spec == "auto":
+        devices = [f"cuda:{i}" for i in range(_visible_gpu_count())] or [CUDA_DEVICE]
+    elif spec:
+        devices = [d if ":" in d else f"cuda:{d}" for d in (p.strip() for p in spec.split(",")) if d]
+    else:
+        devices = [CUDA_DEVICE]
+
+    g = max(1, min(group_size, len(devices)))
+    groups = [devices[i:i + g] for i in range(0, len(devices) - g + 1, g)]
+    if len(devices) % g:
+        log.warning("devices %s do not fill a group of %d; ignored", devices[len(groups) * g:], g)
+    return [DeviceSlot(index=i, devices=tuple(grp),
+                       visible=None if grp[0].startswith("fake") else ",".join(_physical(d) for d in grp))
+            for i, grp in enumerate(groups)]
+
+
+@lru_cache(maxsize=1)
+def device_slots() -> Tuple[DeviceSlot, ...]:
+    """Yapılandırılmış slotlar (süreç içinde bir kez çözülür)."""
+    return tuple(parse_devices())
+
+
+class GpuPool:
+    """
+    Cihaz slotları üzerinde en az yüklü yerleşim + resident worker yönetimi.
+    Sayaçlar paylaşılan bellektedir; nesne spawn edilen iş süreçlerine
+    argüman olarak geçirilir (bkz. jobqueue.WorkerPool).
+    """
+
+    def __init__(self, slots: Optional[List[DeviceSlot]] = None, ctx=None,
+                 resident: bool = WAN_MODE == "worker",
+                 repo: Path = DEFAULT_WAN_REPO, ckpt: Path = DEFAULT_WAN_CKPT_TI2V5B,
+                 cooldown: float = WAN_DEVICE_COOLDOWN):
+        self.slots = list(slots if slots is not None else device_slots())
+        self.cooldown = cooldown
+        ctx = ctx or mp.get_context("spawn")
+        n = len(self.slots)
+        self._lock = ctx.Lock()
+        self._inflight = ctx.Array("i", n, lock=False)
+        self._jobs = ctx.Array("i", n, lock=False)
+        self._failures = ctx.Array("i", n, lock=False)
+        self._busy = ctx.Array("d", n, lock=False)           # en az bir işin olduğu süre
+        self._busy_since = ctx.Array("d", n, lock=False)
+        self._down_until = ctx.Array("d", n, lock=False)
+        self._worker_state = ctx.Array("i", n, lock=False)   # _STATES indeksi
+        self._since = time.time()
+        self.workers: List[WanWorkerClient] = []
+        if resident:
+            self.workers = [
+                WanWorkerClient(repo, ckpt, device=slot.devices[0], visible=slot.visible,
+                                nproc=slot.size, address=worker_address(slot.key))
+                for slot in self.slots
+            ]
+        self._monitor: Optional[threading.Thread] = None
+        self._monitor_stop = threading.Event()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_monitor=None, _monitor_stop=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._monitor_stop = threading.Event()
+
+    # ---------- yerleşim ----------
+    def _acquire(self, exclude: List[int]) -> int:
+        now = time.time()
+        with self._lock:
+            free = [i for i in range(len(self.slots)) if i not in exclude]
+            if not free:
+                raise WorkerDeviceError("no WAN device left to try")
+            healthy = [i for i in free if self._down_until[i] <= now]
+            if healthy:
+                i = min(healthy, key=lambda k: (self._inflight[k], self._jobs[k]))
+            else:
+                # hepsi soğumada: işi düşürmek yerine en eski arızalıyı dene
+                i = min(free, key=lambda k: self._down_until[k])
+            if self._inflight[i] == 0:
+                self._busy_since[i] = now
+            self._inflight[i] += 1
+            return i
+
+    def _release(self, i: int, failed: bool):
+        now = time.time()
+        with self._lock:
+            self._inflight[i] -= 1
+            if self._inflight[i] == 0:
+                self._busy[i] += now - self._busy_since[i]
+            if failed:
+                self._failures[i] += 1
+                self._down_until[i] = now + self.cooldown
+            else:
+                self._jobs[i] += 1
+
+    def _alive(self, i: int) -> Callable[[], bool]:
+        return lambda: _STATES[self._worker_state[i]] != STATE_COLD
+
+    def run(self, fn: Callable[[DeviceSlot, Optional[WanWorkerClient], Optional[Callable[[], bool]]], T]) -> T:
+        """
+        fn(slot, worker, alive) en az yüklü slotta çağrılır (worker resident
+        değilse None). WorkerDeviceError'da slot soğumaya alınır ve iş
+        denenmemiş bir slotta tekrarlanır; diğer hatalar olduğu gibi yükselir.
+        """
+        tried: List[int] = []
+        while True:
+            i = self._acquire(tried)
+            slot = self.slots[i]
+            worker = self.workers[i] if self.workers else None
+            failed = False
+            try:
+                return fn(slot, worker, self._alive(i) if worker is not None and not worker.owner else None)
+            except WorkerDeviceError as e:
+                failed = True
+                tried.append(i)
+                if len(tried) >= len(self.slots):
+                    raise
+                log.warning("WAN device %s failed (%s); re-routing", slot.name, e)
+            finally:
+                self._release(i, failed)
+
+    # ---------- resident worker'lar (sahip süreç) ----------
+    def start(self, interval: float = 2.0):
+        if not self.workers or self._monitor is not None:
+            return
+        for i, w in enumerate(self.workers):
+            w.start()
+            self._worker_state[i] = _STATES.index(STATE_WARMING)
+        self._monitor_stop.clear()
+        self._monitor = threading.Thread(target=self._watch, args=(interval,),
+                                         name="vizoai-gpu-monitor", daemon=True)
+        self._monitor.start()
+
+    def _watch(self, interval: float):
+        seen = [0] * len(self.workers)
+        while not self._monitor_stop.wait(interval):
+            now = time.time()
+            for i, w in enumerate(self.workers):
+                if self._failures[i] != seen[i]:
+                    # CUDA hatası bağlamı bozar: worker'ı kapat, soğuma bitince yeniden başlat
+                    seen[i] = self._failures[i]
+                    w.stop()
+                state = w.state
+                if state == STATE_COLD and self._down_until[i] <= now:
+                    log.info("starting WAN worker on %s", self.slots[i].name)
+                    w.start()
+                    state = STATE_WARMING
+                self._worker_state[i] = _STATES.index(state)
+
+    def stop(self):
+        if self._monitor is not None:
+            self._monitor_stop.set()
+            self._monitor.join()
+            self._monitor = None
+        for w in self.workers:
+            w.stop()
+
+    # ---------- rapor ----------
+    def worker_state(self) -> Optional[str]:
+        """En iyi resident worker durumu; resident değilse None."""
+        if not self.workers:
+            return None
+        states = [self.workers[i].state if self.workers[i].owner else _STATES[self._worker_state[i]]
+                  for i in range(len(self.workers))]
+        return max(states, key=_STATES.index)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        window = max(1e-6, now - self._since)
+        with self._lock:
+            rows = [(self._inflight[i], self._jobs[i], self._failures[i],
+                     self._busy[i] + (now - self._busy_since[i] if self._inflight[i] else 0.0),
+                     self._down_until[i])
+                    for i in range(len(self.slots))]
+        out = []
+        for slot, (inflight, jobs, failures, busy, down_until) in zip(self.slots, rows):
+            row = {"device": slot.name, "inflight": inflight, "jobs": jobs, "failures": failures,
+                   "healthy": down_until <= now, "busy_seconds": round(busy, 1),
+                   "utilization": round(busy / window, 3)}
+            if self.workers:
+                w = self.workers[slot.index]
+                row["worker"] = w.state if w.owner else _STATES[self._worker_state[slot.index]]
+            out.append(row)
+        return out
+
+
+# süreç başına havuz: iş süreçlerinde WorkerPool'un kopyası, aksi halde yerel
+_pool: Optional[GpuPool] = None
+_pool_lock = threading.Lock()
+
+
+def set_gpu_pool(pool: Optional[GpuPool]):
+    global _pool
+    with _pool_lock:
+        _pool = pool
+
+
+def get_gpu_pool() -> GpuPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # bu süreç sahibi: resident worker'lar ilk istekte başlar
+            _pool = GpuPool()
+        return _pool
+
+
+def current_gpu_pool() -> Optional[GpuPool]:
+    return _pool
+
+
+def shutdown_gpu_pool():
+    pool = _pool
+    if pool is not None:
+        pool.stop()
@@ -0,0 +1,68 @@
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from ..config import OUTPUT_DIR
+
+ASPECTS = ("16:9", "9:16")
+
+
+def probe_size(image_path: str) -> Tuple[int, int]:
+    """Sadece header okunur; piksel decode edilmez."""
+    try:
+        with Image.open(image_path) as im:
+            return im.size
+    except Exception:
+        return 0, 0
+
+
+def load_rgb(image_path: str) -> Image.Image:
+    """Görüntüyü bir kez RGB olarak decode eder."""
+    with Image.open(image_path) as im:
+        return im.convert("RGB")
+
+
+def crop_path(img_path: Path, target_aspect: str) -> Path:
+    tag = "9x16" if target_aspect == "9:16" else "16x9"
+    return OUTPUT_DIR / "inputs" / f"{Path(img_path).stem}__crop_{tag}.jpg"
+
+
+def center_crop_to_aspect(img_path: Path, target_aspect: str,
+                          img: Optional[Image.Image] = None) -> Path:
+    """
+    Merkezden aspect'e kırpar. Upload sırasında üretilmiş (kaynaktan yeni)
+    bir crop varsa görüntü yeniden decode edilmez. `img` verilirse onu kullanır.
+    """
+    out_path = crop_path(img_path, target_aspect)
+    try:
+        if out_path.stat().st_mtime >= Path(img_path).stat().st_mtime:
+            return out_path
+    except FileNotFoundError:
+        pass
+
+    if img is None:
+        img = load_rgb(str(img_path))
+    w, h = img.size
+    if target_aspect == "9:16":
+        tw, th = 9, 16
+    else:
+        target_aspect = "16:9"
+        tw, th = 16, 9
+    ar_src = w / h
+    ar_tgt = tw / th
+    if abs(ar_src - ar_tgt) < 1e-3:
+        crop_img = img
+    elif ar_src > ar_tgt:
+        new_w = int(h * ar_tgt)
+        left = max(0, (w - new_w) // 2)
+        crop_img = img.crop((left, 0, left + new_w, h))
+    else:
+        new_h = int(w / ar_tgt)
+        top = max(0, (h - new_h) // 2)
+        crop_img = img.crop((0, top, w, top + new_h))
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(".tmp.jpg")
+    crop_img.save(tmp, format="JPEG", quality=95)
+    tmp.replace(out_path)
+    return out_path
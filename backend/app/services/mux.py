@@ -1,6 +1,7 @@
-import subprocess, os
+import subprocess, os, struct
 from pathlib import Path
-from ..config import FFMPEG_BIN
+from typing import Any, Dict, Optional
+from ..config import FFMPEG_BIN, FINAL_THUMB_WIDTH, FINAL_PREVIEW_HEIGHT, FINAL_CRF
 
 def _run(cmd, cwd=None, env=None, log: Path | None = None):
     if log:
@@ -19,49 +20,167 @@ def _run(cmd, cwd=None, env=None, log: Path | None = None):
     else:
         return subprocess.call(cmd, cwd=cwd, env=env)
 
-def mux_audio_to_video(video_path: Path, audio_path: Path, out_path: Path) -> Path:
+
+# ---------- PROBE (ffprobe süreci açmadan mp4 başlığından) ----------
+# H.264 baseline/main/high: 8-bit 4:2:0, tarayıcılar doğrudan oynatır
+_COPY_CODECS = {"avc1", "avc3"}
+_COPY_PROFILES = {66, 77, 100}
+
+def _boxes(buf: bytes, start: int, end: int):
+    i = start
+    while i + 8 <= end:
+        size, typ = struct.unpack_from(">I4s", buf, i)
+        hdr = 8
+        if size == 1:
+            if i + 16 > end:
+                return
+            size = struct.unpack_from(">Q", buf, i + 8)[0]; hdr = 16
+        elif size == 0:
+            size = end - i
+        if size < hdr:
+            return
+        yield typ, i + hdr, min(i + size, end)
+        i += size
+
+def _find(buf: bytes, start: int, end: int, path):
+    for typ, s, e in _boxes(buf, start, end):
+        if typ == path[0]:
+            if len(path) == 1:
+                return s, e
+            r = _find(buf, s, e, path[1:])
+            if r:
+                return r
+    return None
+
+def _read_moov(path: Path) -> Optional[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            h = f.read(8)
+            if len(h) < 8:
+                return None
+            size, typ = struct.unpack(">I4s", h); hdr = 8
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]; hdr = 16
+            elif size == 0:
+                return f.read() if typ == b"moov" else None
+            if typ == b"moov":
+                return f.read(size - hdr)
+            if size < hdr:
+                return None
+            f.seek(size - hdr, os.SEEK_CUR)
+
+def probe_video(path: Path) -> Optional[Dict[str, Any]]:
     """
-    1) Video copy + AAC audio (en hızlı, kalite kaybı yok)
-    2) Olmazsa video'yu libx264 ile re-encode et (uyumluluk)
+    İlk video track'inin codec'i (sample entry fourcc), boyutu ve H.264 ise
+    profili. mp4/mov değilse veya okunamazsa None.
     """
+    try:
+        moov = _read_moov(Path(path))
+    except (OSError, struct.error):
+        return None
+    if not moov:
+        return None
+    for typ, s, e in _boxes(moov, 0, len(moov)):
+        if typ != b"trak":
+            continue
+        hd = _find(moov, s, e, (b"mdia", b"hdlr"))
+        if not hd or moov[hd[0] + 8:hd[0] + 12] != b"vide":
+            continue
+        sd = _find(moov, s, e, (b"mdia", b"minf", b"stbl", b"stsd"))
+        if not sd:
+            return None
+        # stsd: fullbox(4) + entry_count(4), ardından sample entry'ler
+        for codec, es, ee in _boxes(moov, sd[0] + 8, sd[1]):
+            info: Dict[str, Any] = {"codec": codec.decode("latin-1"), "profile": None,
+                                    "width": None, "height": None}
+            if ee - es >= 78:  # VisualSampleEntry sabit alanları
+                info["width"], info["height"] = struct.unpack_from(">HH", moov, es + 24)
+                c = _find(moov, es + 78, ee, (b"avcC",))
+                if c and c[1] - c[0] >= 2:
+                    info["profile"] = moov[c[0] + 1]
+            return info
+    return None
+
+def can_copy(info: Optional[Dict[str, Any]]) -> bool:
+    return bool(info) and info["codec"] in _COPY_CODECS and info["profile"] in _COPY_PROFILES
+
+
+# ---------- FINALIZE ----------
+def derivative_paths(video_path: Path) -> Dict[str, Path]:
+    """Final videonun yanındaki poster ve önizleme dosyaları."""
     video_path = Path(video_path)
-    audio_path = Path(audio_path)
-    out_path   = Path(out_path)
+    return {"thumbnail": video_path.with_suffix(".jpg"),
+            "preview": video_path.with_name(f"{video_path.stem}.preview.mp4")}
+
+def finalize_video(video_path: Path, audio_path: Optional[Path], out_path: Path,
+                   thumb_width: int = FINAL_THUMB_WIDTH,
+                   preview_height: int = FINAL_PREVIEW_HEIGHT) -> Dict[str, Any]:
+    """
+    Tek ffmpeg çağrısıyla teslim videosu + poster + düşük çözünürlüklü önizleme.
+
+    Video copy mi re-encode mu, girdi önceden probe edilerek belirlenir
+    (deneme/yanılma yok): tarayıcı uyumlu H.264 ise stream copy, değilse
+    libx264/yuv420p. Çıktılar +faststart ile yazılır (moov başta; ilk
+    byte'lardan oynatma başlar). `audio_path` None ise girdideki ses (varsa)
+    kopyalanır.
+    """
+    video_path, out_path = Path(video_path), Path(out_path)
     out_path.parent.mkdir(parents=True, exist_ok=True)
     log = out_path.with_suffix(".ffmpeg.log")
+    copy = can_copy(probe_video(video_path))
+    derived = derivative_paths(out_path)
+    targets = {"video": out_path,
+               "thumbnail": derived["thumbnail"] if thumb_width > 0 else None,
+               "preview": derived["preview"] if preview_height > 0 else None}
+    # yarım dosya görünmesin: .part'a yaz, başarıda yerine taşı
+    parts = {k: p.with_name(f"{p.stem}.part{p.suffix}") for k, p in targets.items() if p}
+
+    cmd = [FFMPEG_BIN, "-y", "-hide_banner", "-i", str(video_path)]
+    if audio_path:
+        cmd += ["-i", str(audio_path)]
 
-    # 1) copy
-    cmd1 = [
-        FFMPEG_BIN, "-y",
-        "-i", str(video_path),
-        "-i", str(audio_path),
-        "-map", "0:v:0", "-map", "1:a:0",
-        "-c:v", "copy",
-        "-c:a", "aac", "-b:a", "192k",
-        "-shortest",
-        str(out_path),
-    ]
-    rc = _run(cmd1, log=log)
-    if rc == 0 and out_path.exists():
-        return out_path
-
-    # 2) re-encode
-    tmp = out_path.with_suffix(".enc.mp4")
-    cmd2 = [
-        FFMPEG_BIN, "-y",
-        "-i", str(video_path),
-        "-i", str(audio_path),
-        "-map", "0:v:0", "-map", "1:a:0",
-        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
-        "-pix_fmt", "yuv420p",
-        "-c:a", "aac", "-b:a", "192k",
-        "-shortest",
-        str(tmp),
-    ]
-    rc2 = _run(cmd2, log=log)
-    if rc2 != 0 or not tmp.exists():
-        raise RuntimeError("FFmpeg mux failed; log: " + str(log))
-
-    tmp.replace(out_path)
-    return out_path
+    branches = ([] if copy else ["main"]) + [k for k in ("thumbnail", "preview") if targets[k]]
+    if branches:
+        labels = "".join(f"[{b}]" for b in branches)
+        graph = [f"[0:v]split={len(branches)}{labels}" if len(branches) > 1 else f"[0:v]null{labels}"]
+        if not copy:
+            graph.append("[main]format=yuv420p[main_v]")
+        if targets["thumbnail"]:
+            graph.append(f"[thumbnail]thumbnail=50,scale={thumb_width}:-2[thumb_v]")
+        if targets["preview"]:
+            graph.append(f"[preview]scale=-2:{preview_height},format=yuv420p[preview_v]")
+        cmd += ["-filter_complex", ";".join(graph)]
 
+    # 1) teslim videosu
+    cmd += ["-map", "0:v:0" if copy else "[main_v]"]
+    cmd += ["-map", "1:a:0"] if audio_path else ["-map", "0:a:0?"]
+    cmd += ["-c:v", "copy"] if copy else ["-c:v", "libx264", "-preset", "veryfast", "-crf", str(FINAL_CRF)]
+    cmd += ["-c:a", "aac", "-b:a", "192k", "-shortest"] if audio_path else ["-c:a", "copy"]
+    cmd += ["-movflags", "+faststart", str(parts["video"])]
+    # 2) poster
+    if targets["thumbnail"]:
+        cmd += ["-map", "[thumb_v]", "-frames:v", "1", "-q:v", "3", str(parts["thumbnail"])]
+    # 3) önizleme (sessiz)
+    if targets["preview"]:
+        cmd += ["-map", "[preview_v]", "-an", "-c:v", "libx264", "-preset", "veryfast", "-crf", "30",
+                "-movflags", "+faststart", str(parts["preview"])]
+
+    rc = _run(cmd, log=log)
+    if rc != 0 or not parts["video"].exists():
+        for p in parts.values():
+            p.unlink(missing_ok=True)
+        raise RuntimeError("FFmpeg finalize failed; log: " + str(log))
+
+    out: Dict[str, Any] = {"copied": copy}
+    for k, target in targets.items():
+        part = parts.get(k)
+        if part is not None and part.exists():
+            part.replace(target)
+            out[k] = target
+        else:
+            out[k] = None
+    return out
+
+def mux_audio_to_video(video_path: Path, audio_path: Path, out_path: Path) -> Path:
+    """Yalnız ses ekleme (poster/önizleme yok); bkz. finalize_video."""
+    return finalize_video(video_path, audio_path, out_path, thumb_width=0, preview_height=0)["video"]
@@ -2,14 +2,31 @@ import os
 import json
 import shutil
 import subprocess
+import io
 import tempfile
+import threading
+import unicodedata
 import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+from .. import cache as result_cache
+from .voices import get_registry
+
+# Piper Python API (piper-tts); yoksa CLI yoluna düşülür
+try:
+    from piper.voice import PiperVoice
+    PIPER_PY_AVAILABLE = True
+except Exception:
+    PiperVoice = None
+    PIPER_PY_AVAILABLE = False
 
-PIPER_VOICES_DIR = Path(os.getenv("PIPER_VOICES_DIR", "/workspace/models/piper-voices"))
 DEFAULT_TTS_FEMALE = os.getenv("DEFAULT_TTS_FEMALE", "")
 DEFAULT_TTS_MALE = os.getenv("DEFAULT_TTS_MALE", "")
+TTS_VOICE_POOL_SIZE = int(os.getenv("TTS_VOICE_POOL_SIZE", "4"))
+TTS_THREADS = int(os.getenv("TTS_THREADS", "4"))
 
 def _exists(p: str) -> bool:
     try:
@@ -22,7 +39,7 @@ def _resolve_voice_path(d: Dict[str, Any]) -> str:
     Öncelik:
       1) dialogue.voicePath (tam onnx yolu)
       2) env DEFAULT_TTS_FEMALE / DEFAULT_TTS_MALE (gender'a göre)
-      3) PIPER_VOICES_DIR içinden ilk uygun .onnx
+      3) PIPER_VOICES_DIR kataloğundan gender'a uyan, yoksa ilk .onnx
     """
     vp = d.get("voicePath") or d.get("voice_path")
     if vp and _exists(vp):
@@ -34,9 +51,11 @@ def _resolve_voice_path(d: Dict[str, Any]) -> str:
     if gender == "male" and DEFAULT_TTS_MALE:
         return DEFAULT_TTS_MALE
 
-    # fallback: klasörden ilk .onnx
-    for onnx in PIPER_VOICES_DIR.rglob("*.onnx"):
-        return str(onnx)
+    # fallback: katalogdan (her satırda rglob yok)
+    registry = get_registry()
+    v = (registry.first(gender=gender) if gender else None) or registry.first()
+    if v is not None:
+        return v["path"]
 
     raise RuntimeError("No Piper voice model (.onnx) found")
 
@@ -55,49 +74,200 @@ def _ensure_piper_cli():
     if shutil.which("piper") is None:
         raise RuntimeError("piper CLI not found. Please ensure 'piper-tts' is installed in the image.")
 
-def _concat_wavs(parts: List[Path], out_path: Path):
-    if not parts:
-        return
-    # Tüm parçalar aynı parametrelerde olsun varsayımı
-    with wave.open(str(parts[0]), "rb") as w0:
-        params = w0.getparams()
-        frames = [w0.readframes(w0.getnframes())]
-    for p in parts[1:]:
-        with wave.open(str(p), "rb") as w:
-            if w.getparams() != params:
-                # farklı samplerate/channel varsa pydub ile decode/concat yapılabilir (basitlik adına zorlamıyoruz)
-                raise RuntimeError("Voice fragments have different WAV params; use same Piper model family.")
-            frames.append(w.readframes(w.getnframes()))
+def _read_wav_pcm(path: Path) -> Tuple[int, bytes]:
+    with wave.open(str(path), "rb") as w:
+        if w.getnchannels() != 1 or w.getsampwidth() != 2:
+            raise RuntimeError(f"unexpected Piper WAV format: {path}")
+        return w.getframerate(), w.readframes(w.getnframes())
+
+def _pcm_wav_bytes(sample_rate: int, pcm: bytes) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+# ---------- in-process engine ----------
+class PiperEngine:
+    """
+    Yüklü Piper seslerini (onnx session + config) bellekte tutan LRU havuzu.
+    Segmentler thread havuzunda doğrudan PCM'e sentezlenir; geçici dosya yok.
+    """
+
+    def __init__(self, pool_size: int = TTS_VOICE_POOL_SIZE, threads: int = TTS_THREADS):
+        self.pool_size = max(1, pool_size)
+        self._voices: "OrderedDict[Tuple[str, Optional[str]], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Tuple[str, Optional[str]], threading.Lock] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="piper")
+        self.loads = 0
+
+    def voice(self, model: str, cfg: Optional[str] = None):
+        key = (model, cfg)
+        with self._lock:
+            v = self._voices.get(key)
+            if v is not None:
+                self._voices.move_to_end(key)
+                return v
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        # aynı ses için paralel segmentler tek yüklemeyi bekler
+        with load_lock:
+            with self._lock:
+                v = self._voices.get(key)
+                if v is not None:
+                    return v
+            v = PiperVoice.load(model, config_path=cfg)
+            with self._lock:
+                self.loads += 1
+                self._voices[key] = v
+                self._voices.move_to_end(key)
+                while len(self._voices) > self.pool_size:
+                    self._voices.popitem(last=False)
+                self._loading.pop(key, None)
+            return v
+
+    @staticmethod
+    def _pcm(voice, text: str) -> bytes:
+        # piper-tts 1.2: synthesize_stream_raw -> int16 bytes
+        # piper-tts 1.3+: synthesize -> AudioChunk(audio_int16_bytes)
+        if hasattr(voice, "synthesize_stream_raw"):
+            return b"".join(voice.synthesize_stream_raw(text))
+        return b"".join(chunk.audio_int16_bytes for chunk in voice.synthesize(text))
+
+    def synthesize(self, model: str, text: str, cfg: Optional[str] = None) -> Tuple[int, bytes]:
+        """Tek segment -> (sample_rate, mono int16 PCM)."""
+        voice = self.voice(model, cfg)
+        return int(voice.config.sample_rate), self._pcm(voice, text)
+
+    def synthesize_many(self, segments: List[Tuple[str, Optional[str], str]]) -> List[Tuple[int, bytes]]:
+        """[(model, cfg, text), ...] -> sıralı [(sample_rate, pcm), ...]"""
+        futures = [self._executor.submit(self.synthesize, m, t, c) for m, c, t in segments]
+        return [f.result() for f in futures]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"loaded": len(self._voices), "pool_size": self.pool_size, "loads": self.loads}
+
+
+_engine: Optional[PiperEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> PiperEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PiperEngine()
+        return _engine
+
+
+def _write_pcm_wav(chunks: List[Tuple[int, bytes]], out_path: Path):
+    rates = {sr for sr, _ in chunks}
+    if len(rates) != 1:
+        raise RuntimeError("Voice fragments have different WAV params; use same Piper model family.")
     with wave.open(str(out_path), "wb") as wout:
-        wout.setparams(params)
-        for fr in frames:
-            wout.writeframes(fr)
+        wout.setnchannels(1)
+        wout.setsampwidth(2)
+        wout.setframerate(rates.pop())
+        for _, pcm in chunks:
+            wout.writeframes(pcm)
+
+
+def _dialogue_segments(dialogues) -> List[Tuple[str, Optional[str], str]]:
+    segments = []
+    for d in dialogues:
+        if hasattr(d, "dict"):  # Pydantic objesi olabilir
+            d = d.dict()
+        text = (d.get("text") or "").strip()
+        if not text:
+            continue
+        model = _resolve_voice_path(d)
+        segments.append((model, _guess_config_path(model), text))
+    return segments
+
+
+# ---------- phrase cache ----------
+_cfg_digests: Dict[Tuple[str, float], str] = {}
+
+def _normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+def _config_digest(cfg: Optional[str]) -> Optional[str]:
+    if not cfg:
+        return None
+    key = (cfg, os.path.getmtime(cfg))
+    d = _cfg_digests.get(key)
+    if d is None:
+        d = _cfg_digests[key] = result_cache.file_digest(Path(cfg))
+    return d
+
+def _phrase_key(model: str, cfg: Optional[str], text: str) -> str:
+    return result_cache.hash_key("phrase", model, _config_digest(cfg), _normalize_text(text))
+
+def _synthesize_segments(segments: List[Tuple[str, Optional[str], str]],
+                         count: bool = True) -> List[Tuple[int, bytes]]:
+    """
+    Segmentleri phrase cache'ten toplar, yalnızca miss olanları sentezler
+    ve cache'e yazar. Dönüş sırası girdiyle aynıdır. count=False (warmup):
+    hit/miss sayaçlarına yazılmaz.
+    """
+    out: List[Optional[Tuple[int, bytes]]] = [None] * len(segments)
+    keys = [_phrase_key(m, c, t) for m, c, t in segments]
+    misses: Dict[str, List[int]] = {}
+    for i, k in enumerate(keys):
+        hit = result_cache.get("phrase", k, ".wav", count=count)
+        if hit is not None:
+            try:
+                out[i] = _read_wav_pcm(hit)
+                continue
+            except (OSError, EOFError, wave.Error, RuntimeError):
+                pass
+        # aynı satır bir diyalogda tekrar ederse bir kez sentezle
+        misses.setdefault(k, []).append(i)
+
+    if misses:
+        todo = [segments[idx[0]] for idx in misses.values()]
+        if PIPER_PY_AVAILABLE:
+            results = get_engine().synthesize_many(todo)
+        else:
+            results = [_synthesize_cli(m, c, t) for m, c, t in todo]
+        for (k, idx), (sr, pcm) in zip(misses.items(), results):
+            result_cache.put_bytes("phrase", k, ".wav", _pcm_wav_bytes(sr, pcm))
+            for i in idx:
+                out[i] = (sr, pcm)
+    return out
+
+def warmup_phrases(model: str, phrases: List[str]) -> Dict[str, int]:
+    """Verilen ses için cümleleri önceden sentezleyip phrase cache'e yazar."""
+    cfg = _guess_config_path(model)
+    segments = [(model, cfg, p.strip()) for p in phrases if p and p.strip()]
+    before = sum(1 for m, c, t in segments if result_cache.contains("phrase", _phrase_key(m, c, t), ".wav"))
+    _synthesize_segments(segments, count=False)
+    return {"phrases": len(segments), "already_cached": before, "synthesized": len(segments) - before}
+
 
 def synthesize_dialogues(dialogues: List[Dict[str, Any]] | Any, out_wav_path: Path | str):
     """
     dialogues: [{ text, voicePath?, gender? }, ...]
+    Satırlar phrase cache'ten gelir; miss olanlar Piper Python paketi varsa
+    süreç içi motorla, yoksa piper CLI ile sentezlenir.
     """
-    _ensure_piper_cli()
     if not dialogues:
         # 1 sn sessizlik
         from pydub import AudioSegment
         AudioSegment.silent(duration=1000).export(str(out_wav_path), format="wav")
         return
 
-    tmpdir = Path(tempfile.mkdtemp(prefix="piper_"))
-    parts: List[Path] = []
-
-    for i, d in enumerate(dialogues):
-        if hasattr(d, "dict"):  # Pydantic objesi olabilir
-            d = d.dict()
-        text = (d.get("text") or "").strip()
-        if not text:
-            continue
+    segments = _dialogue_segments(dialogues)
+    if not segments:
+        return
+    _write_pcm_wav(_synthesize_segments(segments), Path(out_wav_path))
 
-        model = _resolve_voice_path(d)
-        cfg = _guess_config_path(model)
-        part = tmpdir / f"seg_{i:03}.wav"
 
+def _synthesize_cli(model: str, cfg: Optional[str], text: str) -> Tuple[int, bytes]:
+    _ensure_piper_cli()
+    with tempfile.TemporaryDirectory(prefix="piper_") as tmpdir:
+        part = Path(tmpdir) / "seg.wav"
         cmd = ["piper", "-m", model, "-f", str(part)]
         if cfg:
             cmd += ["-c", cfg]
@@ -105,7 +275,5 @@ def synthesize_dialogues(dialogues: List[Dict[str, Any]] | Any, out_wav_path: Pa
         # text'i stdin'den gönderiyoruz
         proc = subprocess.run(cmd, input=text.encode("utf-8"), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         if proc.returncode != 0:
-            raise RuntimeError(f"piper failed for segment {i}: {proc.stderr.decode('utf-8', 'ignore')}")
-        parts.append(part)
-
-    _concat_wavs(parts, Path(out_wav_path))
+            raise RuntimeError(f"piper failed: {proc.stderr.decode('utf-8', 'ignore')}")
+        return _read_wav_pcm(part)
@@ -0,0 +1,151 @@
+"""
+Piper ses kataloğu.
+
+PIPER_VOICES_DIR bir kez taranır ve bellekte indekslenir (id / dil / cinsiyet).
+Tazelik, dizinlerin mtime'ları ile kontrol edilir: bir .onnx eklenip
+silindiğinde ilgili dizinin mtime'ı değişir ve katalog yeniden kurulur.
+Kontrol VOICE_REGISTRY_CHECK_INTERVAL saniyede bir yapılır; ağ üzerinden
+bağlanmış ses dizinlerinde her istekte rglob yapılmaz.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..config import PIPER_VOICES_DIR, VOICE_REGISTRY_CHECK_INTERVAL
+
+
+def _guess_gender(onnx: Path, cfg: Optional[Path], root: Path) -> Optional[str]:
+    # 1) config içinde açık alan (özel eğitilmiş seslerde olabiliyor)
+    if cfg is not None:
+        try:
+            with open(cfg, "r", encoding="utf-8") as f:
+                g = (json.load(f).get("gender") or "").lower()
+            if g in ("female", "male"):
+                return g
+        except Exception:
+            pass
+    # 2) yol içinde ipucu: tr_female.onnx, voices/male/...
+    parts = [p.lower() for p in onnx.relative_to(root).with_suffix("").parts]
+    tokens = {t for p in parts for t in p.replace("-", "_").split("_")}
+    if "female" in tokens or "kadin" in tokens:
+        return "female"
+    if "male" in tokens or "erkek" in tokens:
+        return "male"
+    return None
+
+
+class VoiceRegistry:
+
+    def __init__(self, root: Path = PIPER_VOICES_DIR,
+                 check_interval: float = VOICE_REGISTRY_CHECK_INTERVAL):
+        self.root = Path(root)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._voices: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._dir_mtimes: Dict[str, float] = {}
+        self._etag = ""
+        self._checked_at = 0.0
+        self._built = False
+
+    # ---------- build / freshness ----------
+    def _scan(self):
+        voices: List[Dict[str, Any]] = []
+        dir_mtimes: Dict[str, float] = {}
+        if self.root.exists():
+            for dirpath, _dirs, files in os.walk(self.root):
+                dir_mtimes[dirpath] = os.stat(dirpath).st_mtime
+                for name in files:
+                    if not name.endswith(".onnx"):
+                        continue
+                    onnx = Path(dirpath) / name
+                    rel = onnx.relative_to(self.root)
+                    parts = rel.parts
+                    lang = parts[0] if len(parts) > 1 else "unknown"
+                    base = onnx.stem  # 'en_US-amy-medium'
+                    cfg = onnx.parent / (onnx.name + ".json")
+                    cfg = cfg if cfg.exists() else None
+                    voices.append({
+                        "id": str(rel).replace("/", "__"),
+                        "label": f"{lang} · {base}",
+                        "path": str(onnx),
+                        "lang": lang,
+                        "name": base,
+                        "gender": _guess_gender(onnx, cfg, self.root),
+                        "config": str(cfg) if cfg else None,
+                    })
+        # alfabetik tek tip
+        voices.sort(key=lambda x: (x["lang"], x["name"]))
+        etag = hashlib.sha1(json.dumps(voices, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            self._voices = voices
+            self._by_id = {v["id"]: v for v in voices}
+            self._dir_mtimes = dir_mtimes
+            self._etag = f'"{etag}"'
+            self._built = True
+
+    def _stale(self) -> bool:
+        if not self._built:
+            return True
+        if not self._dir_mtimes:
+            return self.root.exists()
+        for d, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(d).st_mtime != mtime:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self._built and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if force or self._stale():
+            self._scan()
+
+    # ---------- lookups ----------
+    @property
+    def etag(self) -> str:
+        self.refresh()
+        return self._etag
+
+    def all(self) -> List[Dict[str, Any]]:
+        self.refresh()
+        return list(self._voices)
+
+    def get(self, voice_id: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self._by_id.get(voice_id)
+
+    def find(self, lang: Optional[str] = None, gender: Optional[str] = None) -> List[Dict[str, Any]]:
+        self.refresh()
+        out = self._voices
+        if lang:
+            lang_l = lang.lower()
+            # "tr" -> "tr_TR" klasörü de eşleşsin
+            out = [v for v in out if v["lang"].lower() == lang_l or v["lang"].lower().startswith(lang_l + "_")]
+        if gender:
+            out = [v for v in out if v["gender"] == gender.lower()]
+        return list(out)
+
+    def first(self, lang: Optional[str] = None, gender: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        found = self.find(lang=lang, gender=gender)
+        return found[0] if found else None
+
+
+_registry: Optional[VoiceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> VoiceRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = VoiceRegistry()
+        return _registry
@@ -1,11 +1,20 @@
 import os
 import sys
+import json
 import uuid
+import logging
+import threading
 import subprocess
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 
-from ..config import DEFAULT_WAN_REPO, DEFAULT_WAN_CKPT_TI2V5B, OUTPUT_DIR
+from ..config import (
+    DEFAULT_WAN_REPO, DEFAULT_WAN_CKPT_TI2V5B, OUTPUT_DIR, WAN_MODE,
+    WAN_SEED, WAN_SAMPLE_STEPS, WAN_SAMPLE_SOLVER, WAN_NEG_PROMPT, WAN_STREAM_VIDEO,
+    WAN_BATCH_CFG, WAN_ATTN_BACKEND, WAN_T5_CACHE_DIR,
+)
+from .gpu_pool import DeviceSlot, get_gpu_pool
+from .wan_worker import WanWorkerClient, WorkerDeviceError, is_device_error
 
 # ti2v-5B yalnızca bu iki pikseli kabul eder:
 # landscape -> 1280x704
@@ -36,20 +45,76 @@ def _resolve_paths(wan_repo: Path, ckpt_dir: Path) -> tuple[Path, Path]:
 
     return repo, ckpt
 
+log = logging.getLogger("vizoai.wan")
+
 def _low_vram_env(base_env: dict) -> dict:
     env = base_env.copy()
     env.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:64")
     env.setdefault("ATTN_IMPLEMENTATION", "xformers")
+    env.setdefault("WAN_ATTN_BACKEND", WAN_ATTN_BACKEND)
     env.setdefault("CUDA_LAUNCH_BLOCKING", "0")
     env.setdefault("PYTHONUNBUFFERED", "1")
     return env
 
+def _read_events(fd: int, events_path: Path, on_event: Optional[Callable[[Dict[str, Any]], None]]):
+    """generate.py'nin --events_fd yan kanalını okur; satırlar events.jsonl'a da yazılır."""
+    with os.fdopen(fd, "r", encoding="utf-8", errors="replace") as f, events_path.open("w") as out:
+        for line in f:
+            out.write(line)
+            if on_event is None:
+                continue
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                continue
+            try:
+                on_event(ev)
+            except Exception:
+                log.exception("WAN event handler failed")
+
+def read_manifest(path: Path) -> Optional[Dict[str, Any]]:
+    """generate.py / worker'ın yazdığı sonuç manifest'i (save_file, frames, fps, duration, timings)."""
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _result_from_manifest(manifest_path: Path, dst: Path, log_path: Path) -> Path:
+    manifest = read_manifest(manifest_path)
+    if not manifest or Path(manifest.get("save_file", "")).resolve() != dst.resolve():
+        raise RuntimeError(f"WAN wrote no result manifest. Check log: {log_path}")
+    if not dst.exists() or not manifest.get("frames"):
+        raise RuntimeError(f"WAN did not produce mp4. Check log: {log_path}")
+    log.info("wan result: %s frames=%s fps=%s duration=%ss", dst, manifest["frames"],
+             manifest.get("fps"), manifest.get("duration"))
+    return dst
+
+
 def run_ti2v(image_path: str, prompt: str, aspect: str, resolution: str,
              wan_repo: Path = DEFAULT_WAN_REPO,
-             ckpt_dir: Path = DEFAULT_WAN_CKPT_TI2V5B) -> Path:
+             ckpt_dir: Path = DEFAULT_WAN_CKPT_TI2V5B,
+             mode: str = WAN_MODE,
+             seed: int = WAN_SEED,
+             sample_steps: int = WAN_SAMPLE_STEPS,
+             sample_solver: str = WAN_SAMPLE_SOLVER,
+             n_prompt: str = WAN_NEG_PROMPT,
+             stream_video: bool = WAN_STREAM_VIDEO,
+             batch_cfg: str = WAN_BATCH_CFG,
+             audio_path: Optional[str] = None,
+             on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Path:
     """
-    WAN ti2v-5B’yi doğru boyutlarla çalıştırır; stdout canlı olarak wan_log.txt’ye akar.
-    Çıktı: OUTPUT_DIR/wan/<id>/result.mp4
+    WAN ti2v-5B’yi doğru boyutlarla çalıştırır; stdout doğrudan wan_log.txt’ye yazılır.
+    Yapılandırılmış olaylar (model yükleme, text encode, VAE encode/decode,
+    denoising adımı, video yazma süreleri) her iki modda da `on_event(dict)`
+    ile iletilir; subprocess modunda ayrıca outdir/events.jsonl'a düşer.
+    mode="worker" ise iş kalıcı WanTI2V sürecine gönderilir (modeller bir kez yüklenir),
+    aksi halde her iş için generate.py başlatılır. İş en az yüklü cihaza (grubuna)
+    yerleşir; cihaz hatasında başka cihazda tekrarlanır (bkz. gpu_pool).
+    stream_video: VAE decode parçaları ffmpeg stdin'ine akıtılır (tüm klip
+    host belleğinde birikmez); `audio_path` verilirse aynı ffmpeg sürecinde muxlanır.
+    batch_cfg: "auto" | "true" | "false" — CFG dallarını tek forward'da koşturur.
+    Çıktı: OUTPUT_DIR/wan/<id>/result.mp4 (+ manifest.json; bkz. read_manifest)
     """
     outdir = OUTPUT_DIR / "wan" / uuid.uuid4().hex[:8]
     outdir.mkdir(parents=True, exist_ok=True)
@@ -72,50 +137,111 @@ def run_ti2v(image_path: str, prompt: str, aspect: str, resolution: str,
         raise FileNotFoundError(f"ckpt dir not found: {ckpt}")
 
     w, h = size_from_aspect_and_res(aspect, resolution)
-    cmd = [
-        sys.executable, "generate.py",
+    # çıktı yolu iş başına açıkça verilir; sonuç manifest'ten okunur
+    dst = outdir / "result.mp4"
+    manifest_path = outdir / "manifest.json"
+
+    def attempt(slot: DeviceSlot, worker: Optional[WanWorkerClient], alive) -> Path:
+        if mode == "worker" and worker is not None:
+            with log_path.open("w") as lf:
+                lf.write(f"[WORKER] device={slot.name} size={w}*{h} image={img}\n\n")
+            worker.generate(
+                str(img), prompt, f"{w}*{h}", save_file=dst, log_file=log_path,
+                manifest_file=str(manifest_path),
+                seed=seed, sample_steps=sample_steps or None,
+                sample_solver=sample_solver, n_prompt=n_prompt,
+                stream_video=stream_video, audio=str(audio_path) if audio_path else None,
+                batch_cfg=batch_cfg, on_event=on_event, alive=alive)
+        else:
+            _run_generate_py(slot, repo, ckpt, img, prompt, f"{w}*{h}", dst, manifest_path,
+                             outdir, log_path, seed=seed, sample_steps=sample_steps,
+                             sample_solver=sample_solver, n_prompt=n_prompt,
+                             stream_video=stream_video, batch_cfg=batch_cfg,
+                             audio_path=audio_path, on_event=on_event)
+        return _result_from_manifest(manifest_path, dst, log_path)
+
+    # en az yüklü cihaz (grubu); cihaz hatasında iş başka cihazda tekrarlanır
+    return get_gpu_pool().run(attempt)
+
+
+def _run_generate_py(slot: DeviceSlot, repo: Path, ckpt: Path, img: Path, prompt: str, size: str,
+                     dst: Path, manifest_path: Path, outdir: Path, log_path: Path, *,
+                     seed: int, sample_steps: int, sample_solver: str, n_prompt: str,
+                     stream_video: bool, batch_cfg: str, audio_path: Optional[str],
+                     on_event: Optional[Callable[[Dict[str, Any]], None]]):
+    """İş başına generate.py; cihaz grubunda torchrun + Ulysses/DiT FSDP."""
+    cmd = [sys.executable]
+    if slot.size > 1:
+        cmd += ["-m", "torch.distributed.run", "--standalone", "--nproc_per_node", str(slot.size)]
+    cmd += [
+        "generate.py",
         "--task", "ti2v-5B",
-        "--size", f"{w}*{h}",
+        "--size", size,
         "--ckpt_dir", str(ckpt),
-        "--offload_model", "True",
+        "--offload_model", "False" if slot.size > 1 else "True",
         "--convert_model_dtype",
         "--t5_cpu",
         "--image", str(img),
         "--prompt", (prompt or ""),
+        "--base_seed", str(seed),
+        "--sample_solver", sample_solver,
+        "--save_file", str(dst),
+        "--manifest_file", str(manifest_path),
     ]
+    if slot.size > 1:
+        cmd += ["--dit_fsdp", "--ulysses_size", str(slot.size)]
+    if sample_steps:
+        cmd += ["--sample_steps", str(sample_steps)]
+    if batch_cfg != "auto":
+        cmd += ["--batch_cfg", batch_cfg]
+    if n_prompt:
+        cmd += ["--sample_neg_prompt", n_prompt]
+    if WAN_T5_CACHE_DIR:
+        # tek seferlik süreçte bellek cache'i işe yaramaz; disk cache'i işler arası paylaşılır
+        cmd += ["--t5_cache_dir", WAN_T5_CACHE_DIR]
+    if stream_video:
+        cmd += ["--stream_video", "True"]
+        if audio_path:
+            cmd += ["--audio", str(audio_path)]
 
     env = _low_vram_env(os.environ)
+    if slot.visible is not None:
+        env["CUDA_VISIBLE_DEVICES"] = slot.visible
+
+    # olay yan kanalı: çocuk sürece miras kalan pipe'ın yazma ucu
+    r_fd, w_fd = os.pipe()
+    cmd += ["--events_fd", str(w_fd)]
+    reader = threading.Thread(target=_read_events, args=(r_fd, outdir / "events.jsonl", on_event),
+                              name="wan-events", daemon=True)
 
-    # canlı log
     with log_path.open("w", buffering=1) as lf:
-        lf.write(f"[CMD] {' '.join(cmd)}\n[CWD] {repo}\n\n")
-        proc = subprocess.Popen(
-            cmd, cwd=str(repo), env=env,
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-            text=True, bufsize=1
-        )
+        lf.write(f"[CMD] {' '.join(cmd)}\n[CWD] {repo}\n[DEVICE] {slot.name}\n\n")
+        lf.flush()
         try:
-            for line in proc.stdout:
-                lf.write(line)
-                print(line, end="", flush=True)
+            proc = subprocess.Popen(
+                cmd, cwd=str(repo), env=env,
+                stdout=lf, stderr=subprocess.STDOUT,
+                pass_fds=(w_fd,),
+            )
+        except Exception:
+            os.close(r_fd)
+            raise
         finally:
-            proc.wait()
-        rc = proc.returncode
+            os.close(w_fd)
+        reader.start()
+        rc = proc.wait()
+        reader.join(timeout=10)
         lf.write(f"\n[RETURN CODE] {rc}\n")
-        if rc != 0:
-            raise RuntimeError(f"WAN generate.py exit code {rc}. See log: {log_path}")
-
-    # mp4’ü bul
-    mp4s = sorted(Path(repo).rglob("*.mp4"), key=lambda p: p.stat().st_mtime, reverse=True)
-    if not mp4s:
-        mp4s = sorted(outdir.rglob("*.mp4"), key=lambda p: p.stat().st_mtime, reverse=True)
-    if not mp4s:
-        raise RuntimeError(f"WAN did not produce mp4. Check log: {log_path}")
-
-    dst = outdir / "result.mp4"
-    if mp4s[0].parent == outdir:
-        mp4s[0].replace(dst)
-    else:
-        import shutil; shutil.copy2(mp4s[0], dst)
-    return dst
-
+    if rc != 0:
+        if is_device_error(_log_tail(log_path)):
+            raise WorkerDeviceError(f"WAN device {slot.name} failed (exit code {rc}). See log: {log_path}")
+        raise RuntimeError(f"WAN generate.py exit code {rc}. See log: {log_path}")
+
+
+def _log_tail(path: Path, limit: int = 64 << 10) -> str:
+    try:
+        with path.open("rb") as f:
+            f.seek(max(0, path.stat().st_size - limit))
+            return f.read().decode("utf-8", "replace")
+    except OSError:
+        return ""
@@ -0,0 +1,459 @@
+"""
+Kalıcı WAN ti2v-5B worker'ı.
+
+generate.py her işte T5 + VAE + 5B WanModel'i diskten yeniden yükler.
+Bu modül WanTI2V'yi bir kez kuran uzun ömürlü bir süreç başlatır ve işleri
+yerel bir soket (multiprocessing.connection) üzerinden alır.
+
+İki taraf da bu dosyada:
+  - WanWorkerClient: worker'ı başlatır / işi gönderir. Cihaz (grubu) başına
+    bir tane gpu_pool.GpuPool tarafından tutulur.
+  - serve(): worker sürecinin kendisi (`python -m app.services.wan_worker`);
+    cihaz grubunda torchrun altında koşar, rank 0 dinler ve işi diğer
+    rank'lere yayınlar.
+"""
+import argparse
+import logging
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from ..config import (
+    CUDA_DEVICE,
+    OUTPUT_DIR,
+    WAN_ATTN_BACKEND,
+    WAN_T5_CACHE_DIR,
+    WAN_T5_CACHE_SIZE,
+    WAN_WORKER_START_TIMEOUT,
+)
+
+# health state'leri
+STATE_COLD = "cold"          # süreç yok / öldü
+STATE_WARMING = "warming"    # süreç var, modeller yükleniyor
+STATE_WARM = "warm"          # modeller bellekte, iş kabul ediyor
+
+AUTHKEY_ENV = "VIZOAI_WAN_WORKER_AUTHKEY"
+
+log = logging.getLogger("vizoai.wan_worker")
+
+
+def _device_id(device: str) -> int:
+    # "cuda:1" -> 1, "cuda" / "0" -> 0
+    tail = str(device or "").split(":")[-1]
+    return int(tail) if tail.isdigit() else 0
+
+
+def worker_address(key: str = "") -> str:
+    sock_dir = OUTPUT_DIR / "wan"
+    sock_dir.mkdir(parents=True, exist_ok=True)
+    # sahip süreç başına, cihaz (grubu) başına bir resident worker
+    key = key or str(_device_id(CUDA_DEVICE))
+    return str(sock_dir / f"worker-{key}-{os.getpid()}.sock")
+
+
+class WorkerDeviceError(RuntimeError):
+    """
+    İş, cihazdan / worker sürecinden kaynaklı hatayla bitti (worker çöktü,
+    CUDA/NCCL hatası). Aynı iş başka bir cihazda tekrar denenebilir
+    (bkz. gpu_pool.GpuPool.run).
+    """
+
+
+# girdiden bağımsız, cihazın kendisini gösteren hatalar (OOM dahil değil)
+_DEVICE_ERROR_MARKERS = (
+    "CUDA error", "cudaError", "CUBLAS_STATUS", "CUDNN_STATUS", "NCCL", "ECC error",
+    "device-side assert", "no CUDA-capable device", "CUDA driver",
+)
+
+
+def is_device_error(text: str) -> bool:
+    return any(m in (text or "") for m in _DEVICE_ERROR_MARKERS)
+
+
+class WanWorkerClient:
+    """
+    Tek bir resident worker sürecini (bir cihaz ya da cihaz grubu) yönetir.
+    Her istek kısa ömürlü bir bağlantı açar; worker bağlantıları sırayla
+    kabul ettiği için aynı worker'a gelen istekler sıralanır.
+
+    Pickle'lanabilir: iş süreçlerine geçen kopya worker'ı başlatmaz, sahibinin
+    başlattığı worker'a bağlanır (bkz. gpu_pool.GpuPool).
+
+    visible: worker'ın CUDA_VISIBLE_DEVICES değeri (None -> değiştirilmez).
+    nproc > 1: worker torchrun ile her cihazda bir rank olarak başlar
+    (DiT FSDP + Ulysses sequence parallel).
+    """
+
+    def __init__(self, repo: Path, ckpt: Path, device: str = CUDA_DEVICE,
+                 address: Optional[str] = None,
+                 start_timeout: float = WAN_WORKER_START_TIMEOUT,
+                 visible: Optional[str] = None, nproc: int = 1):
+        self.repo = Path(repo)
+        self.ckpt = Path(ckpt)
+        self.device = device
+        self.visible = visible
+        self.nproc = max(1, nproc)
+        self.address = address or worker_address()
+        self.start_timeout = start_timeout
+        self._authkey = secrets.token_bytes(32)
+        self._proc: Optional[subprocess.Popen] = None
+        self._owner = True
+        self._lock = threading.Lock()
+        self._log_path = Path(self.address).with_suffix(".log")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_proc=None, _owner=False, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # ---------- lifecycle ----------
+    @property
+    def owner(self) -> bool:
+        """Worker sürecini bu nesne mi başlatıyor (pickle'lanmış kopyada False)."""
+        return self._owner
+
+    @property
+    def state(self) -> str:
+        """Sahip süreçte anlamlıdır; dinleyici modeller yüklendikten sonra açılır."""
+        if self._proc is None or self._proc.poll() is not None:
+            return STATE_COLD
+        return STATE_WARM if os.path.exists(self.address) else STATE_WARMING
+
+    def start(self):
+        if not self._owner or (self._proc is not None and self._proc.poll() is None):
+            return
+        try:
+            os.unlink(self.address)
+        except FileNotFoundError:
+            pass
+
+        backend_dir = Path(__file__).resolve().parents[2]
+        env = os.environ.copy()
+        env[AUTHKEY_ENV] = self._authkey.hex()
+        env["PYTHONPATH"] = os.pathsep.join(
+            p for p in (str(backend_dir), str(self.repo), env.get("PYTHONPATH", "")) if p
+        )
+        env.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:64")
+        env.setdefault("PYTHONUNBUFFERED", "1")
+        env.setdefault("WAN_ATTN_BACKEND", WAN_ATTN_BACKEND)
+        if self.visible is not None:
+            # worker yalnız kendi cihazlarını görür; cihaz numarası süreç içinde 0'dan başlar
+            env["CUDA_VISIBLE_DEVICES"] = self.visible
+        device_id = 0 if self.visible is not None else _device_id(self.device)
+        cmd = [sys.executable]
+        if self.nproc > 1:
+            cmd += ["-m", "torch.distributed.run", "--standalone",
+                    "--nproc_per_node", str(self.nproc)]
+        cmd += [
+            "-m", "app.services.wan_worker",
+            "--address", self.address,
+            "--ckpt_dir", str(self.ckpt),
+            "--device_id", str(device_id),
+            "--t5_cache_size", str(WAN_T5_CACHE_SIZE),
+        ]
+        if WAN_T5_CACHE_DIR:
+            cmd += ["--t5_cache_dir", WAN_T5_CACHE_DIR]
+        self._log_path.parent.mkdir(parents=True, exist_ok=True)
+        log = open(self._log_path, "a", buffering=1)
+        log.write(f"[CMD] {' '.join(cmd)}\n[CWD] {self.repo}\n"
+                  f"[CUDA_VISIBLE_DEVICES] {env.get('CUDA_VISIBLE_DEVICES', '')}\n\n")
+        self._proc = subprocess.Popen(cmd, cwd=str(self.repo), env=env,
+                                      stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+
+    def _connect(self, alive: Optional[Callable[[], bool]] = None):
+        """
+        Worker dinlemeye başlayana (= modeller yüklenene) kadar bekler.
+        `alive` sahibi başka süreç olan worker'ın durumunu söyler (bkz. GpuPool).
+        """
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            if self._owner and (self._proc is None or self._proc.poll() is not None):
+                raise WorkerDeviceError(f"WAN worker exited during startup. See log: {self._log_path}")
+            if alive is not None and not alive():
+                raise WorkerDeviceError(f"WAN worker on {self.device} is down. See log: {self._log_path}")
+            try:
+                return Client(self.address, family="AF_UNIX", authkey=self._authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise WorkerDeviceError(f"WAN worker not ready after {self.start_timeout}s")
+                time.sleep(1.0)
+
+    def stop(self):
+        if not self._owner:
+            return
+        with self._lock:
+            if self._proc is not None:
+                # torchrun SIGTERM'i rank'lere iletir
+                self._proc.terminate()
+                try:
+                    self._proc.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+                    self._proc.wait()
+                self._proc = None
+
+    # ---------- requests ----------
+    def request(self, msg: Dict[str, Any],
+                on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                alive: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        """Yanıttan önce gelen {"event": ...} mesajları on_event'e iletilir."""
+        with self._lock:
+            self.start()
+            conn = self._connect(alive)
+            try:
+                conn.send(msg)
+                while True:
+                    resp = conn.recv()
+                    if "event" not in resp:
+                        break
+                    if on_event is not None:
+                        try:
+                            on_event(resp["event"])
+                        except Exception:
+                            log.exception("WAN event handler failed")
+            except (EOFError, OSError):
+                # worker çöktü → sahibi yeniden başlatır
+                raise WorkerDeviceError(f"WAN worker connection lost. See log: {self._log_path}")
+            finally:
+                conn.close()
+        if not resp.get("ok"):
+            error = resp.get("error") or "WAN worker failed"
+            raise (WorkerDeviceError if resp.get("device_error") else RuntimeError)(error)
+        return resp
+
+    def generate(self, image_path: str, prompt: str, size: str,
+                 save_file: Path, log_file: Path,
+                 on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 alive: Optional[Callable[[], bool]] = None, **kwargs) -> Path:
+        resp = self.request({
+            "op": "generate",
+            "image": str(image_path),
+            "prompt": prompt or "",
+            "size": size,
+            "save_file": str(save_file),
+            "log_file": str(log_file),
+            **kwargs,
+        }, on_event=on_event, alive=alive)
+        return Path(resp["path"])
+
+
+# ---------- worker süreci ----------
+def _job_logger(log_file: str) -> logging.Handler:
+    handler = logging.FileHandler(log_file, mode="a")
+    handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s: %(message)s"))
+    logging.getLogger().addHandler(handler)
+    return handler
+
+
+def _batch_cfg(value: Optional[str]):
+    # "auto" | "true" | "false" -> WanTI2V.generate(batch_cfg=...)
+    value = (value or "auto").lower()
+    return value if value == "auto" else value in ("1", "true", "yes")
+
+
+def _generate_args(msg: Dict[str, Any], cfg, offload_model: bool) -> Dict[str, Any]:
+    """generate mesajından WanTI2V.generate argümanları (grupta her rank aynısını kurar)."""
+    from PIL import Image
+    from wan.configs import MAX_AREA_CONFIGS, SIZE_CONFIGS
+
+    size = msg["size"]
+    return dict(
+        input_prompt=msg.get("prompt", ""),
+        img=Image.open(msg["image"]).convert("RGB"),
+        size=SIZE_CONFIGS[size],
+        max_area=MAX_AREA_CONFIGS[size],
+        frame_num=msg.get("frame_num") or cfg.frame_num,
+        shift=msg.get("sample_shift") or cfg.sample_shift,
+        sample_solver=msg.get("sample_solver") or "unipc",
+        sampling_steps=msg.get("sample_steps") or cfg.sample_steps,
+        guide_scale=msg.get("sample_guide_scale") or cfg.sample_guide_scale,
+        n_prompt=msg.get("n_prompt") or "",
+        seed=msg.get("seed", -1),
+        offload_model=offload_model,
+        batch_cfg=_batch_cfg(msg.get("batch_cfg")))
+
+
+def _follow(pipeline, cfg, offload_model: bool):
+    """Grup rank'leri (>0): rank 0'ın yayınladığı işleri birlikte koşar; çıktıyı rank 0 yazar."""
+    import torch.distributed as dist
+
+    while True:
+        box = [None]
+        dist.broadcast_object_list(box, src=0)
+        msg = box[0]
+        if msg is None:
+            return
+        try:
+            pipeline.generate(**_generate_args(msg, cfg, offload_model))
+        except Exception:
+            logging.error(traceback.format_exc())
+
+
+def serve(address: str, ckpt_dir: str, device_id: int = 0, t5_cpu: bool = True,
+          convert_model_dtype: bool = True, offload_model: bool = True,
+          t5_cache_size: int = 32, t5_cache_dir: Optional[str] = None):
+    # cwd = Wan2.2 repo; `wan` paketi PYTHONPATH üzerinden gelir
+    import random
+
+    import torch
+    import torch.distributed as dist
+
+    import wan
+    from wan.configs import WAN_CONFIGS
+    from wan.utils.events import EventWriter, set_writer
+    from wan.utils.utils import save_video, write_manifest
+    from wan.utils.video_sink import FFmpegVideoSink, ffmpeg_available
+
+    logging.basicConfig(level=logging.INFO,
+                        format="[%(asctime)s] %(levelname)s: %(message)s",
+                        handlers=[logging.StreamHandler(stream=sys.stdout)])
+    authkey = bytes.fromhex(os.environ[AUTHKEY_ENV])
+    cfg = WAN_CONFIGS["ti2v-5B"]
+
+    # cihaz grubu (torchrun): her rank bir GPU, DiT FSDP + Ulysses sequence parallel
+    rank = int(os.getenv("RANK", 0))
+    world_size = int(os.getenv("WORLD_SIZE", 1))
+    if world_size > 1:
+        from wan.distributed.util import init_distributed_group
+        device_id = int(os.getenv("LOCAL_RANK", 0))
+        torch.cuda.set_device(device_id)
+        dist.init_process_group(backend="nccl", init_method="env://",
+                                rank=rank, world_size=world_size)
+        init_distributed_group()
+        offload_model = False
+
+    t0 = time.perf_counter()
+    logging.info(f"Creating WanTI2V pipeline (resident, rank {rank}/{world_size}).")
+    pipeline = wan.WanTI2V(
+        config=cfg,
+        checkpoint_dir=ckpt_dir,
+        device_id=device_id,
+        rank=rank,
+        t5_cpu=t5_cpu,
+        dit_fsdp=world_size > 1,
+        use_sp=world_size > 1,
+        convert_model_dtype=convert_model_dtype,
+        t5_cache_size=t5_cache_size,
+        t5_cache_dir=t5_cache_dir,
+    )
+    # sabit negatif prompt bir kez kodlanır; kararlı durumda iş başına en fazla bir T5 forward
+    t_neg = time.perf_counter()
+    pipeline.text_encoder.precompute([cfg.sample_neg_prompt])
+    logging.info(f"Negative prompt embedding ready in {time.perf_counter() - t_neg:.1f}s")
+    if rank != 0:
+        _follow(pipeline, cfg, offload_model)
+        return
+    load_seconds = round(time.perf_counter() - t0, 4)
+    logging.info(f"WanTI2V ready in {load_seconds:.1f}s, listening on {address}")
+
+    listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    try:
+        while True:
+            conn = listener.accept()
+            try:
+                while True:
+                    try:
+                        msg = conn.recv()
+                    except EOFError:
+                        break
+                    op = msg.get("op")
+                    if op == "ping":
+                        conn.send({"ok": True, "state": STATE_WARM})
+                    elif op == "shutdown":
+                        conn.send({"ok": True})
+                        return
+                    elif op == "generate":
+                        handler = _job_logger(msg["log_file"])
+                        sink = None
+                        events = EventWriter(callback=lambda rec: conn.send({"event": rec}))
+                        set_writer(events)
+                        try:
+                            if load_seconds is not None:
+                                # modeller bu süreçte bir kez yüklenir: ilk işle raporla
+                                events.emit("timing", name="model_load", seconds=load_seconds)
+                                load_seconds = None
+                            t_job = time.perf_counter()
+                            if world_size > 1:
+                                # tohum tüm rank'lerde aynı olmalı
+                                if msg.get("seed", -1) < 0:
+                                    msg["seed"] = random.randint(0, sys.maxsize)
+                                dist.broadcast_object_list([msg], src=0)
+                            if msg.get("stream_video") and ffmpeg_available():
+                                # decode edilen parçalar doğrudan ffmpeg stdin'ine; klip bellekte birikmez
+                                sink = FFmpegVideoSink(msg["save_file"], fps=cfg.sample_fps,
+                                                       audio=msg.get("audio"))
+                            video = pipeline.generate(**_generate_args(msg, cfg, offload_model),
+                                                      video_sink=sink)
+                            with events.timer("video_write"):
+                                if sink is not None:
+                                    sink.close()
+                                else:
+                                    save_video(
+                                        tensor=video[None],
+                                        save_file=msg["save_file"],
+                                        fps=cfg.sample_fps,
+                                        nrow=1,
+                                        normalize=True,
+                                        value_range=(-1, 1))
+                            if sink is not None:
+                                frames, wh = sink.frames, sink.size
+                            else:
+                                frames, wh = video.shape[1], (video.shape[3], video.shape[2])
+                            del video
+                            sink = None
+                            torch.cuda.empty_cache()
+                            if not Path(msg["save_file"]).exists():
+                                raise RuntimeError("video writer produced no file")
+                            if msg.get("manifest_file"):
+                                write_manifest(msg["manifest_file"], msg["save_file"], frames=frames,
+                                               fps=cfg.sample_fps, size=wh, timings=events.timings,
+                                               task="ti2v-5B")
+                            logging.info(f"Job finished in {time.perf_counter() - t_job:.1f}s")
+                            conn.send({"ok": True, "path": msg["save_file"]})
+                        except Exception as e:
+                            if sink is not None:
+                                sink.abort()
+                            logging.error(traceback.format_exc())
+                            error = f"{type(e).__name__}: {e}"
+                            conn.send({"ok": False, "error": error,
+                                       "device_error": is_device_error(error)})
+                        finally:
+                            set_writer(None)
+                            logging.getLogger().removeHandler(handler)
+                            handler.close()
+                    else:
+                        conn.send({"ok": False, "error": f"unknown op: {op}"})
+            finally:
+                conn.close()
+    finally:
+        listener.close()
+        if world_size > 1:
+            dist.broadcast_object_list([None], src=0)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Resident WAN ti2v-5B worker")
+    parser.add_argument("--address", required=True)
+    parser.add_argument("--ckpt_dir", required=True)
+    parser.add_argument("--device_id", type=int, default=0)
+    parser.add_argument("--t5_cache_size", type=int, default=32)
+    parser.add_argument("--t5_cache_dir", default=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    serve(args.address, args.ckpt_dir, device_id=args.device_id,
+          t5_cache_size=args.t5_cache_size, t5_cache_dir=args.t5_cache_dir)
@@ -0,0 +1,150 @@
+"""
+/outputs için Range (206), koşullu istek (304) ve cache başlıkları bilen
+dosya sunucusu.
+
+- ETag / Last-Modified her yanıtta; If-None-Match / If-Modified-Since → 304.
+- Tek aralıklı `Range: bytes=a-b` → 206, If-Range destekli; karşılanamayan
+  aralık (başlangıç >= boyut) → 416. Çoklu ya da sözdizimi geçersiz
+  (ör. b < a) aralıkta başlık yok sayılır ve tüm dosya (200) döner.
+- Adında içerik özeti taşıyan dosyalar (final.<sha16>.mp4, cache/ girişleri;
+  bkz. pipeline._publish_final) `immutable` ve 1 yıl cache'lenir; diğerleri
+  ETag ile yeniden doğrulanır.
+- Sunucu ASGI `http.response.zerocopysend` eklentisini destekliyorsa gövde
+  sendfile ile gönderilir, yoksa sabit boyutlu parçalarla akıtılır.
+"""
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Optional, Tuple
+
+import anyio
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 256 * 1024
+# dosya adında en az 16 haneli hex özet: "<sha>.ext" ya da "ad.<sha>[.x].ext"
+IMMUTABLE_NAME = re.compile(r"(?:^|\.)[0-9a-f]{16,64}\.")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+def _etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """`bytes=a-b` → (start, end) dahil. Geçersiz/çoklu → None (200), karşılanamaz → (-1, -1) (416)."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            n = int(last)  # son n bayt
+            if n <= 0:
+                return (-1, -1)
+            return (max(0, size - n), size - 1)
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if end < start:
+        return None
+    if start >= size:
+        return (-1, -1)
+    return (start, min(end, size - 1))
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        tags = [t.strip() for t in inm.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= int(parsedate_to_datetime(ims).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class RangeFileResponse(Response):
+
+    def __init__(self, path: Path, st: os.stat_result, start: int, end: int,
+                 status_code: int, headers: dict, media_type: Optional[str]):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.length = end - start + 1
+        self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code,
+                    "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            if zerocopy:
+                await send({"type": "http.response.zerocopysend", "file": f.wrapped,
+                            "offset": self.start, "count": self.length, "more_body": False})
+                return
+            await f.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk,
+                            "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def serve_file(request: Request, root: Path, rel_path: str) -> Response:
+    root = root.resolve()
+    fpath = (root / rel_path).resolve()
+    try:
+        fpath.relative_to(root)
+        st = os.stat(fpath)
+    except (ValueError, FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="file not found")
+    if not stat.S_ISREG(st.st_mode):
+        raise HTTPException(status_code=404, detail="file not found")
+
+    etag = _etag(st)
+    immutable = IMMUTABLE_NAME.search(fpath.name) is not None
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(st.st_mtime, usegmt=True),
+        "accept-ranges": "bytes",
+        "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+    media_type = guess_type(fpath.name)[0] or "application/octet-stream"
+
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    size = st.st_size
+    rng = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if rng and (if_range is None or if_range == etag):
+        parsed = _parse_range(rng, size)
+        if parsed == (-1, -1):
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if parsed is not None:
+            start, end = parsed
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            return RangeFileResponse(fpath, st, start, end, 206, headers, media_type)
+    if size == 0:
+        return Response(status_code=200, headers=headers, media_type=media_type)
+    return RangeFileResponse(fpath, st, 0, size - 1, 200, headers, media_type)
@@ -0,0 +1,211 @@
+"""
+Attention backend benchmark'ı: wan.modules.attention registry'sindeki her
+çekirdek (fa3, fa2, sdpa, chunked) için sayısal eşdeğerlik ve hız.
+
+Eşdeğerlik: her backend'in çıktısı float64 naif referansla (tam skor
+matrisi + maske) karşılaştırılır; key dolgusu (k_lens), query dolgusu
+(q_lens), causal, sliding window, dolgulu batch'te causal/window ve GQA
+durumları dahil. Referans, flash-attn varlen kuralını örnek başına kendisi
+uygular (causal/window sağ-alt hizalı: satır i -> key i + k_len - q_len;
+hiç key görmeyen satır 0) ve attention._mask'i kullanmaz. Hata toleransı
+aşan durumda süreç 1 ile çıkar.
+
+Hız: her backend ayrı süreçte --seq uzunluğunda self-attention koşar;
+çağrı süresi (ms, ilk --warmup hariç), token/s ve tepe bellek (CUDA'da
+max_memory_allocated, CPU'da ru_maxrss) raporlanır. Cihazda çalışamayan
+backend'ler atlanır.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_attention --seq 4096 --heads 12 --head_dim 128
+    WAN_ATTN_CHUNK=512 python -m benchmarks.bench_attention --backends chunked sdpa
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+WAN_REPO = Path(__file__).resolve().parents[1] / "models" / "Wan2.2"
+sys.path.insert(0, str(WAN_REPO))
+
+# eşdeğerlik durumları; b=2, "cross" dışında lq=lk
+CASES = ("plain", "k_pad", "q_pad", "causal", "window", "gqa", "cross",
+         "causal_pad", "window_pad")
+
+
+def _reference(q, k, v, q_lens, k_lens, causal, window_size):
+    import torch
+
+    b, lq, nq, _ = q.shape
+    lk, nk = k.size(1), k.size(2)
+    q, k, v = (u.double().transpose(1, 2) for u in (q, k, v))
+    if nk != nq:
+        k = k.repeat_interleave(nq // nk, dim=1)
+        v = v.repeat_interleave(nq // nk, dim=1)
+    score = q @ k.transpose(-2, -1) / q.size(-1) ** 0.5
+    cols = torch.arange(lk)[None, :]
+    empty = []
+    for i in range(b):
+        # örnek başına sağ-alt hizalama (flash-attn varlen)
+        rows = torch.arange(lq)[:, None] + (int(k_lens[i]) - int(q_lens[i]))
+        mask = cols < int(k_lens[i])
+        if causal:
+            mask = mask & (cols <= rows)
+        if window_size[0] >= 0:
+            mask = mask & (cols >= rows - window_size[0])
+        if window_size[1] >= 0:
+            mask = mask & (cols <= rows + window_size[1])
+        score[i].masked_fill_(~mask, float("-inf"))
+        empty.append(~mask.expand(lq, lk).any(-1))
+    x = (score.softmax(-1) @ v).transpose(1, 2)
+    for i in range(b):
+        x[i, empty[i]] = 0  # tüm key'leri maskeli satır (softmax NaN)
+        x[i, int(q_lens[i]):] = 0
+    return x
+
+
+def _case(name, seq, heads, head_dim, device, dtype):
+    import torch
+
+    g = torch.Generator(device="cpu").manual_seed(CASES.index(name))
+    b, lq, lk, nk = 2, seq, seq, heads
+    kw = {}
+    if name == "gqa":
+        nk = max(1, heads // 4)
+    if name == "cross":
+        lk = max(8, seq // 4)
+        kw["k_lens"] = torch.tensor([lk, lk // 2], dtype=torch.int32)
+    q = torch.randn(b, lq, heads, head_dim, generator=g)
+    k = torch.randn(b, lk, nk, head_dim, generator=g)
+    v = torch.randn(b, lk, nk, head_dim, generator=g)
+    if name == "k_pad":
+        kw["k_lens"] = torch.tensor([lk, lk - lk // 3], dtype=torch.int32)
+    elif name == "q_pad":
+        kw["q_lens"] = torch.tensor([lq - lq // 4, lq], dtype=torch.int32)
+        kw["k_lens"] = kw["q_lens"].clone()
+    elif name == "causal":
+        kw["causal"] = True
+    elif name == "window":
+        kw["window_size"] = (seq // 8, seq // 8)
+    elif name in ("causal_pad", "window_pad"):
+        # q_len != k_len olan örnekler: hizalama örnek başına farklı
+        kw["q_lens"] = torch.tensor([lq - lq // 4, lq - lq // 8], dtype=torch.int32)
+        kw["k_lens"] = torch.tensor([lk - lk // 8, lk - lk // 3], dtype=torch.int32)
+        if name == "causal_pad":
+            kw["causal"] = True
+        else:
+            kw["window_size"] = (seq // 8, seq // 16)
+    q_lens = kw.get("q_lens", torch.full((b,), lq))
+    k_lens = kw.get("k_lens", torch.full((b,), lk))
+    ref = _reference(q, k, v, q_lens, k_lens, kw.get("causal", False), kw.get("window_size", (-1, -1)))
+    args = [u.to(device=device, dtype=dtype) for u in (q, k, v)]
+    kw = {key: (val.to(device) if hasattr(val, "to") else val) for key, val in kw.items()}
+    return args, kw, ref
+
+
+def check(backends, args, device, dtype, tol):
+    import torch
+    from wan.modules.attention import flash_attention, set_attention_backend
+
+    ok = True
+    for name in backends:
+        set_attention_backend(name)
+        errs = []
+        for case in CASES:
+            if name == "fa3" and case in ("window", "window_pad"):
+                continue  # FA3 sliding window desteklemiyor
+            (q, k, v), kw, ref = _case(case, args.check_seq, args.heads, args.head_dim, device, dtype)
+            with torch.no_grad():
+                out = flash_attention(q, k, v, **kw)
+            err = (out.double().cpu() - ref).abs().max().item()
+            errs.append(f"{case}={err:.1e}")
+            ok &= err <= tol
+        print(f"{name:8s} max|x - ref|  " + "  ".join(errs))
+    return ok
+
+
+def child(args, name):
+    import torch
+    from wan.modules.attention import flash_attention, set_attention_backend
+
+    device = torch.device(args.device)
+    dtype = torch.bfloat16 if device.type == "cuda" else torch.float32
+    set_attention_backend(name)
+    g = torch.Generator(device="cpu").manual_seed(0)
+    q, k, v = (torch.randn(1, args.seq, args.heads, args.head_dim, generator=g).to(device, dtype)
+               for _ in range(3))
+    sync = torch.cuda.synchronize if device.type == "cuda" else (lambda: None)
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+    times = []
+    with torch.no_grad():
+        for i in range(args.warmup + args.iters):
+            sync()
+            t0 = time.perf_counter()
+            flash_attention(q, k, v)
+            sync()
+            if i >= args.warmup:
+                times.append(time.perf_counter() - t0)
+    if device.type == "cuda":
+        peak_mb = torch.cuda.max_memory_allocated(device) / 2**20
+    else:
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    ms = 1000 * sum(times) / len(times)
+    print(json.dumps({"ms": ms, "tokens_s": args.seq / (ms / 1000), "peak_mb": peak_mb}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="*", default=None, help="varsayılan: cihazda çalışan hepsi")
+    ap.add_argument("--device", default=None, help="cpu | cuda (varsayılan: varsa cuda)")
+    ap.add_argument("--seq", type=int, default=4096, help="hız ölçümü için token sayısı")
+    ap.add_argument("--check_seq", type=int, default=96, help="eşdeğerlik durumlarında token sayısı")
+    ap.add_argument("--heads", type=int, default=12)
+    ap.add_argument("--head_dim", type=int, default=128)
+    ap.add_argument("--iters", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--tol", type=float, default=None, help="varsayılan: CPU 1e-4, CUDA 3e-2")
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    import torch
+    from wan.modules.attention import attention_backends
+
+    args.device = args.device or ("cuda" if torch.cuda.is_available() else "cpu")
+    if args.child:
+        child(args, args.child)
+        return
+
+    device = torch.device(args.device)
+    dtype = torch.bfloat16 if device.type == "cuda" else torch.float32
+    tol = args.tol if args.tol is not None else (3e-2 if device.type == "cuda" else 1e-4)
+    avail = attention_backends(device)
+    backends = args.backends or [n for n, ok in avail.items() if ok]
+    skipped = [n for n in backends if not avail.get(n)]
+    backends = [n for n in backends if avail.get(n)]
+    if skipped:
+        print(f"skipped (not available on {device.type}): {', '.join(skipped)}")
+
+    ok = check(backends, args, device, dtype, tol)
+
+    print(f"\nself-attention  seq={args.seq}  heads={args.heads}  head_dim={args.head_dim}  device={device.type}")
+    for name in backends:
+        cmd = [sys.executable, "-m", "benchmarks.bench_attention", "--child", name]
+        for key in ("device", "seq", "heads", "head_dim", "iters", "warmup"):
+            cmd += [f"--{key}", str(getattr(args, key))]
+        res = subprocess.run(cmd, capture_output=True, text=True,
+                             cwd=str(Path(__file__).resolve().parents[1]))
+        if res.returncode != 0:
+            print(f"{name:8s} failed:\n{res.stderr}")
+            continue
+        r = json.loads(res.stdout.strip().splitlines()[-1])
+        print(f"{name:8s} ms={r['ms']:.1f}  tokens/s={r['tokens_s']:.0f}  peak_mb={r['peak_mb']:.0f}")
+    if not ok:
+        print(f"\nequivalence check FAILED (tol={tol:g})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Login + iş durumu yük benchmark'ı: eski handler'lar (async def içinde sync
+DB sorgusu ve parola doğrulama -> event loop bloklanır) ile db_async +
+passwords havuzunu kullanan yeni handler'lar karşılaştırılır.
+
+Karışık trafik: istemcilerin bir kısmı sürekli login olur, geri kalanı
+/api/jobs/{id} sorgular. Eski yolda her login hash süresi boyunca tüm
+job poll'larını da bekletir; yenide hash ayrı süreçte, sorgu loop dışında.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_auth --login-clients 8 --poll-clients 32 --seconds 10
+"""
+import argparse
+import datetime as _dt
+import http.client
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+_TMP = tempfile.mkdtemp(prefix="vizoai-bench-auth-")
+os.environ.setdefault("VIZOAI_DB_PATH", str(Path(_TMP) / "bench.db"))
+os.environ.setdefault("VIZOAI_OUTPUT_DIR", str(Path(_TMP) / "outputs"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, HTTPException, Request  # noqa: E402
+
+from app import db_async, passwords  # noqa: E402
+from app.db import SessionLocal, User, Job, ensure_schema  # noqa: E402
+
+PASSWORD = "bench-password"
+
+
+def seed(users: int, jobs: int):
+    ensure_schema()
+    pw_hash = passwords.hash_password(PASSWORD)
+    job_ids = [uuid.uuid4().hex[:12] for _ in range(jobs)]
+    with SessionLocal() as db:
+        db.add_all(User(name=f"u{i}", email=f"u{i}@bench.local", password_hash=pw_hash) for i in range(users))
+        db.add_all(Job(id=j, user_id=i % users, image_path="/tmp/x.jpg", status="running", progress=0.5)
+                   for i, j in enumerate(job_ids))
+        db.commit()
+    return job_ids
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    # --- eski: app.py'deki önceki handler'ların kopyası ---
+    @app.post("/legacy/login")
+    async def legacy_login(request: Request):
+        body = await request.json()
+        with SessionLocal() as db:
+            user = db.query(User).filter(User.email == body["email"]).first()
+            if not user or not passwords.verify_password(body["password"], user.password_hash):
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+            user.last_login = _dt.datetime.utcnow(); db.commit()
+            return {"ok": True, "id": user.id}
+
+    @app.get("/legacy/jobs/{job_id}")
+    def legacy_job(job_id: str):
+        with SessionLocal() as db:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if not job:
+                raise HTTPException(status_code=404, detail="Job not found")
+            return {"status": job.status, "progress": job.progress}
+
+    # --- yeni: app.py'deki güncel yol ---
+    @app.post("/new/login")
+    async def new_login(request: Request):
+        body = await request.json()
+        user = await db_async.get_user_by_email(body["email"])
+        if not user or not await passwords.verify_password_async(body["password"], user.password_hash):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        await db_async.touch_login(user.id)
+        return {"ok": True, "id": user.id}
+
+    @app.get("/new/jobs/{job_id}")
+    async def new_job(job_id: str):
+        job = await db_async.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return {"status": job.status, "progress": job.progress}
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def client(port: int, kind: str, base: str, users: int, job_ids, out: list, stop: threading.Event, seed_: int):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    i = seed_
+    try:
+        while not stop.is_set():
+            i += 1
+            t0 = time.perf_counter()
+            if kind == "login":
+                body = json.dumps({"email": f"u{i % users}@bench.local", "password": PASSWORD})
+                conn.request("POST", f"/{base}/login", body=body, headers={"Content-Type": "application/json"})
+            else:
+                conn.request("GET", f"/{base}/jobs/{job_ids[i % len(job_ids)]}")
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status == 200:
+                out.append(time.perf_counter() - t0)
+    finally:
+        conn.close()
+
+
+def _pct(xs, p):
+    if not xs:
+        return float("nan")
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] * 1000
+
+
+def run(port: int, base: str, login_clients: int, poll_clients: int, seconds: float, users: int, job_ids):
+    lat = {"login": [], "poll": []}
+    stop = threading.Event()
+    threads = [threading.Thread(target=client, args=(port, "login", base, users, job_ids, lat["login"], stop, n * 997))
+               for n in range(login_clients)]
+    threads += [threading.Thread(target=client, args=(port, "poll", base, users, job_ids, lat["poll"], stop, n * 991))
+                for n in range(poll_clients)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    out = {}
+    for kind, xs in lat.items():
+        out[f"{kind}_rps"] = len(xs) / seconds
+        out[f"{kind}_p50_ms"] = statistics.median(xs) * 1000 if xs else float("nan")
+        out[f"{kind}_p99_ms"] = _pct(xs, 0.99)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--login-clients", type=int, default=8)
+    ap.add_argument("--poll-clients", type=int, default=32)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--jobs", type=int, default=5000)
+    args = ap.parse_args()
+
+    job_ids = seed(args.users, args.jobs)
+    print(f"async_db={db_async.ASYNC_ENABLED} hash_workers={passwords.PASSWORD_HASH_WORKERS}")
+    port = _free_port()
+    server = start_server(build_app(), port)
+    try:
+        for base in ("legacy", "new"):
+            r = run(port, base, args.login_clients, args.poll_clients, args.seconds, args.users, job_ids)
+            print(f"{base:7s} " + "  ".join(f"{k}={v:.1f}" for k, v in r.items()))
+    finally:
+        server.should_exit = True
+        passwords.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Batched CFG benchmark: denoising adımında koşullu + koşulsuz dalın iki ayrı
+forward'ı (sequential) ile tek batch-of-2 forward'ı (batched).
+
+Checkpoint gerekmez: ti2v yapısında küçük, rastgele ağırlıklı bir WanModel
+kurulur (--dim/--layers/--heads, latent --frames x --size). Her mod ayrı
+süreçte koşar; adım süresi (ms, ilk --warmup adım hariç), tepe bellek
+(CUDA'da max_memory_allocated, CPU'da ru_maxrss) ve iki modun çıktı farkı
+raporlanır.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_cfg_batch --dim 512 --layers 8 --frames 9 --size 40x24
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+WAN_REPO = Path(__file__).resolve().parents[1] / "models" / "Wan2.2"
+sys.path.insert(0, str(WAN_REPO))
+
+
+def _model(args, device):
+    import torch
+    from wan.modules import model as wan_model
+    from wan.modules.attention import set_attention_backend
+
+    # flash-attn yoksa (CPU) registry sdpa'ya düşer; iki mod aynı çekirdeği kullanır
+    set_attention_backend(args.attn_backend)
+
+    torch.manual_seed(0)
+    model = wan_model.WanModel(model_type="ti2v", in_dim=48, out_dim=48, dim=args.dim,
+                               ffn_dim=args.dim * 4, num_heads=args.heads, num_layers=args.layers,
+                               text_len=args.text_len, text_dim=args.text_dim)
+    return model.eval().requires_grad_(False).to(device)
+
+
+def child(args, mode: str):
+    import torch
+    from wan.utils.cfg import guided_noise
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = _model(args, device)
+    w, h = (int(v) for v in args.size.split("x"))
+    g = torch.Generator(device="cpu").manual_seed(1)
+    latent = torch.randn(48, args.frames, h, w, generator=g).to(device)
+    seq_len = args.frames * (h // 2) * (w // 2)
+    arg_c = {"context": [torch.randn(args.text_len, args.text_dim, generator=g).to(device)],
+             "seq_len": seq_len}
+    arg_null = {"context": [torch.randn(args.text_len // 2, args.text_dim, generator=g).to(device)],
+                "seq_len": seq_len}
+    timestep = torch.full((1, seq_len), 500.0, device=device)
+
+    sync = torch.cuda.synchronize if device.type == "cuda" else (lambda: None)
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+    times, out = [], None
+    batched = mode == "batched"
+    dtype = torch.bfloat16 if device.type == "cuda" else torch.float32
+    with torch.no_grad(), torch.amp.autocast(device.type, dtype=dtype, enabled=device.type == "cuda"):
+        for i in range(args.warmup + args.steps):
+            sync()
+            t0 = time.perf_counter()
+            out, batched = guided_noise(model, [latent], timestep, arg_c, arg_null,
+                                        guide_scale=5.0, batched=batched)
+            sync()
+            if i >= args.warmup:
+                times.append(time.perf_counter() - t0)
+    if device.type == "cuda":
+        peak_mb = torch.cuda.max_memory_allocated(device) / 2**20
+    else:
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    torch.save(out.float().cpu(), args.out)
+    print(json.dumps({"device": device.type, "step_ms": 1000 * sum(times) / len(times),
+                      "peak_mb": peak_mb, "batched": batched}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--heads", type=int, default=8)
+    ap.add_argument("--layers", type=int, default=8)
+    ap.add_argument("--text_len", type=int, default=64)
+    ap.add_argument("--text_dim", type=int, default=256)
+    ap.add_argument("--frames", type=int, default=9, help="latent kare sayısı")
+    ap.add_argument("--size", default="40x24", help="latent WxH (patch 2x2)")
+    ap.add_argument("--steps", type=int, default=10)
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--attn_backend", default="auto", help="auto | fa3 | fa2 | sdpa | chunked")
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--out", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args, args.child)
+        return
+
+    import tempfile
+    import torch
+    outs = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("sequential", "batched"):
+            out = str(Path(tmp) / f"{mode}.pt")
+            cmd = [sys.executable, "-m", "benchmarks.bench_cfg_batch", "--child", mode, "--out", out]
+            for k in ("dim", "heads", "layers", "text_len", "text_dim", "frames", "size", "steps", "warmup",
+                      "attn_backend"):
+                cmd += [f"--{k}", str(getattr(args, k))]
+            res = subprocess.run(cmd, capture_output=True, text=True,
+                                 cwd=str(Path(__file__).resolve().parents[1]))
+            if res.returncode != 0:
+                print(f"{mode:10s} failed:\n{res.stderr}")
+                continue
+            r = json.loads(res.stdout.strip().splitlines()[-1])
+            print(f"{mode:10s} device={r['device']}  step_ms={r['step_ms']:.1f}  "
+                  f"peak_mb={r['peak_mb']:.0f}  ran_batched={r['batched']}")
+            outs[mode] = torch.load(out)
+    if len(outs) == 2:
+        diff = (outs["sequential"] - outs["batched"]).abs().max().item()
+        print(f"max |sequential - batched| = {diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+SQLite yük benchmark'ı: eşzamanlı okuyucular (iş durumu sorguları) ve
+yazıcılar (worker progress güncellemeleri + yeni işler).
+
+Varyantlar:
+  baseline -> eski engine (rollback journal, varsayılan havuz), yeni index'ler yok,
+              her progress olayı ayrı commit
+  tuned    -> db.make_engine() (WAL + pragmalar + QueuePool) + composite index'ler
+  batched  -> tuned + progress güncellemeleri StatusBatcher gibi tek transaction'da
+
+Her varyant ayrı geçici DB'de koşar; ops/s, p50/p99 gecikme ve
+"database is locked" hata sayısı raporlanır.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_db --readers 32 --writers 4 --seconds 10
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+_TMP = tempfile.mkdtemp(prefix="vizoai-bench-db-")
+os.environ.setdefault("VIZOAI_DB_PATH", str(Path(_TMP) / "unused.db"))
+os.environ.setdefault("VIZOAI_OUTPUT_DIR", str(Path(_TMP) / "outputs"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app.db import Base, make_engine  # noqa: E402
+
+USERS = 200
+BATCH = 20
+STATUSES = ("queued", "running", "done", "done", "done", "error")
+
+
+def setup(path: Path, variant: str, jobs: int):
+    eng = make_engine(path, tuned=variant != "baseline")
+    Base.metadata.create_all(eng)
+    with eng.begin() as conn:
+        if variant == "baseline":
+            for ix in ("ix_jobs_user_status_created", "ix_jobs_status_created", "ix_uploads_path"):
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {ix}")
+        rows = [{"id": uuid.uuid4().hex[:12], "user_id": random.randrange(USERS),
+                 "status": random.choice(STATUSES), "image_path": "/tmp/x.jpg",
+                 "created_at": f"2025-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}"}
+                for i in range(jobs)]
+        conn.execute(text("INSERT INTO jobs (id, user_id, status, image_path, created_at, progress) "
+                          "VALUES (:id, :user_id, :status, :image_path, :created_at, 0)"), rows)
+    return eng, [r["id"] for r in rows]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.read_lat, self.write_lat = [], []
+        self.locked = 0
+
+    def add(self, kind: str, dt: float):
+        with self.lock:
+            (self.read_lat if kind == "r" else self.write_lat).append(dt)
+
+
+def reader(eng, ids, stats: Stats, stop: threading.Event):
+    rnd = random.Random()
+    while not stop.is_set():
+        q = rnd.random()
+        t0 = time.perf_counter()
+        try:
+            with eng.connect() as conn:
+                if q < 0.7:    # /api/jobs/{id} poll
+                    conn.execute(text("SELECT status, video_path, error, progress FROM jobs WHERE id = :id"),
+                                 {"id": rnd.choice(ids)}).first()
+                elif q < 0.9:  # kullanıcının aktif işleri
+                    conn.execute(text("SELECT id, status FROM jobs WHERE user_id = :u AND status IN "
+                                      "('queued', 'running') ORDER BY created_at DESC LIMIT 20"),
+                                 {"u": rnd.randrange(USERS)}).all()
+                else:          # claim_next
+                    conn.execute(text("SELECT id FROM jobs WHERE status = 'queued' "
+                                      "ORDER BY created_at, id LIMIT 1")).first()
+        except OperationalError:
+            with stats.lock:
+                stats.locked += 1
+            continue
+        stats.add("r", time.perf_counter() - t0)
+
+
+def writer(eng, ids, stats: Stats, stop: threading.Event, batched: bool, batch: int = BATCH):
+    rnd = random.Random()
+    while not stop.is_set():
+        n = batch if batched else 1
+        updates = [{"id": rnd.choice(ids), "p": rnd.random()} for _ in range(n)]
+        t0 = time.perf_counter()
+        try:
+            with eng.begin() as conn:
+                conn.execute(text("UPDATE jobs SET progress = :p, updated_at = CURRENT_TIMESTAMP "
+                                  "WHERE id = :id"), updates)
+                if rnd.random() < 0.05:  # yeni iş
+                    conn.execute(text("INSERT INTO jobs (id, user_id, status, image_path, created_at) "
+                                      "VALUES (:id, :u, 'queued', '/tmp/x.jpg', CURRENT_TIMESTAMP)"),
+                                 {"id": uuid.uuid4().hex[:12], "u": rnd.randrange(USERS)})
+        except OperationalError:
+            with stats.lock:
+                stats.locked += 1
+            continue
+        # gecikme olay başına
+        stats.add("w", (time.perf_counter() - t0) / n)
+        if batched:
+            # StatusBatcher: olaylar birikirken yazıcı kilidi tutulmaz
+            stop.wait(0.05)
+
+
+def _pct(xs, p):
+    if not xs:
+        return float("nan")
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] * 1000
+
+
+def run(variant: str, readers: int, writers: int, seconds: float, jobs: int):
+    path = Path(_TMP) / f"{variant}.db"
+    eng, ids = setup(path, variant, jobs)
+    stats, stop = Stats(), threading.Event()
+    threads = [threading.Thread(target=reader, args=(eng, ids, stats, stop)) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(eng, ids, stats, stop, variant == "batched"))
+                for _ in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    eng.dispose()
+    return {
+        "reads/s": len(stats.read_lat) / seconds,
+        "read_p50_ms": statistics.median(stats.read_lat) * 1000 if stats.read_lat else float("nan"),
+        "read_p99_ms": _pct(stats.read_lat, 0.99),
+        "write_events/s": len(stats.write_lat) * (BATCH if variant == "batched" else 1) / seconds,
+        "write_p99_ms": _pct(stats.write_lat, 0.99),
+        "locked_errors": stats.locked,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--readers", type=int, default=32)
+    ap.add_argument("--writers", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--jobs", type=int, default=50000)
+    ap.add_argument("--variants", default="baseline,tuned,batched")
+    args = ap.parse_args()
+    for variant in args.variants.split(","):
+        r = run(variant, args.readers, args.writers, args.seconds, args.jobs)
+        print(f"{variant:9s} " + "  ".join(
+            f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in r.items()))
+
+
+if __name__ == "__main__":
+    main()
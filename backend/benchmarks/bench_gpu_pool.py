@@ -0,0 +1,92 @@
+"""
+Çoklu cihaz yerleşim benchmark'ı (sahte cihazlar, CPU).
+
+GpuPool "fake:N" slotlarıyla kurulur; jobqueue.WorkerPool'daki gibi spawn
+edilen iş süreçleri işleri pool.run() ile yerleştirir. WAN yerine cihaz
+kilidi altında (resident worker gibi sıralı) cihaza göre değişen bir süre
+uyunur; --fail verilen cihaz ilk işinde
+WorkerDeviceError verir ve iş başka cihaza yönlenir. Tek cihaz ile N cihaz
+için toplam süre ve cihaz başına kullanım (GpuPool.stats) raporlanır.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_gpu_pool --devices 4 --procs 6 --jobs 8 --fail 2
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_TMP = tempfile.mkdtemp(prefix="vizoai-bench-gpu-")
+os.environ.setdefault("VIZOAI_DB_PATH", str(Path(_TMP) / "bench.db"))
+os.environ.setdefault("VIZOAI_OUTPUT_DIR", str(Path(_TMP) / "outputs"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.gpu_pool import GpuPool, parse_devices  # noqa: E402
+from app.services.wan_worker import WorkerDeviceError  # noqa: E402
+
+
+def _job(pool: GpuPool, locks, seconds: float, fail: int, failed, rerouted):
+    attempts = []
+
+    def attempt(slot, worker, alive):
+        attempts.append(slot.index)
+        if slot.index == fail:
+            with failed.get_lock():
+                if failed.value == 0:
+                    failed.value = 1
+                    raise WorkerDeviceError(f"simulated CUDA error on {slot.name}")
+        # resident worker gibi cihaz başına sıralı; yüksek indeksli cihaz biraz yavaş
+        with locks[slot.index]:
+            time.sleep(seconds * (1.0 + 0.1 * slot.index) * random.uniform(0.8, 1.2))
+
+    pool.run(attempt)
+    if len(attempts) > 1:
+        with rerouted.get_lock():
+            rerouted.value += 1
+
+
+def _proc(pool: GpuPool, locks, jobs: int, seconds: float, fail: int, failed, rerouted):
+    for _ in range(jobs):
+        _job(pool, locks, seconds, fail, failed, rerouted)
+
+
+def run(devices: int, procs: int, jobs: int, seconds: float, fail: int):
+    ctx = mp.get_context("spawn")
+    pool = GpuPool(parse_devices(f"fake:{devices}", 1), ctx=ctx, resident=False, cooldown=seconds * 4)
+    locks = [ctx.Lock() for _ in pool.slots]
+    failed, rerouted = ctx.Value("i", 0), ctx.Value("i", 0)
+    t0 = time.perf_counter()
+    ps = [ctx.Process(target=_proc, args=(pool, locks, jobs, seconds, fail, failed, rerouted))
+          for _ in range(procs)]
+    for p in ps:
+        p.start()
+    for p in ps:
+        p.join()
+    wall = time.perf_counter() - t0
+    return wall, rerouted.value, pool.stats()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--devices", type=int, default=4)
+    ap.add_argument("--procs", type=int, default=6, help="iş süreci sayısı (JOB_WORKERS)")
+    ap.add_argument("--jobs", type=int, default=8, help="süreç başına iş")
+    ap.add_argument("--seconds", type=float, default=0.2, help="sahte WAN süresi")
+    ap.add_argument("--fail", type=int, default=-1, help="ilk işinde hata veren cihaz indeksi")
+    args = ap.parse_args()
+
+    total = args.procs * args.jobs
+    for n in (1, args.devices):
+        wall, rerouted, stats = run(n, args.procs, args.jobs, args.seconds, args.fail if n > 1 else -1)
+        print(f"devices={n}  jobs={total}  wall={wall:.2f}s  jobs/s={total / wall:.1f}  rerouted={rerouted}")
+        for row in stats:
+            print("   " + json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+/outputs servis katmanı benchmark'ı: eski düz FileResponse handler'ı ile
+static_files.serve_file karşılaştırılır.
+
+Senaryo eşzamanlı video oynatmayı taklit eder: her "izleyici" dosyayı
+CHUNK boyutlu ardışık Range istekleriyle çeker (scrub/oynatma), ardından
+aynı videoyu yeniden oynatır (replay). Yeni handler replay'de ETag ile
+304 alır; eski handler her seferinde tüm dosyayı yeniden gönderir.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_outputs --clients 16 --size-mb 64
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from app.static_files import serve_file
+
+
+def build_app(root: Path) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/legacy/{path:path}")
+    def legacy(path: str):
+        fpath = root / path
+        if not fpath.exists():
+            raise HTTPException(404, "file not found")
+        return FileResponse(str(fpath))
+
+    @app.api_route("/outputs/{path:path}", methods=["GET", "HEAD"])
+    def outputs(path: str, request: Request):
+        return serve_file(request, root, path)
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _get(conn: http.client.HTTPConnection, url: str, headers: dict):
+    t0 = time.perf_counter()
+    conn.request("GET", url, headers=headers)
+    resp = conn.getresponse()
+    body = resp.read()
+    return resp, len(body), time.perf_counter() - t0
+
+
+def viewer(port: int, base: str, name: str, size: int, chunk: int, replays: int):
+    """Bir izleyici: Range ile oynatma + replay. (gecikmeler, aktarılan bayt)"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    latencies, transferred = [], 0
+    etag = None
+    url = f"/{base}/{name}"
+    try:
+        for _ in range(1 + replays):
+            if etag:
+                # tarayıcı önbelleği: önce yeniden doğrula
+                resp, n, dt = _get(conn, url, {"If-None-Match": etag})
+                latencies.append(dt)
+                transferred += n
+                if resp.status == 304:
+                    continue
+            start = 0
+            while start < size:
+                end = min(start + chunk, size) - 1
+                resp, n, dt = _get(conn, url, {"Range": f"bytes={start}-{end}"})
+                latencies.append(dt)
+                transferred += n
+                etag = etag or resp.getheader("etag")
+                if resp.status == 200:
+                    break  # Range desteklenmiyor: tüm dosya geldi
+                start = end + 1
+    finally:
+        conn.close()
+    return latencies, transferred
+
+
+def run(port: int, base: str, name: str, size: int, clients: int, chunk: int, replays: int):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as ex:
+        results = list(ex.map(lambda _: viewer(port, base, name, size, chunk, replays), range(clients)))
+    elapsed = time.perf_counter() - t0
+    lat = sorted(l for r in results for l in r[0])
+    total = sum(r[1] for r in results)
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+    return {
+        "requests": len(lat),
+        "MB_sent": total / 1e6,
+        "MB_per_s": total / 1e6 / elapsed,
+        "p50_ms": statistics.median(lat) * 1000,
+        "p99_ms": p99 * 1000,
+        "wall_s": elapsed,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--size-mb", type=int, default=64)
+    ap.add_argument("--chunk-kb", type=int, default=1024)
+    ap.add_argument("--replays", type=int, default=2)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        name = "video.mp4"
+        size = args.size_mb * 1024 * 1024
+        with open(root / name, "wb") as f:
+            f.write(os.urandom(size))
+
+        port = _free_port()
+        server = start_server(build_app(root), port)
+        try:
+            for base in ("legacy", "outputs"):
+                r = run(port, base, name, size, args.clients, args.chunk_kb * 1024, args.replays)
+                print(f"{base:8s} " + "  ".join(
+                    f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in r.items()))
+        finally:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
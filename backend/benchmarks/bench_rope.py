@@ -0,0 +1,130 @@
+"""
+3D RoPE benchmark'ı: wan.modules.model.rope_apply (önbellekli cos/sin
+tablosu, batch'li float32) ile eski örnek-başı float64 karmaşık döngü.
+
+Doğruluk: farklı grid'ler, dolgulu token'lar ve farklı grid'li batch için
+yeni çıktı eski float64 referansla karşılaştırılır (max mutlak hata,
+--tol aşılırsa süreç 1 ile çıkar). Hız: bir DiT adımındaki gibi aynı grid
+ile tekrar tekrar çağrı (q, k, CFG) -> referans, yeni (soğuk önbellek, ilk
+çağrı) ve yeni (sıcak önbellek) için çağrı başı süre.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_rope --grid 8x22x40 --heads 24 --head_dim 128
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+WAN_REPO = Path(__file__).resolve().parents[1] / "models" / "Wan2.2"
+sys.path.insert(0, str(WAN_REPO))
+
+
+def rope_apply_reference(x, grid_sizes, freqs):
+    """Eski uygulama (float64, örnek başına döngü)."""
+    import torch
+
+    n, c = x.size(2), x.size(3) // 2
+    freqs = freqs.split([c - 2 * (c // 3), c // 3, c // 3], dim=1)
+    output = []
+    for i, (f, h, w) in enumerate(grid_sizes.tolist()):
+        seq_len = f * h * w
+        x_i = torch.view_as_complex(x[i, :seq_len].to(torch.float64).reshape(seq_len, n, -1, 2))
+        freqs_i = torch.cat([
+            freqs[0][:f].view(f, 1, 1, -1).expand(f, h, w, -1),
+            freqs[1][:h].view(1, h, 1, -1).expand(f, h, w, -1),
+            freqs[2][:w].view(1, 1, w, -1).expand(f, h, w, -1)
+        ], dim=-1).reshape(seq_len, 1, -1)
+        x_i = torch.view_as_real(x_i * freqs_i).flatten(2)
+        x_i = torch.cat([x_i, x[i, seq_len:]])
+        output.append(x_i)
+    return torch.stack(output).float()
+
+
+def _freqs(head_dim, device):
+    import torch
+    from wan.modules.model import rope_params
+
+    d = head_dim
+    return torch.cat([
+        rope_params(1024, d - 4 * (d // 6)),
+        rope_params(1024, 2 * (d // 6)),
+        rope_params(1024, 2 * (d // 6))
+    ], dim=1).to(device)
+
+
+def check(args, device, freqs):
+    import torch
+    from wan.modules.model import rope_apply
+
+    g = torch.Generator(device="cpu").manual_seed(0)
+    cases = {
+        "single": ([(3, 6, 10)], 0),
+        "padded": ([(3, 6, 10)], 17),
+        "cfg_batch": ([(5, 4, 6), (5, 4, 6)], 0),
+        "mixed_grids": ([(5, 4, 6), (2, 8, 7)], 9),
+    }
+    worst = 0.0
+    for name, (grids, pad) in cases.items():
+        seq = max(f * h * w for f, h, w in grids) + pad
+        x = torch.randn(len(grids), seq, args.heads, args.head_dim, generator=g).to(device)
+        grid_sizes = torch.tensor(grids, dtype=torch.long)
+        ref = rope_apply_reference(x, grid_sizes, freqs)
+        out = rope_apply(x, grid_sizes, freqs)
+        err = (out - ref).abs().max().item()
+        worst = max(worst, err)
+        print(f"{name:12s} max|new - float64 ref| = {err:.2e}")
+    return worst
+
+
+def _time(fn, iters, sync):
+    sync()
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    sync()
+    return 1000 * (time.perf_counter() - t0) / iters
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--grid", default="8x22x40", help="FxHxW (patch sonrası)")
+    ap.add_argument("--batch", type=int, default=2, help="CFG batch-of-2 için 2")
+    ap.add_argument("--heads", type=int, default=24)
+    ap.add_argument("--head_dim", type=int, default=128)
+    ap.add_argument("--iters", type=int, default=10)
+    ap.add_argument("--tol", type=float, default=1e-4)
+    args = ap.parse_args()
+
+    import torch
+    from wan.modules import model as wan_model
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    sync = torch.cuda.synchronize if device.type == "cuda" else (lambda: None)
+    freqs = _freqs(args.head_dim, device)
+
+    worst = check(args, device, freqs)
+
+    f, h, w = (int(v) for v in args.grid.split("x"))
+    grid_sizes = torch.tensor([[f, h, w]] * args.batch, dtype=torch.long)
+    x = torch.randn(args.batch, f * h * w, args.heads, args.head_dim, device=device)
+    if device.type == "cuda":
+        x = x.bfloat16()
+
+    with torch.no_grad():
+        ref_ms = _time(lambda: rope_apply_reference(x, grid_sizes, freqs), args.iters, sync)
+        wan_model._ROPE_CACHE.clear()
+        cold_ms = _time(lambda: wan_model.rope_apply(x, grid_sizes, freqs), 1, sync)
+        warm_ms = _time(lambda: wan_model.rope_apply(x, grid_sizes, freqs), args.iters, sync)
+    print(f"\ngrid={args.grid} batch={args.batch} heads={args.heads} head_dim={args.head_dim} "
+          f"device={device.type}")
+    print(f"reference (float64 loop)  {ref_ms:8.2f} ms/call")
+    print(f"cached float32 (cold)     {cold_ms:8.2f} ms/call")
+    print(f"cached float32 (warm)     {warm_ms:8.2f} ms/call   speedup x{ref_ms / warm_ms:.1f}")
+    if worst > args.tol:
+        print(f"\naccuracy check FAILED (tol={args.tol:g})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
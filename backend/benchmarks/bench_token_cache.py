@@ -0,0 +1,95 @@
+"""
+get_current_user mikro-benchmark'ı: token cache kapalı (her çağrıda JWT
+imza doğrulama + users sorgusu) ve açık.
+
+Trafik az sayıda aktif oturumun sık tekrar eden isteklerini taklit eder
+(polling / sayfa yenileme); her thread token'ları rastgele seçer. Ara sıra
+invalidate_user çağrılarak kredi değişimi simüle edilir.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_token_cache --threads 8 --tokens 200 --calls 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+_TMP = tempfile.mkdtemp(prefix="vizoai-bench-token-")
+os.environ.setdefault("VIZOAI_DB_PATH", str(Path(_TMP) / "bench.db"))
+os.environ.setdefault("VIZOAI_OUTPUT_DIR", str(Path(_TMP) / "outputs"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import auth  # noqa: E402
+from app.db import SessionLocal, User, ensure_schema  # noqa: E402
+
+
+def seed(n: int):
+    ensure_schema()
+    with SessionLocal() as db:
+        users = [User(name=f"u{i}", email=f"u{i}@bench.local", password_hash="x") for i in range(n)]
+        db.add_all(users)
+        db.commit()
+        ids = [u.id for u in users]
+    return [(uid, auth.create_access_token({"sub": str(uid)})) for uid in ids]
+
+
+def worker(tokens, calls: int, invalidate_every: int, out: list):
+    rnd = random.Random()
+    lat = []
+    for i in range(calls):
+        uid, token = rnd.choice(tokens)
+        t0 = time.perf_counter()
+        auth.get_current_user(token)
+        lat.append(time.perf_counter() - t0)
+        if invalidate_every and i % invalidate_every == 0:
+            auth.invalidate_user(uid)
+    out.extend(lat)
+
+
+def run(tokens, threads: int, calls: int, ttl: float, invalidate_every: int):
+    cache = auth.token_cache()
+    cache.ttl = ttl
+    cache.clear()
+    cache.hits = cache.misses = cache.expired = cache.evictions = cache.invalidations = 0
+    lat: list = []
+    t0 = time.perf_counter()
+    ts = [threading.Thread(target=worker, args=(tokens, calls, invalidate_every, lat)) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat.sort()
+    st = cache.stats()
+    return {
+        "calls/s": len(lat) / wall,
+        "p50_us": statistics.median(lat) * 1e6,
+        "p99_us": lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1e6,
+        "hit_rate": st["hit_rate"] or 0.0,
+        "invalidations": st["invalidations"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--tokens", type=int, default=200)
+    ap.add_argument("--calls", type=int, default=20000, help="thread başına")
+    ap.add_argument("--ttl", type=float, default=30.0)
+    ap.add_argument("--invalidate-every", type=int, default=500)
+    args = ap.parse_args()
+
+    tokens = seed(args.tokens)
+    for name, ttl in (("uncached", 0.0), ("cached", args.ttl)):
+        r = run(tokens, args.threads, args.calls, ttl, args.invalidate_every)
+        print(f"{name:9s} " + "  ".join(
+            f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in r.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Wan2.2 VAE encode/decode benchmark'ı: önceden ayrılmış çıktı (yeni
+WanVAE_.encode / decode) ile eski parça başına torch.cat birleştirmesi.
+
+Checkpoint gerekmez: küçük, rastgele ağırlıklı bir WanVAE_ kurulur
+(--dim/--z_dim, video --frames x --size). Her (mod, aşama) ayrı süreçte
+koşar; süre (ms, ilk --warmup hariç ortalama) ve tepe bellek (CUDA'da
+max_memory_allocated, CPU'da ru_maxrss) raporlanır. İki modun çıktıları
+karşılaştırılır.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_vae --frames 33 --size 256x256 --dim 32
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+WAN_REPO = Path(__file__).resolve().parents[1] / "models" / "Wan2.2"
+sys.path.insert(0, str(WAN_REPO))
+
+
+def _legacy_clear_cache(model):
+    # eski clear_cache: her çağrıda modül ağacını yeniden sayar
+    from wan.modules.vae2_2 import count_conv3d
+
+    model._conv_num = count_conv3d(model.decoder)
+    model._conv_idx = [0]
+    model._feat_map = [None] * model._conv_num
+    model._enc_conv_num = count_conv3d(model.encoder)
+    model._enc_conv_idx = [0]
+    model._enc_feat_map = [None] * model._enc_conv_num
+
+
+def encode_concat(model, x, scale):
+    """Eski encode: her zamansal parçada torch.cat([out, out_], 2)."""
+    import torch
+    from wan.modules.vae2_2 import patchify
+
+    _legacy_clear_cache(model)
+    x = patchify(x, patch_size=2)
+    t = x.shape[2]
+    iter_ = 1 + (t - 1) // 4
+    for i in range(iter_):
+        model._enc_conv_idx = [0]
+        if i == 0:
+            out = model.encoder(x[:, :, :1], feat_cache=model._enc_feat_map,
+                                feat_idx=model._enc_conv_idx)
+        else:
+            out_ = model.encoder(x[:, :, 1 + 4 * (i - 1):1 + 4 * i], feat_cache=model._enc_feat_map,
+                                 feat_idx=model._enc_conv_idx)
+            out = torch.cat([out, out_], 2)
+    mu, _ = model.conv1(out).chunk(2, dim=1)
+    mu = (mu - scale[0]) * scale[1]
+    _legacy_clear_cache(model)
+    return mu
+
+
+def decode_concat(model, z, scale):
+    """Eski decode: her latent karede torch.cat, sonda float() kopyası."""
+    import torch
+    from wan.modules.vae2_2 import unpatchify
+
+    _legacy_clear_cache(model)
+    z = z / scale[1] + scale[0]
+    x = model.conv2(z)
+    for i in range(z.shape[2]):
+        model._conv_idx = [0]
+        out_ = model.decoder(x[:, :, i:i + 1], feat_cache=model._feat_map,
+                             feat_idx=model._conv_idx, first_chunk=(i == 0))
+        out = out_ if i == 0 else torch.cat([out, out_], 2)
+    out = unpatchify(out, patch_size=2)
+    _legacy_clear_cache(model)
+    return out.float()
+
+
+def child(args, mode: str, phase: str):
+    import torch
+    from wan.modules.vae2_2 import WanVAE_
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    torch.manual_seed(0)
+    model = WanVAE_(dim=args.dim, dec_dim=args.dim, z_dim=args.z_dim,
+                    temperal_downsample=[False, True, True]).eval().requires_grad_(False).to(device)
+    w, h = (int(v) for v in args.size.split("x"))
+    g = torch.Generator(device="cpu").manual_seed(1)
+    scale = [0.0, 1.0]
+    if phase == "encode":
+        inp = torch.randn(1, 3, args.frames, h, w, generator=g).to(device)
+        fn = (lambda: encode_concat(model, inp, scale)) if mode == "concat" else \
+            (lambda: model.encode(inp, scale))
+    else:
+        lat = 1 + (args.frames - 1) // 4
+        inp = torch.randn(1, args.z_dim, lat, h // 16, w // 16, generator=g).to(device)
+        fn = (lambda: decode_concat(model, inp, scale)) if mode == "concat" else \
+            (lambda: model.decode(inp, scale, dtype=torch.float32))
+
+    sync = torch.cuda.synchronize if device.type == "cuda" else (lambda: None)
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+    times, out = [], None
+    with torch.no_grad():
+        for i in range(args.warmup + args.iters):
+            out = None
+            sync()
+            t0 = time.perf_counter()
+            out = fn()
+            sync()
+            if i >= args.warmup:
+                times.append(time.perf_counter() - t0)
+    if device.type == "cuda":
+        peak_mb = torch.cuda.max_memory_allocated(device) / 2**20
+    else:
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    torch.save(out.float().cpu(), args.out)
+    print(json.dumps({"device": device.type, "ms": 1000 * sum(times) / len(times),
+                      "peak_mb": peak_mb, "shape": list(out.shape)}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dim", type=int, default=32)
+    ap.add_argument("--z_dim", type=int, default=16)
+    ap.add_argument("--frames", type=int, default=33, help="piksel kare sayısı (4k+1)")
+    ap.add_argument("--size", default="256x256", help="WxH (16'nın katı)")
+    ap.add_argument("--iters", type=int, default=3)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--phase", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--out", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args, args.child, args.phase)
+        return
+
+    import tempfile
+    import torch
+    with tempfile.TemporaryDirectory() as tmp:
+        for phase in ("encode", "decode"):
+            outs = {}
+            for mode in ("concat", "prealloc"):
+                out = str(Path(tmp) / f"{phase}-{mode}.pt")
+                cmd = [sys.executable, "-m", "benchmarks.bench_vae", "--child", mode, "--phase", phase,
+                       "--out", out]
+                for k in ("dim", "z_dim", "frames", "size", "iters", "warmup"):
+                    cmd += [f"--{k}", str(getattr(args, k))]
+                res = subprocess.run(cmd, capture_output=True, text=True,
+                                     cwd=str(Path(__file__).resolve().parents[1]))
+                if res.returncode != 0:
+                    print(f"{phase} {mode:8s} failed:\n{res.stderr}")
+                    continue
+                r = json.loads(res.stdout.strip().splitlines()[-1])
+                print(f"{phase} {mode:8s} device={r['device']}  ms={r['ms']:.1f}  "
+                      f"peak_mb={r['peak_mb']:.0f}  out={r['shape']}")
+                outs[mode] = torch.load(out)
+            if len(outs) == 2:
+                diff = (outs["concat"] - outs["prealloc"]).abs().max().item()
+                print(f"{phase} max |concat - prealloc| = {diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+WAN video yazma benchmark'ı: save_video (tüm klip make_grid + uint8 + imageio)
+ile FFmpegVideoSink (decode parçaları ffmpeg stdin'ine akar).
+
+Decoder yerine sentetik parçalar üretilir (ti2v-5B'deki gibi ilk parça 1,
+sonrakiler 4 kare). Her mod ayrı süreçte koşar; duvar süresi ve tepe RSS
+(ru_maxrss) raporlanır. CUDA varsa parçalar GPU'da üretilir ve uint8
+dönüşümü cihazda yapılır.
+
+Kullanım (backend/ içinden):
+    python -m benchmarks.bench_video_sink --frames 121 --size 1280x704
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+WAN_REPO = Path(__file__).resolve().parents[1] / "models" / "Wan2.2"
+sys.path.insert(0, str(WAN_REPO))
+
+
+def _chunks(frames: int, w: int, h: int, device: str):
+    import torch
+    # sabit tohum: iki mod aynı içeriği kodlar
+    g = torch.Generator(device=device).manual_seed(0)
+    sizes = [1] + [4] * ((frames - 1) // 4)
+    for t in sizes:
+        yield torch.rand(3, t, h, w, generator=g, device=device).mul_(2).sub_(1)
+
+
+def child(mode: str, frames: int, w: int, h: int, out: str):
+    import torch
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    t0 = time.perf_counter()
+    if mode == "save_video":
+        from wan.utils.utils import save_video
+        # eski yol: decode tüm klibi birleştirir, sonra yazar
+        video = torch.cat(list(_chunks(frames, w, h, device)), 1)
+        save_video(video[None], save_file=out, fps=24, nrow=1, normalize=True, value_range=(-1, 1))
+    else:
+        from wan.utils.video_sink import FFmpegVideoSink
+        with FFmpegVideoSink(out, fps=24) as sink:
+            for chunk in _chunks(frames, w, h, device):
+                sink.write(chunk)
+    wall = time.perf_counter() - t0
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"wall_s": wall, "peak_rss_mb": rss_mb,
+                      "out_mb": os.path.getsize(out) / 1e6 if os.path.exists(out) else 0.0}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=121)
+    ap.add_argument("--size", default="1280x704")
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--out", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    w, h = (int(v) for v in args.size.split("x"))
+
+    if args.child:
+        child(args.child, args.frames, w, h, args.out)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("save_video", "sink"):
+            out = str(Path(tmp) / f"{mode}.mp4")
+            res = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_video_sink", "--child", mode,
+                 "--frames", str(args.frames), "--size", args.size, "--out", out],
+                capture_output=True, text=True, cwd=str(Path(__file__).resolve().parents[1]))
+            if res.returncode != 0:
+                print(f"{mode:10s} failed:\n{res.stderr}")
+                continue
+            r = json.loads(res.stdout.strip().splitlines()[-1])
+            print(f"{mode:10s} " + "  ".join(f"{k}={v:.1f}" for k, v in r.items()))
+
+
+if __name__ == "__main__":
+    main()
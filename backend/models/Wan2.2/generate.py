@@ -17,8 +17,11 @@ from PIL import Image
 import wan
 from wan.configs import MAX_AREA_CONFIGS, SIZE_CONFIGS, SUPPORTED_SIZES, WAN_CONFIGS
 from wan.distributed.util import init_distributed_group
+from wan.modules.attention import set_attention_backend
+from wan.utils.events import EventWriter, get_writer, set_writer
 from wan.utils.prompt_extend import DashScopePromptExpander, QwenPromptExpander
-from wan.utils.utils import merge_video_audio, save_video, str2bool
+from wan.utils.utils import merge_video_audio, save_video, str2bool, write_manifest
+from wan.utils.video_sink import FFmpegVideoSink, ffmpeg_available
 
 
 EXAMPLE_PROMPT = {
@@ -151,6 +154,12 @@ def _parse_args():
         action="store_true",
         default=False,
         help="Whether to place T5 model on CPU.")
+    parser.add_argument(
+        "--t5_cache_dir",
+        type=str,
+        default=None,
+        help="[ti2v] Persist T5 text embeddings (prompt and negative prompt) as safetensors in this directory and reuse them across runs."
+    )
     parser.add_argument(
         "--dit_fsdp",
         action="store_true",
@@ -216,6 +225,11 @@ def _parse_args():
         type=float,
         default=None,
         help="Classifier free guidance scale.")
+    parser.add_argument(
+        "--sample_neg_prompt",
+        type=str,
+        default="",
+        help="Negative prompt. If empty, use `config.sample_neg_prompt`.")
     parser.add_argument(
         "--convert_model_dtype",
         action="store_true",
@@ -294,6 +308,38 @@ def _parse_args():
         default=80,
         help="Number of frames per clip, 48 or 80 or others (must be multiple of 4) for 14B s2v"
     )
+    parser.add_argument(
+        "--events_fd",
+        type=int,
+        default=None,
+        help="Inherited file descriptor to write JSON-lines progress/timing events to (rank 0 only)."
+    )
+    parser.add_argument(
+        "--manifest_file",
+        type=str,
+        default=None,
+        help="Write a JSON result manifest (save_file, frames, fps, duration, size, timings) here after saving (rank 0 only)."
+    )
+    parser.add_argument(
+        "--stream_video",
+        type=str2bool,
+        default=False,
+        help="[ti2v] Stream VAE-decoded chunks straight into an ffmpeg encoder (writes --save_file, muxes --audio if given) instead of buffering the whole clip for save_video."
+    )
+    parser.add_argument(
+        "--batch_cfg",
+        type=str,
+        default="auto",
+        choices=["auto", "true", "false"],
+        help="[ti2v] Run the conditional and unconditional guidance branches as one batch-of-2 forward. 'auto' does so when free GPU memory allows."
+    )
+    parser.add_argument(
+        "--attn_backend",
+        type=str,
+        default=None,
+        choices=["auto", "fa3", "fa2", "sdpa", "chunked"],
+        help="Attention kernel for all models. Defaults to $WAN_ATTN_BACKEND or 'auto' (fa3 > fa2 > sdpa on CUDA)."
+    )
     args = parser.parse_args()
     _validate_args(args)
 
@@ -312,12 +358,27 @@ def _init_logging(rank):
         logging.basicConfig(level=logging.ERROR)
 
 
+def _default_save_file(args):
+    formatted_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    formatted_prompt = args.prompt.replace(" ", "_").replace("/",
+                                                             "_")[:50]
+    suffix = '.mp4'
+    return f"{args.task}_{args.size.replace('*','x') if sys.platform=='win32' else args.size}_{args.ulysses_size}_{formatted_prompt}_{formatted_time}" + suffix
+
+
 def generate(args):
     rank = int(os.getenv("RANK", 0))
     world_size = int(os.getenv("WORLD_SIZE", 1))
     local_rank = int(os.getenv("LOCAL_RANK", 0))
     device = local_rank
     _init_logging(rank)
+    if rank == 0 and args.events_fd is not None:
+        set_writer(EventWriter(fd=args.events_fd))
+    events = get_writer()
+    sink = None
+
+    if args.attn_backend is not None:
+        set_attention_backend(args.attn_backend)
 
     if args.offload_model is None:
         args.offload_model = False if world_size > 1 else True
@@ -402,17 +463,18 @@ def generate(args):
 
     if "t2v" in args.task:
         logging.info("Creating WanT2V pipeline.")
-        wan_t2v = wan.WanT2V(
-            config=cfg,
-            checkpoint_dir=args.ckpt_dir,
-            device_id=device,
-            rank=rank,
-            t5_fsdp=args.t5_fsdp,
-            dit_fsdp=args.dit_fsdp,
-            use_sp=(args.ulysses_size > 1),
-            t5_cpu=args.t5_cpu,
-            convert_model_dtype=args.convert_model_dtype,
-        )
+        with events.timer('model_load'):
+            wan_t2v = wan.WanT2V(
+                config=cfg,
+                checkpoint_dir=args.ckpt_dir,
+                device_id=device,
+                rank=rank,
+                t5_fsdp=args.t5_fsdp,
+                dit_fsdp=args.dit_fsdp,
+                use_sp=(args.ulysses_size > 1),
+                t5_cpu=args.t5_cpu,
+                convert_model_dtype=args.convert_model_dtype,
+            )
 
         logging.info(f"Generating video ...")
         video = wan_t2v.generate(
@@ -423,49 +485,75 @@ def generate(args):
             sample_solver=args.sample_solver,
             sampling_steps=args.sample_steps,
             guide_scale=args.sample_guide_scale,
+            n_prompt=args.sample_neg_prompt,
             seed=args.base_seed,
             offload_model=args.offload_model)
     elif "ti2v" in args.task:
         logging.info("Creating WanTI2V pipeline.")
-        wan_ti2v = wan.WanTI2V(
-            config=cfg,
-            checkpoint_dir=args.ckpt_dir,
-            device_id=device,
-            rank=rank,
-            t5_fsdp=args.t5_fsdp,
-            dit_fsdp=args.dit_fsdp,
-            use_sp=(args.ulysses_size > 1),
-            t5_cpu=args.t5_cpu,
-            convert_model_dtype=args.convert_model_dtype,
-        )
+        with events.timer('model_load'):
+            wan_ti2v = wan.WanTI2V(
+                config=cfg,
+                checkpoint_dir=args.ckpt_dir,
+                device_id=device,
+                rank=rank,
+                t5_fsdp=args.t5_fsdp,
+                dit_fsdp=args.dit_fsdp,
+                use_sp=(args.ulysses_size > 1),
+                t5_cpu=args.t5_cpu,
+                convert_model_dtype=args.convert_model_dtype,
+                t5_cache_dir=args.t5_cache_dir,
+            )
+
+        if args.stream_video and rank == 0:
+            if ffmpeg_available():
+                args.save_file = args.save_file or _default_save_file(args)
+                sink = FFmpegVideoSink(
+                    args.save_file, fps=cfg.sample_fps, audio=args.audio)
+                logging.info(f"Streaming generated video to {args.save_file}")
+            else:
+                logging.warning("ffmpeg not found; falling back to save_video.")
 
         logging.info(f"Generating video ...")
-        video = wan_ti2v.generate(
-            args.prompt,
-            img=img,
-            size=SIZE_CONFIGS[args.size],
-            max_area=MAX_AREA_CONFIGS[args.size],
-            frame_num=args.frame_num,
-            shift=args.sample_shift,
-            sample_solver=args.sample_solver,
-            sampling_steps=args.sample_steps,
-            guide_scale=args.sample_guide_scale,
-            seed=args.base_seed,
-            offload_model=args.offload_model)
+        try:
+            video = wan_ti2v.generate(
+                args.prompt,
+                img=img,
+                size=SIZE_CONFIGS[args.size],
+                max_area=MAX_AREA_CONFIGS[args.size],
+                frame_num=args.frame_num,
+                shift=args.sample_shift,
+                sample_solver=args.sample_solver,
+                sampling_steps=args.sample_steps,
+                guide_scale=args.sample_guide_scale,
+                n_prompt=args.sample_neg_prompt,
+                seed=args.base_seed,
+                offload_model=args.offload_model,
+                video_sink=sink,
+                batch_cfg=args.batch_cfg if args.batch_cfg == "auto" else
+                str2bool(args.batch_cfg))
+        except BaseException:
+            if sink is not None:
+                sink.abort()
+            raise
+        if sink is not None:
+            # encoding overlapped the decode; this is only the tail flush
+            with events.timer('video_write'):
+                sink.close()
     elif "animate" in args.task:
         logging.info("Creating Wan-Animate pipeline.")
-        wan_animate = wan.WanAnimate(
-            config=cfg,
-            checkpoint_dir=args.ckpt_dir,
-            device_id=device,
-            rank=rank,
-            t5_fsdp=args.t5_fsdp,
-            dit_fsdp=args.dit_fsdp,
-            use_sp=(args.ulysses_size > 1),
-            t5_cpu=args.t5_cpu,
-            convert_model_dtype=args.convert_model_dtype,
-            use_relighting_lora=args.use_relighting_lora
-        )
+        with events.timer('model_load'):
+            wan_animate = wan.WanAnimate(
+                config=cfg,
+                checkpoint_dir=args.ckpt_dir,
+                device_id=device,
+                rank=rank,
+                t5_fsdp=args.t5_fsdp,
+                dit_fsdp=args.dit_fsdp,
+                use_sp=(args.ulysses_size > 1),
+                t5_cpu=args.t5_cpu,
+                convert_model_dtype=args.convert_model_dtype,
+                use_relighting_lora=args.use_relighting_lora
+            )
 
         logging.info(f"Generating video ...")
         video = wan_animate.generate(
@@ -477,21 +565,23 @@ def generate(args):
             sample_solver=args.sample_solver,
             sampling_steps=args.sample_steps,
             guide_scale=args.sample_guide_scale,
+            n_prompt=args.sample_neg_prompt,
             seed=args.base_seed,
             offload_model=args.offload_model)
     elif "s2v" in args.task:
         logging.info("Creating WanS2V pipeline.")
-        wan_s2v = wan.WanS2V(
-            config=cfg,
-            checkpoint_dir=args.ckpt_dir,
-            device_id=device,
-            rank=rank,
-            t5_fsdp=args.t5_fsdp,
-            dit_fsdp=args.dit_fsdp,
-            use_sp=(args.ulysses_size > 1),
-            t5_cpu=args.t5_cpu,
-            convert_model_dtype=args.convert_model_dtype,
-        )
+        with events.timer('model_load'):
+            wan_s2v = wan.WanS2V(
+                config=cfg,
+                checkpoint_dir=args.ckpt_dir,
+                device_id=device,
+                rank=rank,
+                t5_fsdp=args.t5_fsdp,
+                dit_fsdp=args.dit_fsdp,
+                use_sp=(args.ulysses_size > 1),
+                t5_cpu=args.t5_cpu,
+                convert_model_dtype=args.convert_model_dtype,
+            )
         logging.info(f"Generating video ...")
         video = wan_s2v.generate(
             input_prompt=args.prompt,
@@ -515,17 +605,18 @@ def generate(args):
         )
     else:
         logging.info("Creating WanI2V pipeline.")
-        wan_i2v = wan.WanI2V(
-            config=cfg,
-            checkpoint_dir=args.ckpt_dir,
-            device_id=device,
-            rank=rank,
-            t5_fsdp=args.t5_fsdp,
-            dit_fsdp=args.dit_fsdp,
-            use_sp=(args.ulysses_size > 1),
-            t5_cpu=args.t5_cpu,
-            convert_model_dtype=args.convert_model_dtype,
-        )
+        with events.timer('model_load'):
+            wan_i2v = wan.WanI2V(
+                config=cfg,
+                checkpoint_dir=args.ckpt_dir,
+                device_id=device,
+                rank=rank,
+                t5_fsdp=args.t5_fsdp,
+                dit_fsdp=args.dit_fsdp,
+                use_sp=(args.ulysses_size > 1),
+                t5_cpu=args.t5_cpu,
+                convert_model_dtype=args.convert_model_dtype,
+            )
         logging.info("Generating video ...")
         video = wan_i2v.generate(
             args.prompt,
@@ -536,30 +627,42 @@ def generate(args):
             sample_solver=args.sample_solver,
             sampling_steps=args.sample_steps,
             guide_scale=args.sample_guide_scale,
+            n_prompt=args.sample_neg_prompt,
             seed=args.base_seed,
             offload_model=args.offload_model)
 
     if rank == 0:
         if args.save_file is None:
-            formatted_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-            formatted_prompt = args.prompt.replace(" ", "_").replace("/",
-                                                                     "_")[:50]
-            suffix = '.mp4'
-            args.save_file = f"{args.task}_{args.size.replace('*','x') if sys.platform=='win32' else args.size}_{args.ulysses_size}_{formatted_prompt}_{formatted_time}" + suffix
-
-        logging.info(f"Saving generated video to {args.save_file}")
-        save_video(
-            tensor=video[None],
-            save_file=args.save_file,
-            fps=cfg.sample_fps,
-            nrow=1,
-            normalize=True,
-            value_range=(-1, 1))
+            args.save_file = _default_save_file(args)
+
+        if video is not None:
+            logging.info(f"Saving generated video to {args.save_file}")
+            with events.timer('video_write'):
+                save_video(
+                    tensor=video[None],
+                    save_file=args.save_file,
+                    fps=cfg.sample_fps,
+                    nrow=1,
+                    normalize=True,
+                    value_range=(-1, 1))
         if "s2v" in args.task:
             if args.enable_tts is False:
                 merge_video_audio(video_path=args.save_file, audio_path=args.audio)
             else:
                 merge_video_audio(video_path=args.save_file, audio_path="tts.wav")
+        if args.manifest_file:
+            if sink is not None:
+                frames, size = sink.frames, sink.size
+            else:
+                frames, size = video.shape[1], (video.shape[3], video.shape[2])
+            write_manifest(
+                args.manifest_file,
+                args.save_file,
+                frames=frames,
+                fps=cfg.sample_fps,
+                size=size,
+                timings=events.timings,
+                task=args.task)
     del video
 
     torch.cuda.synchronize()
@@ -568,6 +671,8 @@ def generate(args):
         dist.destroy_process_group()
 
     logging.info("Finished.")
+    events.emit('finished', save_file=args.save_file if rank == 0 else None)
+    events.close()
 
 
 if __name__ == "__main__":
@@ -2,24 +2,11 @@
 import torch
 import torch.cuda.amp as amp
 
-from ..modules.model import sinusoidal_embedding_1d
+from ..modules.model import rope_cos_sin, rope_rotate, sinusoidal_embedding_1d
 from .ulysses import distributed_attention
 from .util import gather_forward, get_rank, get_world_size
 
 
-def pad_freqs(original_tensor, target_len):
-    seq_len, s1, s2 = original_tensor.shape
-    pad_size = target_len - seq_len
-    padding_tensor = torch.ones(
-        pad_size,
-        s1,
-        s2,
-        dtype=original_tensor.dtype,
-        device=original_tensor.device)
-    padded_tensor = torch.cat([original_tensor, padding_tensor], dim=0)
-    return padded_tensor
-
-
 @torch.amp.autocast('cuda', enabled=False)
 def rope_apply(x, grid_sizes, freqs):
     """
@@ -27,38 +14,21 @@ def rope_apply(x, grid_sizes, freqs):
     grid_sizes: [B, 3].
     freqs:      [M, C // 2].
     """
-    s, n, c = x.size(1), x.size(2), x.size(3) // 2
-    # split freqs
-    freqs = freqs.split([c - 2 * (c // 3), c // 3, c // 3], dim=1)
-
-    # loop over samples
-    output = []
-    for i, (f, h, w) in enumerate(grid_sizes.tolist()):
-        seq_len = f * h * w
-
-        # precompute multipliers
-        x_i = torch.view_as_complex(x[i, :s].to(torch.float64).reshape(
-            s, n, -1, 2))
-        freqs_i = torch.cat([
-            freqs[0][:f].view(f, 1, 1, -1).expand(f, h, w, -1),
-            freqs[1][:h].view(1, h, 1, -1).expand(f, h, w, -1),
-            freqs[2][:w].view(1, 1, w, -1).expand(f, h, w, -1)
-        ],
-                            dim=-1).reshape(seq_len, 1, -1)
-
-        # apply rotary embedding
-        sp_size = get_world_size()
-        sp_rank = get_rank()
-        freqs_i = pad_freqs(freqs_i, s * sp_size)
-        s_per_rank = s
-        freqs_i_rank = freqs_i[(sp_rank * s_per_rank):((sp_rank + 1) *
-                                                       s_per_rank), :, :]
-        x_i = torch.view_as_real(x_i * freqs_i_rank).flatten(2)
-        x_i = torch.cat([x_i, x[i, s:]])
-
-        # append to collection
-        output.append(x_i)
-    return torch.stack(output).float()
+    s = x.size(1)
+    sp_size = get_world_size()
+    sp_rank = get_rank()
+
+    # tables cover the full padded sequence; this rank rotates its shard
+    grids = [tuple(g) for g in grid_sizes.tolist()]
+    if len(set(grids)) == 1:
+        cos, sin = rope_cos_sin(freqs, *grids[0], length=s * sp_size)
+    else:
+        tables = [rope_cos_sin(freqs, *g, length=s * sp_size) for g in grids]
+        cos = torch.stack([t[0] for t in tables])
+        sin = torch.stack([t[1] for t in tables])
+    cos = cos[..., sp_rank * s:(sp_rank + 1) * s, :, :]
+    sin = sin[..., sp_rank * s:(sp_rank + 1) * s, :, :]
+    return rope_rotate(x, cos, sin)
 
 
 def sp_dit_forward(
@@ -6,13 +6,9 @@ from einops import rearrange
 import torch.nn.functional as F
 import math
 from ...distributed.util import gather_forward, get_rank, get_world_size
+from ..attention import flash_attention
 
 
-try:
-    from flash_attn import flash_attn_qkvpacked_func, flash_attn_func
-except ImportError:
-    flash_attn_func = None
-
 MEMORY_LAYOUT = {
     "flash": (
         lambda x: x.view(x.shape[0] * x.shape[1], *x.shape[2:]),
@@ -70,11 +66,8 @@ def attention(
         x = F.scaled_dot_product_attention(q, k, v, attn_mask=attn_mask, dropout_p=drop_rate, is_causal=causal)
 
     elif mode == "flash":
-        x = flash_attn_func(
-            q,
-            k,
-            v,
-        )
+        # routed through the attention backend registry (fa3/fa2/sdpa/chunked)
+        x = flash_attention(q, k, v, dropout_p=drop_rate, causal=causal)
         x = x.view(batch_size, max_seqlen_q, x.shape[-2], x.shape[-1])  # reshape x to [b, s, a, d]
     elif mode == "vanilla":
         scale_factor = 1 / math.sqrt(q.size(-1))
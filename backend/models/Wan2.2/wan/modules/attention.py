@@ -1,5 +1,10 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import logging
+import math
+import os
+
 import torch
+import torch.nn.functional as F
 
 try:
     import flash_attn_interface
@@ -18,8 +23,82 @@ import warnings
 __all__ = [
     'flash_attention',
     'attention',
+    'attention_backends',
+    'get_attention_backend',
+    'register_attention_backend',
+    'set_attention_backend',
 ]
 
+# name -> (fn, available(device) -> bool)
+_BACKENDS = {}
+_selected = os.environ.get('WAN_ATTN_BACKEND', 'auto').strip().lower()
+# query rows per block of the chunked backend
+CHUNK_SIZE = int(os.environ.get('WAN_ATTN_CHUNK', '1024'))
+
+_half_dtypes = (torch.float16, torch.bfloat16)
+
+
+def register_attention_backend(name, available=None):
+    r"""
+    Registers an attention kernel under `name`.
+
+    The kernel is called as `fn(q, k, v, q_lens, k_lens, dropout_p,
+    softmax_scale, causal, window_size, deterministic, dtype)` with q/k/v in
+    [B, L, N, C] layout and int32 lengths (never None), and returns
+    [B, Lq, Nq, C2]. `available(device)` tells whether it can run there.
+    """
+
+    def decorator(fn):
+        _BACKENDS[name] = (fn, available or (lambda device: True))
+        return fn
+
+    return decorator
+
+
+def attention_backends(device=None):
+    r"""Registered backend names mapped to whether they run on `device`."""
+    device = torch.device(device or 'cpu')
+    return {name: avail(device) for name, (_, avail) in _BACKENDS.items()}
+
+
+def set_attention_backend(name):
+    r"""
+    Selects the backend for all attention calls in this process: a
+    registered name or 'auto' (fa3 > fa2 > sdpa on CUDA, sdpa elsewhere).
+    Also read from the WAN_ATTN_BACKEND environment variable at import.
+    """
+    global _selected
+    name = (name or 'auto').strip().lower()
+    if name != 'auto' and name not in _BACKENDS:
+        raise ValueError(f'Unknown attention backend: {name} '
+                         f'(choose from auto, {", ".join(_BACKENDS)})')
+    _selected = name
+
+
+def get_attention_backend(device, version=None):
+    r"""
+    Resolves the backend name for `device`. `version` (2 or 3) keeps the old
+    `flash_attention(version=...)` preference when the selection is 'auto'.
+    """
+    device = torch.device(device)
+    if _selected != 'auto':
+        _, avail = _BACKENDS[_selected]
+        if avail(device):
+            return _selected
+        warnings.warn(f'Attention backend {_selected} is not available on '
+                      f'{device.type}, falling back to auto.')
+    order = ('fa3', 'fa2', 'sdpa')
+    if version == 2:
+        order = ('fa2', 'fa3', 'sdpa')
+    elif version == 3 and not FLASH_ATTN_3_AVAILABLE:
+        warnings.warn(
+            'Flash attention 3 is not available, use flash attention 2 instead.'
+        )
+    for name in order:
+        if _BACKENDS[name][1](device):
+            return name
+    return 'chunked'
+
 
 def flash_attention(
     q,
@@ -48,83 +127,27 @@ def flash_attention(
     window_size:    (left right). If not (-1, -1), apply sliding window local attention.
     deterministic:  bool. If True, slightly slower and uses more memory.
     dtype:          torch.dtype. Apply when dtype of q/k/v is not float16/bfloat16.
-    """
-    half_dtypes = (torch.float16, torch.bfloat16)
-    assert dtype in half_dtypes
-    assert q.device.type == 'cuda' and q.size(-1) <= 256
 
-    # params
+    Dispatches to the selected attention backend (see `set_attention_backend`).
+    Query rows past `q_lens` are returned as zeros; keys past `k_lens` are
+    masked out by every backend.
+    """
+    assert dtype in _half_dtypes
     b, lq, lk, out_dtype = q.size(0), q.size(1), k.size(1), q.dtype
 
-    def half(x):
-        return x if x.dtype in half_dtypes else x.to(dtype)
-
-    # preprocess query
     if q_lens is None:
-        q = half(q.flatten(0, 1))
-        q_lens = torch.tensor(
-            [lq] * b, dtype=torch.int32).to(
-                device=q.device, non_blocking=True)
-    else:
-        q = half(torch.cat([u[:v] for u, v in zip(q, q_lens)]))
-
-    # preprocess key, value
+        q_lens = torch.full((b,), lq, dtype=torch.int32, device=q.device)
     if k_lens is None:
-        k = half(k.flatten(0, 1))
-        v = half(v.flatten(0, 1))
-        k_lens = torch.tensor(
-            [lk] * b, dtype=torch.int32).to(
-                device=k.device, non_blocking=True)
-    else:
-        k = half(torch.cat([u[:v] for u, v in zip(k, k_lens)]))
-        v = half(torch.cat([u[:v] for u, v in zip(v, k_lens)]))
-
-    q = q.to(v.dtype)
-    k = k.to(v.dtype)
+        k_lens = torch.full((b,), lk, dtype=torch.int32, device=q.device)
+    q_lens = q_lens.to(device=q.device, dtype=torch.int32)
+    k_lens = k_lens.to(device=q.device, dtype=torch.int32)
 
     if q_scale is not None:
         q = q * q_scale
 
-    if version is not None and version == 3 and not FLASH_ATTN_3_AVAILABLE:
-        warnings.warn(
-            'Flash attention 3 is not available, use flash attention 2 instead.'
-        )
-
-    # apply attention
-    if (version is None or version == 3) and FLASH_ATTN_3_AVAILABLE:
-        # Note: dropout_p, window_size are not supported in FA3 now.
-        x = flash_attn_interface.flash_attn_varlen_func(
-            q=q,
-            k=k,
-            v=v,
-            cu_seqlens_q=torch.cat([q_lens.new_zeros([1]), q_lens]).cumsum(
-                0, dtype=torch.int32).to(q.device, non_blocking=True),
-            cu_seqlens_k=torch.cat([k_lens.new_zeros([1]), k_lens]).cumsum(
-                0, dtype=torch.int32).to(q.device, non_blocking=True),
-            seqused_q=None,
-            seqused_k=None,
-            max_seqlen_q=lq,
-            max_seqlen_k=lk,
-            softmax_scale=softmax_scale,
-            causal=causal,
-            deterministic=deterministic)[0].unflatten(0, (b, lq))
-    else:
-        assert FLASH_ATTN_2_AVAILABLE
-        x = flash_attn.flash_attn_varlen_func(
-            q=q,
-            k=k,
-            v=v,
-            cu_seqlens_q=torch.cat([q_lens.new_zeros([1]), q_lens]).cumsum(
-                0, dtype=torch.int32).to(q.device, non_blocking=True),
-            cu_seqlens_k=torch.cat([k_lens.new_zeros([1]), k_lens]).cumsum(
-                0, dtype=torch.int32).to(q.device, non_blocking=True),
-            max_seqlen_q=lq,
-            max_seqlen_k=lk,
-            dropout_p=dropout_p,
-            softmax_scale=softmax_scale,
-            causal=causal,
-            window_size=window_size,
-            deterministic=deterministic).unflatten(0, (b, lq))
+    fn, _ = _BACKENDS[get_attention_backend(q.device, version)]
+    x = fn(q, k, v, q_lens, k_lens, dropout_p, softmax_scale, causal,
+           window_size, deterministic, dtype)
 
     # output
     return x.type(out_dtype)
@@ -145,35 +168,208 @@ def attention(
     dtype=torch.bfloat16,
     fa_version=None,
 ):
-    if FLASH_ATTN_2_AVAILABLE or FLASH_ATTN_3_AVAILABLE:
-        return flash_attention(
-            q=q,
-            k=k,
-            v=v,
-            q_lens=q_lens,
-            k_lens=k_lens,
-            dropout_p=dropout_p,
-            softmax_scale=softmax_scale,
-            q_scale=q_scale,
-            causal=causal,
-            window_size=window_size,
-            deterministic=deterministic,
-            dtype=dtype,
-            version=fa_version,
-        )
-    else:
-        if q_lens is not None or k_lens is not None:
-            warnings.warn(
-                'Padding mask is disabled when using scaled_dot_product_attention. It can have a significant impact on performance.'
-            )
-        attn_mask = None
-
-        q = q.transpose(1, 2).to(dtype)
-        k = k.transpose(1, 2).to(dtype)
-        v = v.transpose(1, 2).to(dtype)
-
-        out = torch.nn.functional.scaled_dot_product_attention(
-            q, k, v, attn_mask=attn_mask, is_causal=causal, dropout_p=dropout_p)
-
-        out = out.transpose(1, 2).contiguous()
-        return out
+    return flash_attention(
+        q=q,
+        k=k,
+        v=v,
+        q_lens=q_lens,
+        k_lens=k_lens,
+        dropout_p=dropout_p,
+        softmax_scale=softmax_scale,
+        q_scale=q_scale,
+        causal=causal,
+        window_size=window_size,
+        deterministic=deterministic,
+        dtype=dtype,
+        version=fa_version,
+    )
+
+
+# ---------- flash-attn (varlen) ----------
+def _pack(q, k, v, q_lens, k_lens, dtype):
+
+    def half(x):
+        return x if x.dtype in _half_dtypes else x.to(dtype)
+
+    q = half(torch.cat([u[:n] for u, n in zip(q, q_lens.tolist())]))
+    k = half(torch.cat([u[:n] for u, n in zip(k, k_lens.tolist())]))
+    v = half(torch.cat([u[:n] for u, n in zip(v, k_lens.tolist())]))
+    cu_q = F.pad(q_lens.cumsum(0, dtype=torch.int32), (1, 0))
+    cu_k = F.pad(k_lens.cumsum(0, dtype=torch.int32), (1, 0))
+    return q.to(v.dtype), k.to(v.dtype), v, cu_q, cu_k
+
+
+def _unpack(x, q_lens, b, lq):
+    if int(q_lens.sum()) == b * lq:
+        return x.unflatten(0, (b, lq))
+    out = x.new_zeros(b, lq, *x.shape[1:])
+    for i, (u, n) in enumerate(zip(x.split(q_lens.tolist()), q_lens.tolist())):
+        out[i, :n] = u
+    return out
+
+
+def _flash_ok(device):
+    return device.type == 'cuda'
+
+
+@register_attention_backend(
+    'fa3', lambda device: FLASH_ATTN_3_AVAILABLE and _flash_ok(device))
+def _fa3(q, k, v, q_lens, k_lens, dropout_p, softmax_scale, causal,
+         window_size, deterministic, dtype):
+    assert q.size(-1) <= 256
+    b, lq, lk = q.size(0), q.size(1), k.size(1)
+    q, k, v, cu_q, cu_k = _pack(q, k, v, q_lens, k_lens, dtype)
+    # Note: dropout_p, window_size are not supported in FA3 now.
+    x = flash_attn_interface.flash_attn_varlen_func(
+        q=q,
+        k=k,
+        v=v,
+        cu_seqlens_q=cu_q,
+        cu_seqlens_k=cu_k,
+        seqused_q=None,
+        seqused_k=None,
+        max_seqlen_q=lq,
+        max_seqlen_k=lk,
+        softmax_scale=softmax_scale,
+        causal=causal,
+        deterministic=deterministic)[0]
+    return _unpack(x, q_lens, b, lq)
+
+
+@register_attention_backend(
+    'fa2', lambda device: FLASH_ATTN_2_AVAILABLE and _flash_ok(device))
+def _fa2(q, k, v, q_lens, k_lens, dropout_p, softmax_scale, causal,
+         window_size, deterministic, dtype):
+    assert q.size(-1) <= 256
+    b, lq, lk = q.size(0), q.size(1), k.size(1)
+    q, k, v, cu_q, cu_k = _pack(q, k, v, q_lens, k_lens, dtype)
+    x = flash_attn.flash_attn_varlen_func(
+        q=q,
+        k=k,
+        v=v,
+        cu_seqlens_q=cu_q,
+        cu_seqlens_k=cu_k,
+        max_seqlen_q=lq,
+        max_seqlen_k=lk,
+        dropout_p=dropout_p,
+        softmax_scale=softmax_scale,
+        causal=causal,
+        window_size=window_size,
+        deterministic=deterministic)
+    return _unpack(x, q_lens, b, lq)
+
+
+# ---------- pure torch ----------
+def _compute_dtype(x, dtype):
+    # half precision like flash-attn on GPU; full precision stays on CPU
+    if x.dtype in _half_dtypes or x.device.type != 'cpu':
+        return x.dtype if x.dtype in _half_dtypes else dtype
+    return torch.float32
+
+
+def _mask(q_lens, k_lens, lk, rows, causal, window_size):
+    r"""
+    Boolean mask [B, 1, len(rows), Lk] (True = attend) for query positions
+    `rows`, plus the rows that see no key at all [B, len(rows)]. Causal and
+    sliding window are aligned bottom-right per sample (query row i sits at
+    key position i + k_lens[b] - q_lens[b]), like flash-attn varlen. Empty
+    rows are opened to every key so softmax stays finite; callers zero
+    them, which is what flash-attn returns for such rows.
+    """
+    device = q_lens.device
+    cols = torch.arange(lk, device=device)[None, None, None, :]
+    mask = cols < k_lens[:, None, None, None]
+    shift = (k_lens - q_lens)[:, None, None, None]
+    pos = rows[None, None, :, None] + shift
+    if causal:
+        mask = mask & (cols <= pos)
+    left, right = window_size
+    if left >= 0:
+        mask = mask & (cols >= pos - left)
+    if right >= 0:
+        mask = mask & (cols <= pos + right)
+    mask = mask.expand(-1, -1, len(rows), -1)
+    empty = ~mask.any(-1)
+    return mask | empty[..., None], empty[:, 0]
+
+
+def _heads(q, k, v):
+    # [B, L, N, C] -> [B, N, L, C]; grouped kv heads repeated to Nq
+    q, k, v = (u.transpose(1, 2) for u in (q, k, v))
+    if k.size(1) != q.size(1):
+        rep = q.size(1) // k.size(1)
+        k = k.repeat_interleave(rep, dim=1)
+        v = v.repeat_interleave(rep, dim=1)
+    return q, k, v
+
+
+def _zero_padded_rows(x, q_lens):
+    # x: [B, Lq, N, C]
+    rows = torch.arange(x.size(1), device=x.device)
+    return x.masked_fill(~(rows[None, :] < q_lens[:, None])[..., None, None],
+                         0)
+
+
+def _needs_mask(q_lens, k_lens, lq, lk, causal, window_size):
+    return (causal or tuple(window_size) != (-1, -1) or
+            bool((k_lens < lk).any()))
+
+
+@register_attention_backend('sdpa')
+def _sdpa(q, k, v, q_lens, k_lens, dropout_p, softmax_scale, causal,
+          window_size, deterministic, dtype):
+    lq, lk = q.size(1), k.size(1)
+    cdtype = _compute_dtype(q, dtype)
+    q, k, v = _heads(q.to(cdtype), k.to(cdtype), v.to(cdtype))
+    mask = empty = None
+    if _needs_mask(q_lens, k_lens, lq, lk, causal, window_size):
+        mask, empty = _mask(q_lens, k_lens, lk,
+                            torch.arange(lq, device=q.device), causal,
+                            window_size)
+    x = F.scaled_dot_product_attention(
+        q, k, v, attn_mask=mask, dropout_p=dropout_p, scale=softmax_scale)
+    if empty is not None and bool(empty.any()):
+        x = x.masked_fill(empty[:, None, :, None], 0)
+    x = x.transpose(1, 2)
+    if bool((q_lens < lq).any()):
+        x = _zero_padded_rows(x, q_lens)
+    return x
+
+
+@register_attention_backend('chunked')
+def _chunked(q, k, v, q_lens, k_lens, dropout_p, softmax_scale, causal,
+             window_size, deterministic, dtype):
+    r"""
+    Exact attention in blocks of CHUNK_SIZE query rows: the score matrix is
+    never larger than [B, N, CHUNK_SIZE, Lk]. Softmax runs in float32.
+    """
+    lq, lk = q.size(1), k.size(1)
+    cdtype = _compute_dtype(q, dtype)
+    scale = softmax_scale or 1.0 / math.sqrt(q.size(-1))
+    q, k, v = _heads(q.to(cdtype), k.to(cdtype), v.to(cdtype))
+    masked = _needs_mask(q_lens, k_lens, lq, lk, causal, window_size)
+    kt = k.transpose(-2, -1)
+    out = q.new_empty(q.shape[:-1] + (v.size(-1),))
+    for s in range(0, lq, CHUNK_SIZE):
+        e = min(s + CHUNK_SIZE, lq)
+        score = torch.matmul(q[:, :, s:e], kt).float().mul_(scale)
+        if masked:
+            mask, empty = _mask(q_lens, k_lens, lk,
+                                torch.arange(s, e, device=q.device), causal,
+                                window_size)
+            score.masked_fill_(~mask, float('-inf'))
+        p = score.softmax(dim=-1)
+        if dropout_p > 0:
+            p = F.dropout(p, p=dropout_p)
+        out[:, :, s:e] = torch.matmul(p.to(v.dtype), v)
+        if masked and bool(empty.any()):
+            out[:, :, s:e].masked_fill_(empty[:, None, :, None], 0)
+    x = out.transpose(1, 2)
+    if bool((q_lens < lq).any()):
+        x = _zero_padded_rows(x, q_lens)
+    return x
+
+
+if _selected != 'auto' and _selected not in _BACKENDS:
+    logging.warning(f'Unknown WAN_ATTN_BACKEND={_selected}, using auto.')
+    _selected = 'auto'
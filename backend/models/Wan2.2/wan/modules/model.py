@@ -1,5 +1,6 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
 import math
+from collections import OrderedDict
 
 import torch
 import torch.nn as nn
@@ -35,35 +36,97 @@ def rope_params(max_seq_len, dim, theta=10000):
     return freqs
 
 
+# key -> (freqs, cos, sin); `freqs` is held so its id() cannot be reused by
+# another table while the entry lives
+_ROPE_CACHE = OrderedDict()
+_ROPE_CACHE_SIZE = 32
+
+
+def cached_rope_table(freqs, key, build):
+    r"""
+    Returns the (cos, sin) pair for `key` computed from `freqs`, calling
+    `build()` only on the first request. Entries are per freqs tensor (and
+    so per device) and the least recently used ones are dropped first.
+    """
+    key = (id(freqs),) + tuple(key)
+    entry = _ROPE_CACHE.get(key)
+    if entry is not None and entry[0] is freqs:
+        _ROPE_CACHE.move_to_end(key)
+        return entry[1], entry[2]
+    cos, sin = build()
+    _ROPE_CACHE[key] = (freqs, cos, sin)
+    while len(_ROPE_CACHE) > _ROPE_CACHE_SIZE:
+        _ROPE_CACHE.popitem(last=False)
+    return cos, sin
+
+
 @torch.amp.autocast('cuda', enabled=False)
-def rope_apply(x, grid_sizes, freqs):
-    n, c = x.size(2), x.size(3) // 2
-
-    # split freqs
-    freqs = freqs.split([c - 2 * (c // 3), c // 3, c // 3], dim=1)
-
-    # loop over samples
-    output = []
-    for i, (f, h, w) in enumerate(grid_sizes.tolist()):
-        seq_len = f * h * w
-
-        # precompute multipliers
-        x_i = torch.view_as_complex(x[i, :seq_len].to(torch.float64).reshape(
-            seq_len, n, -1, 2))
-        freqs_i = torch.cat([
-            freqs[0][:f].view(f, 1, 1, -1).expand(f, h, w, -1),
-            freqs[1][:h].view(1, h, 1, -1).expand(f, h, w, -1),
-            freqs[2][:w].view(1, 1, w, -1).expand(f, h, w, -1)
+def rope_cos_sin(freqs, f, h, w, length=None):
+    r"""
+    Real-valued 3D RoPE table of an (f, h, w) token grid.
+
+    Args:
+        freqs (Tensor):
+            Complex rope freqs, shape [1024, C / num_heads / 2]
+        f, h, w (`int`):
+            Grid size in patches
+        length (`int`, *optional*):
+            Rows of the table, defaults to f * h * w. Rows past the grid are
+            cos=1, sin=0 so padded tokens pass through unchanged.
+
+    Returns:
+        (Tensor, Tensor):
+            float32 cos and sin of shape [length, 1, C / num_heads / 2],
+            computed once in float64 and cached.
+    """
+    seq_len = f * h * w
+    length = seq_len if length is None else length
+
+    def build():
+        c = freqs.size(1)
+        parts = freqs.split([c - 2 * (c // 3), c // 3, c // 3], dim=1)
+        grid = torch.cat([
+            parts[0][:f].view(f, 1, 1, -1).expand(f, h, w, -1),
+            parts[1][:h].view(1, h, 1, -1).expand(f, h, w, -1),
+            parts[2][:w].view(1, 1, w, -1).expand(f, h, w, -1)
         ],
-                            dim=-1).reshape(seq_len, 1, -1)
+                         dim=-1).reshape(seq_len, 1, -1)
+        cos = freqs.real.new_ones(length, 1, c)
+        sin = freqs.real.new_zeros(length, 1, c)
+        cos[:seq_len], sin[:seq_len] = grid.real, grid.imag
+        return cos.float(), sin.float()
+
+    return cached_rope_table(freqs, ('grid', f, h, w, length), build)
 
-        # apply rotary embedding
-        x_i = torch.view_as_real(x_i * freqs_i).flatten(2)
-        x_i = torch.cat([x_i, x[i, seq_len:]])
 
-        # append to collection
-        output.append(x_i)
-    return torch.stack(output).float()
+def rope_rotate(x, cos, sin):
+    r"""
+    Rotates interleaved (real, imag) channel pairs of `x` [..., L, N, C] by
+    the angles in `cos` / `sin` [..., L, 1, C / 2]; returns float32.
+    """
+    xr, xi = x.float().unflatten(-1, (-1, 2)).unbind(-1)
+    return torch.stack([xr * cos - xi * sin, xr * sin + xi * cos],
+                       dim=-1).flatten(-2)
+
+
+@torch.amp.autocast('cuda', enabled=False)
+def rope_apply(x, grid_sizes, freqs):
+    r"""
+    x:          [B, L, N, C].
+    grid_sizes: [B, 3].
+    freqs:      [M, C // 2].
+
+    Batched float32 rotation with tables from `rope_cos_sin`; tokens past a
+    sample's grid are returned unchanged (as float32).
+    """
+    grids = [tuple(g) for g in grid_sizes.tolist()]
+    if len(set(grids)) == 1:
+        cos, sin = rope_cos_sin(freqs, *grids[0], length=x.size(1))
+    else:
+        tables = [rope_cos_sin(freqs, *g, length=x.size(1)) for g in grids]
+        cos = torch.stack([t[0] for t in tables])
+        sin = torch.stack([t[1] for t in tables])
+    return rope_rotate(x, cos, sin)
 
 
 class WanRMSNorm(nn.Module):
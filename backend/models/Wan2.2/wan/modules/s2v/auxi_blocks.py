@@ -11,10 +11,7 @@ from diffusers.models import ModelMixin
 from diffusers.utils import is_torch_version, logging
 from einops import rearrange
 
-try:
-    from flash_attn import flash_attn_func, flash_attn_qkvpacked_func
-except ImportError:
-    flash_attn_func = None
+from ..attention import flash_attention
 
 MEMORY_LAYOUT = {
     "flash": (
@@ -73,11 +70,8 @@ def attention(
         x = F.scaled_dot_product_attention(
             q, k, v, attn_mask=attn_mask, dropout_p=drop_rate, is_causal=causal)
     elif mode == "flash":
-        x = flash_attn_func(
-            q,
-            k,
-            v,
-        )
+        # routed through the attention backend registry (fa3/fa2/sdpa/chunked)
+        x = flash_attention(q, k, v, dropout_p=drop_rate, causal=causal)
         # x with shape [(bxs), a, d]
         x = x.view(batch_size, max_seqlen_q, x.shape[-2],
                    x.shape[-1])  # reshape x to [b, s, a, d]
@@ -10,7 +10,7 @@ from diffusers.loaders import FromOriginalModelMixin, PeftAdapterMixin
 from diffusers.utils import BaseOutput, is_torch_version
 from einops import rearrange, repeat
 
-from ..model import flash_attention
+from ..model import cached_rope_table, flash_attention, rope_rotate
 from .s2v_utils import rope_precompute
 
 
@@ -46,6 +46,7 @@ def rope_apply(x, grid_sizes, freqs, start=None):
     if type(freqs) is list:
         trainable_freqs = freqs[1]
         freqs = freqs[0]
+    full_freqs = freqs
     freqs = freqs.split([c - 2 * (c // 3), c // 3, c // 3], dim=1)
 
     # loop over samples
@@ -70,43 +71,51 @@ def rope_apply(x, grid_sizes, freqs, start=None):
             seq_len = int(seq_f * seq_h * seq_w)
             if seq_len > 0:
                 if t_f > 0:
-                    factor_f, factor_h, factor_w = (t_f / seq_f).item(), (
-                        t_h / seq_h).item(), (t_w / seq_w).item()
-
-                    if f_o >= 0:
-                        f_sam = np.linspace(f_o.item(), (t_f + f_o).item() - 1,
-                                            seq_f).astype(int).tolist()
-                    else:
-                        f_sam = np.linspace(-f_o.item(),
-                                            (-t_f - f_o).item() + 1,
-                                            seq_f).astype(int).tolist()
-                    h_sam = np.linspace(h_o.item(), (t_h + h_o).item() - 1,
-                                        seq_h).astype(int).tolist()
-                    w_sam = np.linspace(w_o.item(), (t_w + w_o).item() - 1,
-                                        seq_w).astype(int).tolist()
-
-                    assert f_o * f >= 0 and h_o * h >= 0 and w_o * w >= 0
-                    freqs_0 = freqs[0][f_sam] if f_o >= 0 else freqs[0][
-                        f_sam].conj()
-                    freqs_0 = freqs_0.view(seq_f, 1, 1, -1)
-
-                    freqs_i = torch.cat([
-                        freqs_0.expand(seq_f, seq_h, seq_w, -1),
-                        freqs[1][h_sam].view(1, seq_h, 1, -1).expand(
-                            seq_f, seq_h, seq_w, -1),
-                        freqs[2][w_sam].view(1, 1, seq_w, -1).expand(
-                            seq_f, seq_h, seq_w, -1),
-                    ],
-                                        dim=-1).reshape(seq_len, 1, -1)
+
+                    def build():
+                        factor_f, factor_h, factor_w = (t_f / seq_f).item(), (
+                            t_h / seq_h).item(), (t_w / seq_w).item()
+
+                        if f_o >= 0:
+                            f_sam = np.linspace(f_o.item(),
+                                                (t_f + f_o).item() - 1,
+                                                seq_f).astype(int).tolist()
+                        else:
+                            f_sam = np.linspace(-f_o.item(),
+                                                (-t_f - f_o).item() + 1,
+                                                seq_f).astype(int).tolist()
+                        h_sam = np.linspace(h_o.item(), (t_h + h_o).item() - 1,
+                                            seq_h).astype(int).tolist()
+                        w_sam = np.linspace(w_o.item(), (t_w + w_o).item() - 1,
+                                            seq_w).astype(int).tolist()
+
+                        assert f_o * f >= 0 and h_o * h >= 0 and w_o * w >= 0
+                        freqs_0 = freqs[0][f_sam] if f_o >= 0 else freqs[0][
+                            f_sam].conj()
+                        freqs_0 = freqs_0.view(seq_f, 1, 1, -1)
+
+                        freqs_i = torch.cat([
+                            freqs_0.expand(seq_f, seq_h, seq_w, -1),
+                            freqs[1][h_sam].view(1, seq_h, 1, -1).expand(
+                                seq_f, seq_h, seq_w, -1),
+                            freqs[2][w_sam].view(1, 1, seq_w, -1).expand(
+                                seq_f, seq_h, seq_w, -1),
+                        ],
+                                            dim=-1).reshape(seq_len, 1, -1)
+                        return freqs_i.real.float(), freqs_i.imag.float()
+
+                    # same offsets / grid / target -> same table
+                    key = tuple(
+                        int(v) for v in (f_o, h_o, w_o, f, h, w, t_f, t_h, t_w))
+                    cos, sin = cached_rope_table(full_freqs, ('s2v',) + key,
+                                                 build)
                 elif t_f < 0:
-                    freqs_i = trainable_freqs.unsqueeze(1)
+                    # trainable: recomputed every call
+                    cos = trainable_freqs.real.float().unsqueeze(1)
+                    sin = trainable_freqs.imag.float().unsqueeze(1)
                 # apply rotary embedding
-                # precompute multipliers
-                x_i = torch.view_as_complex(
-                    x[i, seq_bucket[-1]:seq_bucket[-1] + seq_len].to(
-                        torch.float64).reshape(seq_len, n, -1, 2))
-                x_i = torch.view_as_real(x_i * freqs_i).flatten(2)
-                output[i, seq_bucket[-1]:seq_bucket[-1] + seq_len] = x_i
+                output[i, seq_bucket[-1]:seq_bucket[-1] + seq_len] = rope_rotate(
+                    x[i, seq_bucket[-1]:seq_bucket[-1] + seq_len], cos, sin)
         seq_bucket.append(seq_bucket[-1] + seq_len)
     return output.float()
 
@@ -7,6 +7,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from ..utils.context_cache import ContextCache
 from .tokenizers import HuggingfaceTokenizer
 
 __all__ = [
@@ -479,6 +480,8 @@ class T5EncoderModel:
         checkpoint_path=None,
         tokenizer_path=None,
         shard_fn=None,
+        cache_size=32,
+        cache_dir=None,
     ):
         self.text_len = text_len
         self.dtype = dtype
@@ -503,7 +506,19 @@ class T5EncoderModel:
         self.tokenizer = HuggingfaceTokenizer(
             name=tokenizer_path, seq_len=text_len, clean='whitespace')
 
-    def __call__(self, texts, device):
+        # context cache; a sharded encoder runs collectively, so a hit on
+        # one rank and a miss on another would hang: no cache with FSDP
+        self.cache = None
+        if shard_fn is None and (cache_size > 0 or cache_dir):
+            self.cache = ContextCache(cache_size, cache_dir)
+
+    def cache_key(self, text):
+        if self.tokenizer.clean:
+            text = self.tokenizer._clean(text)
+        return ContextCache.make_key(self.checkpoint_path, self.tokenizer_path,
+                                     self.text_len, self.dtype, text)
+
+    def encode(self, texts, device):
         ids, mask = self.tokenizer(
             texts, return_mask=True, add_special_tokens=True)
         ids = ids.to(device)
@@ -511,3 +526,31 @@ class T5EncoderModel:
         seq_lens = mask.gt(0).sum(dim=1).long()
         context = self.model(ids, mask)
         return [u[:v] for u, v in zip(context, seq_lens)]
+
+    def __call__(self, texts, device):
+        r"""
+        Encodes `texts`; cached contexts are reused and only the misses run
+        through the encoder (in one batch).
+        """
+        if self.cache is None:
+            return self.encode(texts, device)
+        keys = [self.cache_key(u) for u in texts]
+        context = [self.cache.get(k) for k in keys]
+        missing = [i for i, u in enumerate(context) if u is None]
+        if missing:
+            encoded = self.encode([texts[i] for i in missing], device)
+            for i, u in zip(missing, encoded):
+                self.cache.put(keys[i], u)
+                context[i] = u
+        return [u.to(device) for u in context]
+
+    def precompute(self, texts):
+        r"""
+        Encodes `texts` into the cache on the encoder's current device, e.g.
+        the constant negative prompt when a resident worker starts.
+        """
+        if self.cache is None:
+            return
+        device = next(self.model.parameters()).device
+        with torch.no_grad():
+            self(texts, device)
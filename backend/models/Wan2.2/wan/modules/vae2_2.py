@@ -774,6 +774,10 @@ class WanVAE_(nn.Module):
             self.temperal_upsample,
             dropout,
         )
+        # causal conv layers per tree, counted once (the tree never changes)
+        self._conv_num = count_conv3d(self.decoder)
+        self._enc_conv_num = count_conv3d(self.encoder)
+        self.clear_cache()
 
     def forward(self, x, scale=[0, 1]):
         mu = self.encode(x, scale)
@@ -781,62 +785,91 @@ class WanVAE_(nn.Module):
         return x_recon, mu
 
     def encode(self, x, scale):
+        r"""
+        Encodes in causal temporal chunks (1 + 4 + 4 ... frames). Every chunk
+        yields the same number of latent frames, so the latent is allocated
+        after the first chunk and filled in place.
+        """
         self.clear_cache()
-        x = patchify(x, patch_size=2)
-        t = x.shape[2]
-        iter_ = 1 + (t - 1) // 4
-        for i in range(iter_):
-            self._enc_conv_idx = [0]
-            if i == 0:
-                out = self.encoder(
-                    x[:, :, :1, :, :],
-                    feat_cache=self._enc_feat_map,
-                    feat_idx=self._enc_conv_idx,
-                )
-            else:
+        try:
+            x = patchify(x, patch_size=2)
+            t = x.shape[2]
+            iter_ = 1 + (t - 1) // 4
+            out, pos = None, 0
+            for i in range(iter_):
+                self._enc_conv_idx = [0]
+                if i == 0:
+                    chunk = x[:, :, :1, :, :]
+                else:
+                    chunk = x[:, :, 1 + 4 * (i - 1):1 + 4 * i, :, :]
                 out_ = self.encoder(
-                    x[:, :, 1 + 4 * (i - 1):1 + 4 * i, :, :],
+                    chunk,
                     feat_cache=self._enc_feat_map,
                     feat_idx=self._enc_conv_idx,
                 )
-                out = torch.cat([out, out_], 2)
-        mu, log_var = self.conv1(out).chunk(2, dim=1)
-        if isinstance(scale[0], torch.Tensor):
-            mu = (mu - scale[0].view(1, self.z_dim, 1, 1, 1)) * scale[1].view(
-                1, self.z_dim, 1, 1, 1)
-        else:
-            mu = (mu - scale[0]) * scale[1]
-        self.clear_cache()
-        return mu
-
-    def decode(self, z, scale):
+                if out is None:
+                    out = out_.new_empty(out_.shape[:2] +
+                                         (out_.shape[2] * iter_,) +
+                                         out_.shape[3:])
+                out[:, :, pos:pos + out_.shape[2]] = out_
+                pos += out_.shape[2]
+                del out_
+            mu, log_var = self.conv1(out[:, :, :pos]).chunk(2, dim=1)
+            if isinstance(scale[0], torch.Tensor):
+                mu = (mu - scale[0].view(1, self.z_dim, 1, 1, 1)) * scale[1].view(
+                    1, self.z_dim, 1, 1, 1)
+            else:
+                mu = (mu - scale[0]) * scale[1]
+            return mu
+        finally:
+            self.clear_cache()
+
+    def decode(self, z, scale, dtype=None):
+        r"""
+        Decodes into one preallocated output instead of concatenating chunks:
+        the first latent frame yields one frame, every later one
+        2 ** sum(temperal_upsample) frames. `dtype` (e.g. torch.float32)
+        converts chunk by chunk instead of copying the finished clip.
+        """
+        step = 2**sum(self.temperal_upsample)
+        out, pos = None, 0
+        for chunk in self.decode_stream(z, scale):
+            if out is None:
+                frames = chunk.shape[2] + (z.shape[2] - 1) * step
+                out = chunk.new_empty(
+                    chunk.shape[:2] + (frames,) + chunk.shape[3:],
+                    dtype=dtype or chunk.dtype)
+            out[:, :, pos:pos + chunk.shape[2]] = chunk
+            pos += chunk.shape[2]
+            del chunk
+        return out[:, :, :pos]
+
+    def decode_stream(self, z, scale):
+        r"""
+        Yields decoded pixel chunks [B, C, T_i, H, W], one per latent frame
+        (the causal decoder carries state between chunks in `_feat_map`).
+        unpatchify is spatial only, so applying it per chunk is equivalent.
+        """
         self.clear_cache()
-        if isinstance(scale[0], torch.Tensor):
-            z = z / scale[1].view(1, self.z_dim, 1, 1, 1) + scale[0].view(
-                1, self.z_dim, 1, 1, 1)
-        else:
-            z = z / scale[1] + scale[0]
-        iter_ = z.shape[2]
-        x = self.conv2(z)
-        for i in range(iter_):
-            self._conv_idx = [0]
-            if i == 0:
-                out = self.decoder(
-                    x[:, :, i:i + 1, :, :],
-                    feat_cache=self._feat_map,
-                    feat_idx=self._conv_idx,
-                    first_chunk=True,
-                )
+        try:
+            if isinstance(scale[0], torch.Tensor):
+                z = z / scale[1].view(1, self.z_dim, 1, 1, 1) + scale[0].view(
+                    1, self.z_dim, 1, 1, 1)
             else:
-                out_ = self.decoder(
+                z = z / scale[1] + scale[0]
+            iter_ = z.shape[2]
+            x = self.conv2(z)
+            for i in range(iter_):
+                self._conv_idx = [0]
+                out = self.decoder(
                     x[:, :, i:i + 1, :, :],
                     feat_cache=self._feat_map,
                     feat_idx=self._conv_idx,
+                    first_chunk=(i == 0),
                 )
-                out = torch.cat([out, out_], 2)
-        out = unpatchify(out, patch_size=2)
-        self.clear_cache()
-        return out
+                yield unpatchify(out, patch_size=2)
+        finally:
+            self.clear_cache()
 
     def reparameterize(self, mu, log_var):
         std = torch.exp(0.5 * log_var)
@@ -851,11 +884,9 @@ class WanVAE_(nn.Module):
         return mu + std * torch.randn_like(std)
 
     def clear_cache(self):
-        self._conv_num = count_conv3d(self.decoder)
         self._conv_idx = [0]
         self._feat_map = [None] * self._conv_num
         # cache encode
-        self._enc_conv_num = count_conv3d(self.encoder)
         self._enc_conv_idx = [0]
         self._enc_feat_map = [None] * self._enc_conv_num
 
@@ -1041,11 +1072,26 @@ class Wan2_2_VAE:
                 raise TypeError("zs should be a list")
             with amp.autocast(dtype=self.dtype):
                 return [
-                    self.model.decode(u.unsqueeze(0),
-                                      self.scale).float().clamp_(-1,
-                                                                 1).squeeze(0)
+                    self.model.decode(
+                        u.unsqueeze(0), self.scale,
+                        dtype=torch.float32).clamp_(-1, 1).squeeze(0)
                     for u in zs
                 ]
         except TypeError as e:
             logging.info(e)
             return None
+
+    def decode_stream(self, z):
+        r"""
+        Decodes a single latent [C, T, H, W] chunk by chunk; yields
+        [C, T_i, H, W] float tensors in [-1, 1] as they are produced, so the
+        caller can hand frames to a sink without materialising the clip.
+        """
+        chunks = self.model.decode_stream(z.unsqueeze(0), self.scale)
+        while True:
+            # autocast only around decoder work, not around the consumer
+            with amp.autocast(dtype=self.dtype):
+                out = next(chunks, None)
+            if out is None:
+                return
+            yield out.float().clamp_(-1, 1).squeeze(0)
@@ -5,6 +5,7 @@ import math
 import os
 import random
 import sys
+import time
 import types
 from contextlib import contextmanager
 from functools import partial
@@ -28,6 +29,8 @@ from .utils.fm_solvers import (
     retrieve_timesteps,
 )
 from .utils.fm_solvers_unipc import FlowUniPCMultistepScheduler
+from .utils.cfg import guided_noise, resolve_batch_cfg
+from .utils.events import get_writer
 from .utils.utils import best_output_size, masks_like
 
 
@@ -45,6 +48,8 @@ class WanTI2V:
         t5_cpu=False,
         init_on_cpu=True,
         convert_model_dtype=False,
+        t5_cache_size=32,
+        t5_cache_dir=None,
     ):
         r"""
         Initializes the Wan text-to-video generation model components.
@@ -71,6 +76,11 @@ class WanTI2V:
             convert_model_dtype (`bool`, *optional*, defaults to False):
                 Convert DiT model parameters dtype to 'config.param_dtype'.
                 Only works without FSDP.
+            t5_cache_size (`int`, *optional*, defaults to 32):
+                Text embeddings kept in memory, so repeated prompts and the
+                negative prompt skip the T5 forward. Disabled with t5_fsdp.
+            t5_cache_dir (`str`, *optional*, defaults to None):
+                Also persist text embeddings there as safetensors.
         """
         self.device = torch.device(f"cuda:{device_id}")
         self.config = config
@@ -84,29 +94,37 @@ class WanTI2V:
         if t5_fsdp or dit_fsdp or use_sp:
             self.init_on_cpu = False
 
+        events = get_writer()
         shard_fn = partial(shard_model, device_id=device_id)
-        self.text_encoder = T5EncoderModel(
-            text_len=config.text_len,
-            dtype=config.t5_dtype,
-            device=torch.device('cpu'),
-            checkpoint_path=os.path.join(checkpoint_dir, config.t5_checkpoint),
-            tokenizer_path=os.path.join(checkpoint_dir, config.t5_tokenizer),
-            shard_fn=shard_fn if t5_fsdp else None)
+        with events.timer('t5_load'):
+            self.text_encoder = T5EncoderModel(
+                text_len=config.text_len,
+                dtype=config.t5_dtype,
+                device=torch.device('cpu'),
+                checkpoint_path=os.path.join(checkpoint_dir,
+                                             config.t5_checkpoint),
+                tokenizer_path=os.path.join(checkpoint_dir,
+                                            config.t5_tokenizer),
+                shard_fn=shard_fn if t5_fsdp else None,
+                cache_size=t5_cache_size,
+                cache_dir=t5_cache_dir)
 
         self.vae_stride = config.vae_stride
         self.patch_size = config.patch_size
-        self.vae = Wan2_2_VAE(
-            vae_pth=os.path.join(checkpoint_dir, config.vae_checkpoint),
-            device=self.device)
+        with events.timer('vae_load'):
+            self.vae = Wan2_2_VAE(
+                vae_pth=os.path.join(checkpoint_dir, config.vae_checkpoint),
+                device=self.device)
 
         logging.info(f"Creating WanModel from {checkpoint_dir}")
-        self.model = WanModel.from_pretrained(checkpoint_dir)
-        self.model = self._configure_model(
-            model=self.model,
-            use_sp=use_sp,
-            dit_fsdp=dit_fsdp,
-            shard_fn=shard_fn,
-            convert_model_dtype=convert_model_dtype)
+        with events.timer('dit_load'):
+            self.model = WanModel.from_pretrained(checkpoint_dir)
+            self.model = self._configure_model(
+                model=self.model,
+                use_sp=use_sp,
+                dit_fsdp=dit_fsdp,
+                shard_fn=shard_fn,
+                convert_model_dtype=convert_model_dtype)
 
         if use_sp:
             self.sp_size = get_world_size()
@@ -159,6 +177,17 @@ class WanTI2V:
 
         return model
 
+    def _sync(self):
+        torch.cuda.synchronize(self.device)
+
+    def _decode(self, x0, video_sink=None):
+        if video_sink is None:
+            return self.vae.decode(x0)
+        # stream chunk by chunk: the clip is never materialised on GPU or host
+        for chunk in self.vae.decode_stream(x0[0]):
+            video_sink.write(chunk)
+        return None
+
     def generate(self,
                  input_prompt,
                  img=None,
@@ -171,7 +200,9 @@ class WanTI2V:
                  guide_scale=5.0,
                  n_prompt="",
                  seed=-1,
-                 offload_model=True):
+                 offload_model=True,
+                 video_sink=None,
+                 batch_cfg='auto'):
         r"""
         Generates video frames from text prompt using diffusion process.
 
@@ -200,6 +231,13 @@ class WanTI2V:
                 Random seed for noise generation. If -1, use random seed.
             offload_model (`bool`, *optional*, defaults to True):
                 If True, offloads models to CPU during generation to save VRAM
+            video_sink (`FFmpegVideoSink`, *optional*, defaults to None):
+                If given, decoded chunks are streamed into it as the VAE
+                produces them and None is returned instead of the tensor.
+            batch_cfg (`bool` or `str`, *optional*, defaults to 'auto'):
+                Run the conditional and unconditional branches of
+                classifier-free guidance as one batch-of-2 forward. 'auto'
+                does so when free device memory allows, else sequentially.
 
         Returns:
             torch.Tensor:
@@ -222,7 +260,9 @@ class WanTI2V:
                 guide_scale=guide_scale,
                 n_prompt=n_prompt,
                 seed=seed,
-                offload_model=offload_model)
+                offload_model=offload_model,
+                video_sink=video_sink,
+                batch_cfg=batch_cfg)
         # t2v
         return self.t2v(
             input_prompt=input_prompt,
@@ -234,7 +274,9 @@ class WanTI2V:
             guide_scale=guide_scale,
             n_prompt=n_prompt,
             seed=seed,
-            offload_model=offload_model)
+            offload_model=offload_model,
+            video_sink=video_sink,
+            batch_cfg=batch_cfg)
 
     def t2v(self,
             input_prompt,
@@ -246,7 +288,9 @@ class WanTI2V:
             guide_scale=5.0,
             n_prompt="",
             seed=-1,
-            offload_model=True):
+            offload_model=True,
+            video_sink=None,
+            batch_cfg='auto'):
         r"""
         Generates video frames from text prompt using diffusion process.
 
@@ -271,6 +315,10 @@ class WanTI2V:
                 Random seed for noise generation. If -1, use random seed.
             offload_model (`bool`, *optional*, defaults to True):
                 If True, offloads models to CPU during generation to save VRAM
+            video_sink (`FFmpegVideoSink`, *optional*, defaults to None):
+                Streams decoded chunks into the sink; returns None.
+            batch_cfg (`bool` or `str`, *optional*, defaults to 'auto'):
+                Batched classifier-free guidance, see `generate`.
 
         Returns:
             torch.Tensor:
@@ -280,6 +328,8 @@ class WanTI2V:
                 - H: Frame height (from size)
                 - W: Frame width from size)
         """
+        events = get_writer()
+
         # preprocess
         F = frame_num
         target_shape = (self.vae.model.z_dim, (F - 1) // self.vae_stride[0] + 1,
@@ -296,17 +346,20 @@ class WanTI2V:
         seed_g = torch.Generator(device=self.device)
         seed_g.manual_seed(seed)
 
-        if not self.t5_cpu:
-            self.text_encoder.model.to(self.device)
-            context = self.text_encoder([input_prompt], self.device)
-            context_null = self.text_encoder([n_prompt], self.device)
-            if offload_model:
-                self.text_encoder.model.cpu()
-        else:
-            context = self.text_encoder([input_prompt], torch.device('cpu'))
-            context_null = self.text_encoder([n_prompt], torch.device('cpu'))
-            context = [t.to(self.device) for t in context]
-            context_null = [t.to(self.device) for t in context_null]
+        with events.timer('text_encode', sync=self._sync):
+            if not self.t5_cpu:
+                self.text_encoder.model.to(self.device)
+                context = self.text_encoder([input_prompt], self.device)
+                context_null = self.text_encoder([n_prompt], self.device)
+                if offload_model:
+                    self.text_encoder.model.cpu()
+            else:
+                context = self.text_encoder([input_prompt],
+                                            torch.device('cpu'))
+                context_null = self.text_encoder([n_prompt],
+                                                 torch.device('cpu'))
+                context = [t.to(self.device) for t in context]
+                context_null = [t.to(self.device) for t in context_null]
 
         noise = [
             torch.randn(
@@ -363,8 +416,14 @@ class WanTI2V:
             if offload_model or self.init_on_cpu:
                 self.model.to(self.device)
                 torch.cuda.empty_cache()
-
-            for _, t in enumerate(tqdm(timesteps)):
+            batched = resolve_batch_cfg(batch_cfg, self.model, seq_len,
+                                        self.device, self.param_dtype,
+                                        self.sp_size)
+
+            # structured step events replace the tqdm bar when enabled
+            total_steps = len(timesteps)
+            step_start = time.perf_counter()
+            for i, t in enumerate(tqdm(timesteps, disable=events.enabled)):
                 latent_model_input = latents
                 timestep = [t]
 
@@ -377,13 +436,14 @@ class WanTI2V:
                 ])
                 timestep = temp_ts.unsqueeze(0)
 
-                noise_pred_cond = self.model(
-                    latent_model_input, t=timestep, **arg_c)[0]
-                noise_pred_uncond = self.model(
-                    latent_model_input, t=timestep, **arg_null)[0]
-
-                noise_pred = noise_pred_uncond + guide_scale * (
-                    noise_pred_cond - noise_pred_uncond)
+                noise_pred, batched = guided_noise(
+                    self.model,
+                    latent_model_input,
+                    timestep,
+                    arg_c,
+                    arg_null,
+                    guide_scale,
+                    batched=batched)
 
                 temp_x0 = sample_scheduler.step(
                     noise_pred.unsqueeze(0),
@@ -392,13 +452,24 @@ class WanTI2V:
                     return_dict=False,
                     generator=seed_g)[0]
                 latents = [temp_x0.squeeze(0)]
+
+                if events.enabled:
+                    self._sync()
+                    now = time.perf_counter()
+                    events.emit(
+                        'step',
+                        step=i + 1,
+                        total=total_steps,
+                        seconds=round(now - step_start, 4))
+                    step_start = now
             x0 = latents
             if offload_model:
                 self.model.cpu()
                 torch.cuda.synchronize()
                 torch.cuda.empty_cache()
             if self.rank == 0:
-                videos = self.vae.decode(x0)
+                with events.timer('vae_decode', sync=self._sync):
+                    videos = self._decode(x0, video_sink)
 
         del noise, latents
         del sample_scheduler
@@ -408,7 +479,7 @@ class WanTI2V:
         if dist.is_initialized():
             dist.barrier()
 
-        return videos[0] if self.rank == 0 else None
+        return videos[0] if self.rank == 0 and videos is not None else None
 
     def i2v(self,
             input_prompt,
@@ -421,7 +492,9 @@ class WanTI2V:
             guide_scale=5.0,
             n_prompt="",
             seed=-1,
-            offload_model=True):
+            offload_model=True,
+            video_sink=None,
+            batch_cfg='auto'):
         r"""
         Generates video frames from input image and text prompt using diffusion process.
 
@@ -449,6 +522,10 @@ class WanTI2V:
                 Random seed for noise generation. If -1, use random seed
             offload_model (`bool`, *optional*, defaults to True):
                 If True, offloads models to CPU during generation to save VRAM
+            video_sink (`FFmpegVideoSink`, *optional*, defaults to None):
+                Streams decoded chunks into the sink; returns None.
+            batch_cfg (`bool` or `str`, *optional*, defaults to 'auto'):
+                Batched classifier-free guidance, see `generate`.
 
         Returns:
             torch.Tensor:
@@ -458,6 +535,8 @@ class WanTI2V:
                 - H: Frame height (from max_area)
                 - W: Frame width (from max_area)
         """
+        events = get_writer()
+
         # preprocess
         ih, iw = img.height, img.width
         dh, dw = self.patch_size[1] * self.vae_stride[1], self.patch_size[
@@ -497,19 +576,23 @@ class WanTI2V:
             n_prompt = self.sample_neg_prompt
 
         # preprocess
-        if not self.t5_cpu:
-            self.text_encoder.model.to(self.device)
-            context = self.text_encoder([input_prompt], self.device)
-            context_null = self.text_encoder([n_prompt], self.device)
-            if offload_model:
-                self.text_encoder.model.cpu()
-        else:
-            context = self.text_encoder([input_prompt], torch.device('cpu'))
-            context_null = self.text_encoder([n_prompt], torch.device('cpu'))
-            context = [t.to(self.device) for t in context]
-            context_null = [t.to(self.device) for t in context_null]
+        with events.timer('text_encode', sync=self._sync):
+            if not self.t5_cpu:
+                self.text_encoder.model.to(self.device)
+                context = self.text_encoder([input_prompt], self.device)
+                context_null = self.text_encoder([n_prompt], self.device)
+                if offload_model:
+                    self.text_encoder.model.cpu()
+            else:
+                context = self.text_encoder([input_prompt],
+                                            torch.device('cpu'))
+                context_null = self.text_encoder([n_prompt],
+                                                 torch.device('cpu'))
+                context = [t.to(self.device) for t in context]
+                context_null = [t.to(self.device) for t in context_null]
 
-        z = self.vae.encode([img])
+        with events.timer('vae_encode', sync=self._sync):
+            z = self.vae.encode([img])
 
         @contextmanager
         def noop_no_sync():
@@ -563,8 +646,14 @@ class WanTI2V:
             if offload_model or self.init_on_cpu:
                 self.model.to(self.device)
                 torch.cuda.empty_cache()
-
-            for _, t in enumerate(tqdm(timesteps)):
+            batched = resolve_batch_cfg(batch_cfg, self.model, seq_len,
+                                        self.device, self.param_dtype,
+                                        self.sp_size)
+
+            # structured step events replace the tqdm bar when enabled
+            total_steps = len(timesteps)
+            step_start = time.perf_counter()
+            for i, t in enumerate(tqdm(timesteps, disable=events.enabled)):
                 latent_model_input = [latent.to(self.device)]
                 timestep = [t]
 
@@ -577,16 +666,15 @@ class WanTI2V:
                 ])
                 timestep = temp_ts.unsqueeze(0)
 
-                noise_pred_cond = self.model(
-                    latent_model_input, t=timestep, **arg_c)[0]
-                if offload_model:
-                    torch.cuda.empty_cache()
-                noise_pred_uncond = self.model(
-                    latent_model_input, t=timestep, **arg_null)[0]
-                if offload_model:
-                    torch.cuda.empty_cache()
-                noise_pred = noise_pred_uncond + guide_scale * (
-                    noise_pred_cond - noise_pred_uncond)
+                noise_pred, batched = guided_noise(
+                    self.model,
+                    latent_model_input,
+                    timestep,
+                    arg_c,
+                    arg_null,
+                    guide_scale,
+                    batched=batched,
+                    release_cache=offload_model)
 
                 temp_x0 = sample_scheduler.step(
                     noise_pred.unsqueeze(0),
@@ -600,13 +688,24 @@ class WanTI2V:
                 x0 = [latent]
                 del latent_model_input, timestep
 
+                if events.enabled:
+                    self._sync()
+                    now = time.perf_counter()
+                    events.emit(
+                        'step',
+                        step=i + 1,
+                        total=total_steps,
+                        seconds=round(now - step_start, 4))
+                    step_start = now
+
             if offload_model:
                 self.model.cpu()
                 torch.cuda.synchronize()
                 torch.cuda.empty_cache()
 
             if self.rank == 0:
-                videos = self.vae.decode(x0)
+                with events.timer('vae_decode', sync=self._sync):
+                    videos = self._decode(x0, video_sink)
 
         del noise, latent, x0
         del sample_scheduler
@@ -616,4 +715,4 @@ class WanTI2V:
         if dist.is_initialized():
             dist.barrier()
 
-        return videos[0] if self.rank == 0 else None
+        return videos[0] if self.rank == 0 and videos is not None else None
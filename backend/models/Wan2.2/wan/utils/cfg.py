@@ -0,0 +1,125 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import logging
+
+import torch
+import torch.distributed as dist
+
+__all__ = ['batched_cfg_fits', 'guided_noise', 'resolve_batch_cfg']
+
+# activation bytes per token and hidden unit kept alive by one extra batch
+# element inside a block (FFN intermediate + q/k/v/o + norms), with headroom
+_ACTIVATION_FACTOR = 2.0
+
+
+def batched_cfg_fits(model, seq_len, device, dtype=torch.bfloat16, sp_size=1):
+    r"""
+    Whether the unconditional branch fits next to the conditional one.
+
+    Compares free device memory with a rough estimate of the activations a
+    second batch element adds to one transformer block. In a distributed
+    run every rank must agree, so the minimum over ranks is used.
+
+    Args:
+        model (`WanModel`):
+            Diffusion backbone (reads `dim` and `ffn_dim`).
+        seq_len (`int`):
+            Padded token count of one sample (before sequence parallel split).
+        device (`torch.device`):
+            Device the model runs on.
+        dtype (`torch.dtype`, *optional*, defaults to torch.bfloat16):
+            Activation dtype.
+        sp_size (`int`, *optional*, defaults to 1):
+            Sequence parallel size; each rank holds `seq_len / sp_size` tokens.
+    """
+    if device.type != 'cuda':
+        return True
+    tokens = seq_len // max(1, sp_size)
+    itemsize = torch.empty((), dtype=dtype).element_size()
+    need = tokens * (model.ffn_dim + 6 * model.dim) * itemsize
+    free, _ = torch.cuda.mem_get_info(device)
+    fits = free > need * _ACTIVATION_FACTOR
+    if dist.is_initialized():
+        flag = torch.tensor([int(fits)], device=device)
+        dist.all_reduce(flag, op=dist.ReduceOp.MIN)
+        fits = bool(flag.item())
+    logging.info(
+        f'Batched CFG: need ~{need * _ACTIVATION_FACTOR / 2**30:.2f} GiB, '
+        f'free {free / 2**30:.2f} GiB -> {"batched" if fits else "sequential"}')
+    return fits
+
+
+def resolve_batch_cfg(batch_cfg, model, seq_len, device, dtype, sp_size=1):
+    r"""
+    Maps the `batch_cfg` argument of the pipelines to a bool:
+    True / False force the mode, 'auto' (or None) asks `batched_cfg_fits`.
+    """
+    if batch_cfg is None or batch_cfg == 'auto':
+        return batched_cfg_fits(model, seq_len, device, dtype, sp_size)
+    return bool(batch_cfg)
+
+
+def guided_noise(model,
+                 x,
+                 timestep,
+                 arg_c,
+                 arg_null,
+                 guide_scale,
+                 batched=False,
+                 release_cache=False):
+    r"""
+    Classifier-free guided noise prediction for one denoising step.
+
+    With `batched`, the conditional and unconditional branches run as one
+    batch-of-2 forward (`WanModel.forward` takes lists of latents and
+    contexts; the timestep embedding broadcasts over the batch) and the
+    output is split. If that runs out of memory outside a distributed run,
+    the step is repeated sequentially.
+
+    Args:
+        model (`WanModel`):
+            Diffusion backbone.
+        x (`list[torch.Tensor]`):
+            Single latent [C, F, H, W] in a list.
+        timestep (`torch.Tensor`):
+            Per-token timesteps [1, seq_len].
+        arg_c (`dict`):
+            Conditional kwargs (`context`, `seq_len`).
+        arg_null (`dict`):
+            Unconditional kwargs (`context`, `seq_len`).
+        guide_scale (`float`):
+            Classifier-free guidance scale.
+        batched (`bool`, *optional*, defaults to False):
+            Run both branches in one forward.
+        release_cache (`bool`, *optional*, defaults to False):
+            Call `torch.cuda.empty_cache()` after each sequential forward.
+
+    Returns:
+        (torch.Tensor, bool):
+            The guided prediction and whether the step ran batched; callers
+            keep passing that flag so an OOM fallback sticks for the rest of
+            the loop.
+    """
+    if batched:
+        try:
+            noise_pred_cond, noise_pred_uncond = model(
+                x * 2,
+                t=timestep,
+                context=arg_c['context'] + arg_null['context'],
+                seq_len=arg_c['seq_len'])
+            return noise_pred_uncond + guide_scale * (
+                noise_pred_cond - noise_pred_uncond), True
+        except torch.cuda.OutOfMemoryError:
+            if dist.is_initialized():
+                raise
+            logging.warning(
+                'Batched CFG ran out of memory, falling back to sequential.')
+            torch.cuda.empty_cache()
+
+    noise_pred_cond = model(x, t=timestep, **arg_c)[0]
+    if release_cache:
+        torch.cuda.empty_cache()
+    noise_pred_uncond = model(x, t=timestep, **arg_null)[0]
+    if release_cache:
+        torch.cuda.empty_cache()
+    return noise_pred_uncond + guide_scale * (noise_pred_cond -
+                                              noise_pred_uncond), False
@@ -0,0 +1,127 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+
+__all__ = ['ContextCache']
+
+
+class ContextCache:
+    r"""
+    Size-bounded LRU of text-encoder outputs.
+
+    Entries are keyed by a digest of (encoder, tokenizer, text_len, dtype,
+    normalized text) and kept on the CPU, so a cache hit costs one host to
+    device copy instead of a T5 forward. With `cache_dir`, every entry is
+    also written as `<digest>.safetensors` and looked up there on a memory
+    miss, so the cache survives process restarts and is shared by
+    one-shot `generate.py` runs. The directory keeps at most
+    `max_disk_entries` files (least recently used removed first).
+
+    Args:
+        max_entries (`int`, *optional*, defaults to 32):
+            Tensors kept in memory.
+        cache_dir (`str`, *optional*, defaults to None):
+            Directory for persistent entries; None keeps the cache in memory.
+        max_disk_entries (`int`, *optional*, defaults to 1024):
+            Files kept in `cache_dir`.
+    """
+
+    def __init__(self, max_entries=32, cache_dir=None, max_disk_entries=1024):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.hits = self.disk_hits = self.misses = 0
+        self._entries = OrderedDict()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(
+            [str(p) for p in parts]).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.safetensors')
+
+    def get(self, key):
+        r"""Cached tensor (CPU) for `key`, or None."""
+        tensor = self._entries.get(key)
+        if tensor is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tensor
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                from safetensors.torch import load_file
+                tensor = load_file(path)['context']
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.warning(f'Dropping unreadable context cache {path}: {e}')
+                self._remove(path)
+            else:
+                self.disk_hits += 1
+                self._remember(key, tensor)
+                return tensor
+        self.misses += 1
+        return None
+
+    def put(self, key, tensor):
+        tensor = tensor.detach().to('cpu', copy=True).contiguous()
+        self._remember(key, tensor)
+        if self.cache_dir:
+            from safetensors.torch import save_file
+            path = self._path(key)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            try:
+                save_file({'context': tensor}, tmp)
+                os.replace(tmp, path)
+            except OSError as e:
+                logging.warning(f'Could not persist context cache {path}: {e}')
+                self._remove(tmp)
+            self._prune_disk()
+        return tensor
+
+    def _remember(self, key, tensor):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = tensor
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_disk(self):
+        try:
+            files = [
+                e for e in os.scandir(self.cache_dir)
+                if e.name.endswith('.safetensors')
+            ]
+        except OSError:
+            return
+        if len(files) <= self.max_disk_entries:
+            return
+
+        def mtime(entry):
+            try:
+                return entry.stat().st_mtime
+            except OSError:
+                return 0
+
+        files.sort(key=mtime)
+        for e in files[:len(files) - self.max_disk_entries]:
+            self._remove(e.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,81 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import json
+import os
+import time
+from contextlib import contextmanager
+
+__all__ = ['EventWriter', 'get_writer', 'set_writer']
+
+
+class EventWriter:
+    r"""
+    Emits structured progress / timing events as JSON lines.
+
+    Events are written to an inherited file descriptor (see `--events_fd` in
+    generate.py) and/or passed to a callback. A writer with neither is a no-op,
+    so the pipelines can call it unconditionally.
+
+    Records:
+        {"event": "timing", "name": "text_encode", "seconds": 1.23, "t": ...}
+        {"event": "step", "step": 3, "total": 50, "seconds": 4.56, "t": ...}
+    """
+
+    def __init__(self, fd=None, callback=None):
+        self._file = os.fdopen(fd, 'w', buffering=1) if fd is not None else None
+        self._callback = callback
+        # name -> seconds of every timing seen, kept even without a sink
+        # so that it can be written to the result manifest
+        self.timings = {}
+
+    @property
+    def enabled(self):
+        return self._file is not None or self._callback is not None
+
+    def emit(self, event, **data):
+        if event == 'timing':
+            self.timings[data['name']] = self.timings.get(data['name'],
+                                                          0.0) + data['seconds']
+        if not self.enabled:
+            return
+        record = {'event': event, 't': round(time.time(), 3), **data}
+        if self._callback is not None:
+            self._callback(record)
+        if self._file is not None:
+            try:
+                self._file.write(json.dumps(record) + '\n')
+            except (OSError, ValueError):
+                # reader went away; keep generating without events
+                self._file = None
+
+    @contextmanager
+    def timer(self, name, sync=None):
+        r"""
+        Emits a `timing` event for the wrapped block. `sync` (e.g.
+        torch.cuda.synchronize) is called before stopping the clock so that
+        queued GPU work is attributed to this block.
+        """
+        start = time.perf_counter()
+        yield
+        if sync is not None:
+            sync()
+        self.emit('timing', name=name, seconds=round(time.perf_counter() - start, 4))
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+
+_writer = EventWriter()
+
+
+def get_writer():
+    return _writer
+
+
+def set_writer(writer):
+    global _writer
+    _writer = writer if writer is not None else EventWriter()
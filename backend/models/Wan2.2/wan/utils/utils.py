@@ -1,6 +1,7 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
 import argparse
 import binascii
+import json
 import logging
 import os
 import os.path as osp
@@ -11,7 +12,7 @@ import imageio
 import torch
 import torchvision
 
-__all__ = ['save_video', 'save_image', 'str2bool']
+__all__ = ['save_video', 'save_image', 'str2bool', 'write_manifest']
 
 
 def rand_name(length=8, suffix=''):
@@ -120,6 +121,31 @@ def save_video(tensor,
         logging.info(f'save_video failed, error: {e}')
 
 
+def write_manifest(manifest_file, save_file, frames, fps, size, timings=None,
+                   **extra):
+    r"""
+    Writes the result manifest read back by callers instead of searching for
+    the output: absolute video path, frame count, fps, duration, (w, h) and
+    per-stage timings. Written atomically (tmp + rename).
+    """
+    width, height = size if size else (None, None)
+    manifest = {
+        'save_file': osp.abspath(save_file),
+        'frames': int(frames),
+        'fps': fps,
+        'duration': round(frames / fps, 3) if fps else None,
+        'width': width,
+        'height': height,
+        'timings': dict(timings or {}),
+        **extra,
+    }
+    tmp = f'{manifest_file}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_file)
+    return manifest
+
+
 def save_image(tensor, save_file, nrow=8, normalize=True, value_range=(-1, 1)):
     # cache file
     suffix = osp.splitext(save_file)[1]
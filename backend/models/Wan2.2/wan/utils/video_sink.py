@@ -0,0 +1,185 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from collections import deque
+
+import torch
+
+__all__ = ['FFmpegVideoSink', 'ffmpeg_available']
+
+
+def ffmpeg_available(ffmpeg=None):
+    return shutil.which(ffmpeg or os.environ.get('FFMPEG_BIN', 'ffmpeg')) is not None
+
+
+def frames_to_uint8(chunk, value_range=(-1, 1)):
+    r"""
+    Converts a decoded chunk [C, T, H, W] in `value_range` to uint8 frames
+    [T, H, W, C] on the chunk's device (same mapping as `save_video`).
+    """
+    low, high = value_range
+    x = chunk.clamp(low, high).sub_(low).mul_(255.0 / (high - low))
+    return x.to(torch.uint8).permute(1, 2, 3, 0).contiguous()
+
+
+class FFmpegVideoSink:
+    r"""
+    Streams decoded frames into a single ffmpeg process through its stdin.
+
+    Chunks are converted to uint8 on their device and copied to host one at a
+    time; a writer thread feeds the pipe so decoding of the next chunk overlaps
+    with encoding. At most `max_pending` chunks are held on the host, so peak
+    memory stays at a few frames instead of the whole clip.
+
+    The output is H.264/yuv420p with `+faststart`. If `audio` is given it is
+    muxed (AAC) by the same ffmpeg process. ffmpeg's stderr is drained by a
+    second thread (last lines kept for error messages) so a chatty encoder
+    can never block on a full pipe.
+
+    Usage:
+        with FFmpegVideoSink(save_file, fps=24) as sink:
+            for chunk in vae.decode_stream(latent):
+                sink.write(chunk)
+    """
+
+    def __init__(self,
+                 save_file,
+                 fps=24,
+                 audio=None,
+                 crf=18,
+                 preset='veryfast',
+                 value_range=(-1, 1),
+                 max_pending=2,
+                 ffmpeg=None):
+        self.save_file = save_file
+        self.fps = fps
+        self.audio = audio
+        self.crf = crf
+        self.preset = preset
+        self.value_range = value_range
+        self.ffmpeg = ffmpeg or os.environ.get('FFMPEG_BIN', 'ffmpeg')
+        self.frames = 0
+        self._proc = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._stderr_thread = None
+        self._stderr = deque(maxlen=200)
+        self._error = None
+        self._size = None
+
+    @property
+    def size(self):
+        r"""(width, height) of the stream, None before the first chunk."""
+        return self._size
+
+    def _command(self, width, height):
+        cmd = [
+            self.ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-f',
+            'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r',
+            str(self.fps), '-i', '-'
+        ]
+        if self.audio:
+            cmd += ['-i', str(self.audio), '-map', '0:v:0', '-map', '1:a:0']
+        cmd += [
+            '-c:v', 'libx264', '-preset', self.preset, '-crf',
+            str(self.crf), '-pix_fmt', 'yuv420p'
+        ]
+        if self.audio:
+            cmd += ['-c:a', 'aac', '-b:a', '192k', '-shortest']
+        cmd += ['-movflags', '+faststart', str(self.save_file)]
+        return cmd
+
+    def _start(self, width, height):
+        os.makedirs(
+            os.path.dirname(os.path.abspath(self.save_file)), exist_ok=True)
+        self._size = (width, height)
+        self._proc = subprocess.Popen(
+            self._command(width, height),
+            stdin=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        self._thread = threading.Thread(
+            target=self._pump, name='video-sink', daemon=True)
+        self._thread.start()
+        self._stderr_thread = threading.Thread(
+            target=self._drain_stderr, name='video-sink-stderr', daemon=True)
+        self._stderr_thread.start()
+
+    def _drain_stderr(self):
+        for line in iter(self._proc.stderr.readline, b''):
+            self._stderr.append(line.decode('utf-8', 'replace'))
+        self._proc.stderr.close()
+
+    def _pump(self):
+        while True:
+            frames = self._queue.get()
+            if frames is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._proc.stdin.write(memoryview(frames.numpy()).cast('B'))
+            except (BrokenPipeError, OSError) as e:
+                self._error = e
+
+    def write(self, chunk):
+        r"""
+        Args:
+            chunk (torch.Tensor):
+                Decoded frames [C, T, H, W] (or [B=1, C, T, H, W]).
+        """
+        if self._error is not None:
+            raise RuntimeError(f'ffmpeg sink failed: {self._error}')
+        if chunk.dim() == 5:
+            chunk = chunk.squeeze(0)
+        frames = frames_to_uint8(chunk, self.value_range).cpu()
+        if self._proc is None:
+            self._start(frames.shape[2], frames.shape[1])
+        elif (frames.shape[2], frames.shape[1]) != self._size:
+            raise ValueError('frame size changed mid-stream')
+        self._queue.put(frames)
+        self.frames += frames.shape[0]
+
+    def close(self):
+        r"""Flushes and waits for ffmpeg. Raises if encoding failed."""
+        if self._proc is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        rc = self._proc.wait()
+        self._stderr_thread.join()
+        stderr = ''.join(self._stderr)
+        self._proc = None
+        if rc != 0 or self._error is not None:
+            raise RuntimeError(
+                f'ffmpeg exited with {rc}: {stderr.strip() or self._error}')
+        if stderr:
+            logging.info(stderr.strip())
+
+    def abort(self):
+        if self._proc is None:
+            return
+        # kill first so a writer blocked on a full pipe fails fast
+        self._proc.kill()
+        self._queue.put(None)
+        self._thread.join()
+        self._proc.wait()
+        self._stderr_thread.join()
+        self._proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False